@@ -72,19 +72,24 @@ PEXPECT LICENSE
 import sys
 PY3 = (sys.version_info[0] >= 3)
 
-from .exceptions import ExceptionPexpect, EOF, TIMEOUT
+from .exceptions import ExceptionPexpect, EOF, TIMEOUT, BufferOverflow
 from .utils import split_command_line, which, is_executable_file
-from .expect import Expecter, searcher_re, searcher_string
+from .expect import (Expecter, ExpectStats, GatherStats, searcher_re,
+                     searcher_string, searcher_prefilter, pattern_cache,
+                     expect_many, gather_expect, expect_as_completed)
 
 if sys.platform != 'win32':
     # On Unix, these are available at the top level for backwards compatibility
     from .pty_spawn import spawn, spawnu
-    from .run import run, runu
+    from .run import run, runu, run_async, run_many
 
 __version__ = '4.9.0'
 __revision__ = ''
-__all__ = ['ExceptionPexpect', 'EOF', 'TIMEOUT', 'spawn', 'spawnu', 'run', 'runu',
-           'which', 'split_command_line', '__version__', '__revision__']
+__all__ = ['ExceptionPexpect', 'EOF', 'TIMEOUT', 'BufferOverflow', 'spawn',
+           'spawnu', 'run', 'runu', 'run_async', 'run_many', 'which',
+           'split_command_line',
+           'expect_many', 'gather_expect', 'expect_as_completed',
+           '__version__', '__revision__']
 
 
 
@@ -12,5 +12,10 @@ Here the code is just imported, to provide the same interface to older code.
 from sys import version_info as py_version_info
 if py_version_info >= (3, 6):
     from pexpect._async_w_await import PatternWaiter, expect_async, repl_run_command_async
+    from pexpect._async_w_await import gather_expect, expect_as_completed
+    from pexpect._async_w_await import run_async, run_many_async
 else:
     from pexpect._async_pre_await import PatternWaiter, expect_async, repl_run_command_async
+    # gather_expect(), expect_as_completed(), run_async() and
+    # run_many_async() need Python 3.6 or later; they are left out here, so
+    # that importing them raises ImportError.
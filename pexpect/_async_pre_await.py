@@ -5,8 +5,147 @@
 import asyncio
 import errno
 import signal
-from pexpect import EOF
+import time
+from pexpect import EOF, TIMEOUT
+
+
+@asyncio.coroutine
+def expect_async(expecter, timeout=None):
+    # First process data that was previously read - if it maches, we don't need
+    # async stuff.
+    idx = expecter.existing_data()
+    if idx is not None:
+        return idx
+    spawn = expecter.spawn
+    if spawn.flag_eof:
+        # The transport is gone with the end of file; nothing more will come.
+        return _reraise_unless_listed(expecter, expecter.eof(),
+                                      EOF('End Of File (EOF).'))
+    if not spawn.async_pw_transport:
+        pattern_waiter = PatternWaiter()
+        pattern_waiter.set_expecter(expecter)
+        transport, pattern_waiter = yield from asyncio.get_event_loop()\
+            .connect_read_pipe(lambda: pattern_waiter, spawn._async_pipe())
+        spawn.async_pw_transport = pattern_waiter, transport
+    else:
+        pattern_waiter, transport = spawn.async_pw_transport
+        pattern_waiter.set_expecter(expecter)
+        transport.resume_reading()
+    try:
+        return (yield from asyncio.wait_for(pattern_waiter.fut, timeout))
+    except asyncio.TimeoutError:
+        transport.pause_reading()
+        return _reraise_unless_listed(expecter, expecter.timeout(),
+                                      TIMEOUT('Timeout exceeded.'))
+
+
+def _reraise_unless_listed(expecter, index, exc):
+    """Return the index of EOF or TIMEOUT as Expecter.eof() or timeout()
+    gave it, or raise 'exc' if it is not in the pattern list."""
+    if index < 0:
+        expecter._reraise(exc)
+    return index
+
+
+@asyncio.coroutine
+def repl_run_command_async(repl, cmdlines, timeout=-1):
+    res = []
+    repl.child.sendline(cmdlines[0])
+    for line in cmdlines[1:]:
+        yield from repl._expect_prompt_async(timeout=timeout)
+        res.append(repl.child.before)
+        repl.child.sendline(line)
+
+    # Command was fully submitted, now wait for the next prompt
+    prompt_idx = yield from repl._expect_prompt_async(timeout=timeout)
+    if prompt_idx == 1:
+        # We got the continuation prompt - command was incomplete
+        yield from _interrupt_async(repl)
+        raise ValueError("Continuation prompt found - input was incomplete:")
+    return u''.join(res + [repl.child.before])
+
+
+@asyncio.coroutine
+def _interrupt_async(repl, timeout=5):
+    """Coroutine version of REPLWrapper._interrupt()."""
+    end_time = time.time() + timeout
+    while True:
+        repl.child.kill(signal.SIGINT)
+        try:
+            idx = yield from repl._expect_prompt_async(
+                timeout=repl.interrupt_wait)
+            if idx == 0:
+                break
+        except TIMEOUT:
+            if time.time() >= end_time:
+                raise
+    while True:
+        try:
+            yield from repl._expect_prompt_async(timeout=repl.interrupt_wait)
+        except TIMEOUT:
+            break
 
 
 class PatternWaiter(asyncio.Protocol):
     transport = None
+
+    def set_expecter(self, expecter):
+        self.expecter = expecter
+        self.fut = asyncio.Future()
+
+    def found(self, result):
+        if not self.fut.done():
+            self.fut.set_result(result)
+            self.transport.pause_reading()
+
+    def error(self, exc):
+        if not self.fut.done():
+            self.fut.set_exception(exc)
+            self.transport.pause_reading()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        spawn = self.expecter.spawn
+        s = spawn._decoder.decode(data)
+        spawn._log(s, 'read')
+        stats = spawn.stats
+        if stats is not None:
+            stats.reads += 1
+            stats.bytes_read += len(s)
+
+        if self.fut.done():
+            # Read after a match, before reading was paused: keep it for
+            # the next expect.
+            spawn._buffer.write(s)
+            spawn._limit_buffer()
+            return
+
+        try:
+            index = self.expecter.new_data(s)
+            if index is not None:
+                # Found a match
+                self.found(index)
+        except Exception as e:
+            self.expecter.errored()
+            self.error(e)
+
+    def eof_received(self):
+        # N.B. If this gets called, async will close the pipe (the spawn object)
+        # for us
+        self.expecter.spawn.flag_eof = True
+        try:
+            index = _reraise_unless_listed(self.expecter, self.expecter.eof(),
+                                           EOF('End Of File (EOF).'))
+        except EOF as e:
+            self.error(e)
+        else:
+            self.found(index)
+
+    def connection_lost(self, exc):
+        if isinstance(exc, OSError) and exc.errno == errno.EIO:
+            # We may get here without eof_received being called, e.g on Linux
+            self.eof_received()
+        elif exc is not None:
+            self.error(exc)
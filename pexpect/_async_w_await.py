@@ -5,14 +5,475 @@ Python 3.5 onwards.
 """
 import asyncio
 import errno
+import inspect
+import os
 import signal
+import time
 from sys import version_info as py_version_info
-from pexpect import EOF
+from pexpect import EOF, TIMEOUT, ExceptionPexpect
+from pexpect.expect import GatherStats
 if py_version_info >= (3, 7):
     _loop_getter = asyncio.get_running_loop
 else:
     _loop_getter = asyncio.get_event_loop
 
 
+async def expect_async(expecter, timeout=None):
+    # First process data that was previously read - if it maches, we don't need
+    # async stuff.
+    idx = expecter.existing_data()
+    if idx is not None:
+        return idx
+    spawn = expecter.spawn
+    if spawn.flag_eof:
+        # The transport is gone with the end of file; nothing more will come.
+        return _reraise_unless_listed(expecter, expecter.eof(),
+                                      EOF('End Of File (EOF).'))
+    if not spawn.async_pw_transport:
+        pattern_waiter = PatternWaiter()
+        pattern_waiter.set_expecter(expecter)
+        transport, pattern_waiter = await _loop_getter().connect_read_pipe(
+            lambda: pattern_waiter, spawn._async_pipe())
+        spawn.async_pw_transport = pattern_waiter, transport
+    else:
+        pattern_waiter, transport = spawn.async_pw_transport
+        pattern_waiter.set_expecter(expecter)
+        transport.resume_reading()
+    try:
+        return await asyncio.wait_for(pattern_waiter.fut, timeout)
+    except asyncio.TimeoutError:
+        transport.pause_reading()
+        return _reraise_unless_listed(expecter, expecter.timeout(),
+                                      TIMEOUT('Timeout exceeded.'))
+
+
+def _reraise_unless_listed(expecter, index, exc):
+    """Return the index of EOF or TIMEOUT as Expecter.eof() or timeout()
+    gave it, or raise 'exc' if it is not in the pattern list."""
+    if index < 0:
+        expecter._reraise(exc)
+    return index
+
+
+async def repl_run_command_async(repl, cmdlines, timeout=-1):
+    res = []
+    repl.child.sendline(cmdlines[0])
+    for line in cmdlines[1:]:
+        await repl._expect_prompt_async(timeout=timeout)
+        res.append(repl.child.before)
+        repl.child.sendline(line)
+
+    # Command was fully submitted, now wait for the next prompt
+    prompt_idx = await repl._expect_prompt_async(timeout=timeout)
+    if prompt_idx == 1:
+        # We got the continuation prompt - command was incomplete
+        await _interrupt_async(repl)
+        raise ValueError("Continuation prompt found - input was incomplete:")
+    return u''.join(res + [repl.child.before])
+
+
+async def _interrupt_async(repl, timeout=5):
+    """Coroutine version of REPLWrapper._interrupt()."""
+    end_time = time.time() + timeout
+    while True:
+        repl.child.kill(signal.SIGINT)
+        try:
+            if await repl._expect_prompt_async(
+                    timeout=repl.interrupt_wait) == 0:
+                break
+        except TIMEOUT:
+            if time.time() >= end_time:
+                raise
+    while True:
+        try:
+            await repl._expect_prompt_async(timeout=repl.interrupt_wait)
+        except TIMEOUT:
+            break
+
+
+async def gather_expect(pairs, timeout=-1, max_concurrency=None,
+                        return_exceptions=False, close_cancelled=True,
+                        stats=None):
+    tasks, started = _start_waits(pairs, timeout, max_concurrency,
+                                  close_cancelled, stats)
+    try:
+        return await asyncio.gather(*[task for task, child in tasks],
+                                    return_exceptions=return_exceptions)
+    finally:
+        await _cancel_waits(tasks)
+        if stats is not None:
+            stats.elapsed += stats.clock() - started
+
+
+async def expect_as_completed(pairs, timeout=-1, max_concurrency=None,
+                              close_cancelled=True, stats=None):
+    tasks, started = _start_waits(pairs, timeout, max_concurrency,
+                                  close_cancelled, stats)
+    pending = set(task for task, child in tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task, child in tasks:
+                if task in done:
+                    yield child, task.result()
+    finally:
+        await _cancel_waits(tasks)
+        if stats is not None:
+            stats.elapsed += stats.clock() - started
+
+
+def _start_waits(pairs, timeout, max_concurrency, close_cancelled, stats):
+    """Start a task waiting on each child, for gather_expect() and
+    expect_as_completed(). Returns a list of (task, child) pairs, in the
+    order of 'pairs', and the time it started."""
+    started = GatherStats.clock()
+    semaphore = None
+    if max_concurrency is not None:
+        semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = [(asyncio.ensure_future(_wait_one(child, pattern, timeout,
+                                              semaphore, close_cancelled,
+                                              stats)), child)
+             for child, pattern in pairs]
+    return tasks, started
+
+
+async def _cancel_waits(tasks):
+    """Cancel the tasks which have not finished, and wait for them to be
+    done, which includes closing their children."""
+    pending = [task for task, child in tasks if not task.done()]
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.wait(pending)
+    for task, child in tasks:
+        # Only the first exception is raised; don't have the rest logged
+        # as never retrieved.
+        if task.done() and not task.cancelled():
+            task.exception()
+
+
+async def _wait_one(child, pattern, timeout, semaphore, close_cancelled,
+                    stats):
+    queued = GatherStats.clock()
+    try:
+        if semaphore is None:
+            return await _run_one(child, pattern, timeout, stats, queued)
+        async with semaphore:
+            return await _run_one(child, pattern, timeout, stats, queued)
+    except asyncio.CancelledError:
+        if stats is not None:
+            stats.cancelled += 1
+        if close_cancelled:
+            # The wait may be cancelled again while the child is closed, as
+            # when asyncio.gather() has already been cancelled and then
+            # _cancel_waits() cancels what is left; close it regardless.
+            closing = asyncio.ensure_future(_close_child(child))
+            while not closing.done():
+                try:
+                    await asyncio.shield(closing)
+                except asyncio.CancelledError:
+                    pass
+            closing.result()
+        raise
+
+
+async def _run_one(child, pattern, timeout, stats, queued):
+    if stats is None:
+        return await _expect_or_dialog(child, pattern, timeout)
+    started = stats.clock()
+    stats.queue_time += started - queued
+    stats.started += 1
+    stats.running += 1
+    stats.peak_running = max(stats.peak_running, stats.running)
+    try:
+        result = await _expect_or_dialog(child, pattern, timeout)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        stats.failed += 1
+        if isinstance(e, TIMEOUT):
+            stats.timeouts += 1
+        raise
+    else:
+        stats.completed += 1
+        if not _is_dialog(pattern) and child.match is TIMEOUT:
+            stats.timeouts += 1
+        return result
+    finally:
+        stats.running -= 1
+        elapsed = stats.clock() - started
+        stats.expect_time += elapsed
+        stats.max_expect_time = max(stats.max_expect_time, elapsed)
+
+
+def _is_dialog(pattern):
+    # EOF and TIMEOUT are classes, and so callable, but they are patterns.
+    return callable(pattern) and not isinstance(pattern, type)
+
+
+async def _expect_or_dialog(child, pattern, timeout):
+    if not _is_dialog(pattern):
+        return await child.expect_async(pattern, timeout=timeout)
+    if timeout == -1:
+        timeout = child.timeout
+    try:
+        return await asyncio.wait_for(pattern(child), timeout)
+    except asyncio.TimeoutError:
+        raise TIMEOUT('Timeout exceeded in dialog.\n' + str(child))
+
+
+async def _close_child(child):
+    """Close a child whose wait was cancelled: its read transport first,
+    so that the loop stops watching the file descriptor before it is
+    closed, then the child, without blocking the loop. A close() which is
+    a coroutine is awaited; a pty spawn is closed as AsyncSpawn closes,
+    waiting for the child to exit without blocking; and any other spawn's
+    close() runs in the loop's default executor."""
+    if inspect.iscoroutinefunction(child.close):
+        await child.close()
+        return
+    transport = None
+    if child.async_pw_transport is not None:
+        transport = child.async_pw_transport[1]
+        child.async_pw_transport = None
+    if getattr(child, 'ptyproc', None) is None or child.closed:
+        if transport is not None:
+            transport.close()
+        await _loop_getter().run_in_executor(None, child.close)
+        return
+    if transport is not None:
+        # The transport's pipe may be the spawn itself, which it closes from
+        # a loop callback once it has stopped watching it; have that do
+        # nothing, rather than block in spawn.close().
+        child.closed = True
+        try:
+            transport.close()
+            await asyncio.sleep(0)
+        finally:
+            child.closed = False
+    await _close_pty(child)
+
+
+# The waiting and closing of AsyncSpawn, as functions of any pty spawn, so
+# that other coroutines (pxssh's, and _close_child()) can close a spawn
+# without blocking.
+
+async def _wait(child):
+    if not child.isalive():
+        return child.exitstatus
+    loop = _loop_getter()
+    pidfd = None
+    pidfd_open = getattr(os, 'pidfd_open', None)
+    if pidfd_open is not None:
+        try:
+            pidfd = pidfd_open(child.pid)
+        except OSError:
+            pass
+    if pidfd is not None:
+        exited = loop.create_future()
+        loop.add_reader(pidfd, lambda: exited.done() or
+                        exited.set_result(None))
+        try:
+            await exited
+        finally:
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+    else:
+        pause = 0.0005
+        while child.isalive():
+            await asyncio.sleep(pause)
+            pause = min(pause * 2, 0.05)
+    child.isalive()  # Update exit status
+    return child.exitstatus
+
+
+async def _wait_exit(child, delay):
+    try:
+        await asyncio.wait_for(_wait(child), delay)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+async def _terminate(child, force=False):
+    if not child.isalive():
+        return True
+    try:
+        for sig in (signal.SIGHUP, signal.SIGCONT, signal.SIGINT):
+            child.kill(sig)
+            if await _wait_exit(child, child.delayafterterminate):
+                return True
+        if force:
+            child.kill(signal.SIGKILL)
+            return await _wait_exit(child, child.delayafterterminate)
+        return False
+    except OSError:
+        return await _wait_exit(child, child.delayafterterminate)
+
+
+async def _close_pty(child, force=True):
+    """Close the terminal of a spawn whose transports are already closed,
+    as spawn.close() does, but waiting for the child without blocking."""
+    child._close_read_selector()
+    ptyproc = child.ptyproc
+    ptyproc.fileobj.close()
+    if not await _wait_exit(child, child.delayafterclose):
+        if not await _terminate(child, force):
+            raise ExceptionPexpect('Could not terminate the child.')
+    ptyproc.fd = -1
+    ptyproc.closed = True
+    child.child_fd = -1
+    child.closed = True
+
+
+async def run_async(command, timeout=30, withexitstatus=False, events=None,
+                    extra_args=None, logfile=None, cwd=None, env=None,
+                    **kwargs):
+    from pexpect.async_spawn import AsyncSpawn
+    from pexpect.run import _split_events, _is_callback, _bad_event
+    if timeout == -1:
+        child = AsyncSpawn(command, maxread=2000, logfile=logfile, cwd=cwd,
+                           env=env, **kwargs)
+    else:
+        child = AsyncSpawn(command, timeout=timeout, maxread=2000,
+                           logfile=logfile, cwd=cwd, env=env, **kwargs)
+    try:
+        patterns, responses = _split_events(events)
+        child_result_list = []
+        event_count = 0
+        while True:
+            try:
+                index = await child.expect(patterns)
+                if isinstance(child.after, child.allowed_string_types):
+                    child_result_list.append(child.before + child.after)
+                else:
+                    child_result_list.append(child.before)
+                if isinstance(responses[index], child.allowed_string_types):
+                    await child.send(responses[index])
+                elif _is_callback(responses[index]):
+                    callback_result = responses[index](locals())
+                    if inspect.isawaitable(callback_result):
+                        callback_result = await callback_result
+                    if isinstance(callback_result,
+                                  child.allowed_string_types):
+                        await child.send(callback_result)
+                    elif callback_result:
+                        break
+                else:
+                    _bad_event(index, responses[index])
+                event_count = event_count + 1
+            except TIMEOUT:
+                child_result_list.append(child.before)
+                break
+            except EOF:
+                child_result_list.append(child.before)
+                break
+        child_result = child.string_type().join(child_result_list)
+    finally:
+        await child.close()
+    if withexitstatus:
+        return (child_result, child.exitstatus)
+    return child_result
+
+
+async def run_many_async(commands, max_concurrency=16, timeout=30,
+                         events=None, extra_args=None, logfile=None, cwd=None,
+                         env=None, **kwargs):
+    """Behind run_many(): yields (command, output, exitstatus) as each of
+    the commands finishes, keeping at most max_concurrency running (all of
+    them if it is None)."""
+    if max_concurrency is not None and max_concurrency < 1:
+        raise ValueError('max_concurrency must be at least 1, or None.')
+    async def run_one(command):
+        output, exitstatus = await run_async(
+            command, timeout, True, events, extra_args, logfile, cwd, env,
+            **kwargs)
+        return command, output, exitstatus
+
+    commands = iter(commands)
+    running = set()
+    try:
+        while True:
+            for command in commands:
+                running.add(asyncio.ensure_future(run_one(command)))
+                if (max_concurrency is not None and
+                        len(running) >= max_concurrency):
+                    break
+            if not running:
+                return
+            done, running = await asyncio.wait(
+                running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # run_async() closes the child when it is cancelled.
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.wait(running)
+
+
 class PatternWaiter(asyncio.Protocol):
     transport = None
+
+    def set_expecter(self, expecter):
+        self.expecter = expecter
+        self.fut = asyncio.Future()
+
+    def found(self, result):
+        if not self.fut.done():
+            self.fut.set_result(result)
+            self.transport.pause_reading()
+
+    def error(self, exc):
+        if not self.fut.done():
+            self.fut.set_exception(exc)
+            self.transport.pause_reading()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        spawn = self.expecter.spawn
+        s = spawn._decoder.decode(data)
+        spawn._log(s, 'read')
+        stats = spawn.stats
+        if stats is not None:
+            stats.reads += 1
+            stats.bytes_read += len(s)
+
+        if self.fut.done():
+            # Read after a match, before reading was paused: keep it for
+            # the next expect.
+            spawn._buffer.write(s)
+            spawn._limit_buffer()
+            return
+
+        try:
+            index = self.expecter.new_data(s)
+            if index is not None:
+                # Found a match
+                self.found(index)
+        except Exception as e:
+            self.expecter.errored()
+            self.error(e)
+
+    def eof_received(self):
+        # N.B. If this gets called, async will close the pipe (the spawn object)
+        # for us
+        self.expecter.spawn.flag_eof = True
+        try:
+            index = _reraise_unless_listed(self.expecter, self.expecter.eof(),
+                                           EOF('End Of File (EOF).'))
+        except EOF as e:
+            self.error(e)
+        else:
+            self.found(index)
+
+    def connection_lost(self, exc):
+        if isinstance(exc, OSError) and exc.errno == errno.EIO:
+            # We may get here without eof_received being called, e.g on Linux
+            self.eof_received()
+        elif exc is not None:
+            self.error(exc)
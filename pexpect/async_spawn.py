@@ -0,0 +1,330 @@
+"""Provides AsyncSpawn, a spawn which is driven from an asyncio event loop.
+
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+import asyncio
+import collections
+import os
+import re
+import termios
+
+from ._async_w_await import (_loop_getter, _wait, _wait_exit, _terminate,
+                             _close_pty)
+from .exceptions import EOF, TIMEOUT
+from .pty_spawn import spawn
+__all__ = ['AsyncSpawn']
+
+
+class _WriteProtocol(asyncio.Protocol):
+    """The protocol of an AsyncSpawn's write transport, which does flow
+    control as asyncio.StreamWriter does: drain() waits while more is
+    buffered in the transport than its high-water mark."""
+
+    def __init__(self):
+        self._paused = False
+        self._lost = False
+        self._exc = None
+        self._waiters = collections.deque()
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        self._wake()
+
+    def connection_lost(self, exc):
+        self._lost = True
+        self._exc = exc
+        self._wake()
+
+    def _wake(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def drain(self):
+        if not self._paused and not self._lost:
+            return
+        if not self._lost:
+            waiter = _loop_getter().create_future()
+            self._waiters.append(waiter)
+            await waiter
+        if self._lost:
+            raise EOF('The terminal was closed, writing to it failed: %s'
+                      % (self._exc,))
+
+
+class AsyncSpawn(spawn):
+    """Like spawn, but everything which waits is a coroutine, to be awaited
+    in an asyncio event loop, so that one loop can drive many children::
+
+        child = AsyncSpawn('ftp ftp.openbsd.org')
+        await child.expect('Name .*: ')
+        await child.sendline('anonymous')
+        print(await child.readline())
+        await child.close()
+
+    The child's terminal is read through a read pipe transport, the same
+    one expect(async_=True) uses, and written through a write pipe
+    transport, both on duplicates of child_fd. send(), sendline(), write(),
+    writelines() and sendeof() return once what they wrote is down to the
+    transport's high-water mark, as drain() does; delaybeforesend is
+    waited out with asyncio.sleep(). wait() and close() wait for the child
+    to exit on a pidfd where the system has them, else by checking every
+    so often, without blocking the loop.
+
+    The constructor is as spawn's, and forks the child straight away.
+    The transports are made on first use, in the running loop, and a
+    spawn is to be used from that loop only. The methods which only look
+    at the child, such as isalive() and kill(), are as spawn's; the ones
+    which would block the loop, and have no coroutine version here, such as
+    expect_iter(), passthrough() and iteration, raise TypeError, as does
+    passing an AsyncSpawn to expect_many().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(AsyncSpawn, self).__init__(*args, **kwargs)
+        self._write_transport = None
+        self._write_protocol = None
+
+    def _async_pipe(self):
+        # A duplicate, so that the transport closing it at end of file
+        # does not close the spawn.
+        return open(os.dup(self.child_fd), 'rb', buffering=0)
+
+    async def _writer(self):
+        if self._write_transport is None:
+            if self.closed:
+                raise ValueError('I/O operation on closed file.')
+            pipe = open(os.dup(self.child_fd), 'wb', buffering=0)
+            loop = _loop_getter()
+            self._write_transport, self._write_protocol = \
+                await loop.connect_write_pipe(_WriteProtocol, pipe)
+        return self._write_transport
+
+    async def _write(self, b):
+        transport = await self._writer()
+        transport.write(b)
+        await self._write_protocol.drain()
+
+    async def send(self, s):
+        """Send string ``s`` to the child, and return the number of bytes
+        written, once the write transport has taken it without going over
+        its high-water mark (see :meth:`drain`)."""
+        if self.delaybeforesend is not None and not self.low_latency:
+            await asyncio.sleep(self.delaybeforesend)
+
+        s = self._coerce_send_string(s)
+        self._log(s, 'send')
+
+        b = self._encoder.encode(s, final=False)
+        await self._write(b)
+        return len(b)
+
+    async def sendline(self, s=''):
+        """Wraps send(), sending string ``s`` to child process, with
+        ``os.linesep`` automatically appended. Returns number of bytes
+        written."""
+        s = self._coerce_send_string(s)
+        return await self.send(s + self.linesep)
+
+    async def write(self, s):
+        """As send(), with no return value."""
+        await self.send(s)
+
+    async def writelines(self, sequence):
+        """Send each of the strings in 'sequence', which are not separated
+        by line separators, returning once the write transport has taken
+        them as send() does."""
+        buffers, total = self._bulk_buffers(sequence)
+        if total:
+            transport = await self._writer()
+            transport.writelines(buffers)
+            await self._write_protocol.drain()
+
+    async def send_bulk(self, s, timeout=-1):
+        """As spawn.send_bulk(): send 's' in full, with lines too long for
+        the terminal in canonical mode cut up, and return the number of
+        bytes written once the write transport has written all of it.
+        Raises TIMEOUT if that takes longer than 'timeout' seconds (-1 for
+        self.timeout, None to wait forever).
+
+        The child's output is only read meanwhile if an expect() is running
+        alongside, as with asyncio.gather(): without one, a child which
+        echoes a lot of what it is sent can stop taking more."""
+        buffers, total = self._bulk_buffers([s])
+        if not total:
+            return 0
+        if timeout == -1:
+            timeout = self.timeout
+        transport = await self._writer()
+        low, high = transport.get_write_buffer_limits()
+        # With no room in the buffer, drain() waits for it to be empty.
+        transport.set_write_buffer_limits(high=0)
+        try:
+            transport.writelines(buffers)
+            await asyncio.wait_for(self._write_protocol.drain(), timeout)
+        except asyncio.TimeoutError:
+            raise TIMEOUT('Timeout exceeded in send_bulk().')
+        finally:
+            if not transport.is_closing():
+                transport.set_write_buffer_limits(high=high, low=low)
+        return total
+
+    async def drain(self):
+        """Wait until the write transport's buffer is down to its low-water
+        mark, for when writing with the transport directly. Raises EOF if
+        the terminal has been closed."""
+        if self._write_protocol is not None:
+            await self._write_protocol.drain()
+
+    async def sendeof(self):
+        """Send the terminal's EOF character (see spawn.sendeof()), which
+        must come at the start of a line to be taken as end of file."""
+        await self._sendcontrolchar(termios.VEOF, b'\x04')
+
+    async def sendintr(self):
+        """Send the terminal's interrupt character, to have it send SIGINT
+        to the child."""
+        await self._sendcontrolchar(termios.VINTR, b'\x03')
+
+    async def _sendcontrolchar(self, index, default):
+        try:
+            char = termios.tcgetattr(self.child_fd)[6][index]
+        except termios.error:
+            char = default
+        if not isinstance(char, bytes):
+            char = bytes(bytearray([char]))
+        self._log(char if self.encoding is None else
+                  char.decode(self.encoding, 'replace'), 'send')
+        await self._write(char)
+
+    async def expect(self, pattern, timeout=-1, searchwindowsize=-1):
+        """As spawn.expect(), awaited."""
+        return await self.expect_list(self.compile_pattern_list(pattern),
+                                      timeout, searchwindowsize)
+
+    def expect_async(self, pattern, timeout=-1, searchwindowsize=-1):
+        return self.expect(pattern, timeout, searchwindowsize)
+
+    async def expect_exact(self, pattern_list, timeout=-1,
+                           searchwindowsize=-1):
+        """As spawn.expect_exact(), awaited."""
+        return await super(AsyncSpawn, self).expect_exact(
+            pattern_list, timeout=timeout, searchwindowsize=searchwindowsize,
+            async_=True)
+
+    async def expect_list(self, pattern_list, timeout=-1,
+                          searchwindowsize=-1):
+        """As spawn.expect_list(), awaited."""
+        return await super(AsyncSpawn, self).expect_list(
+            pattern_list, timeout=timeout, searchwindowsize=searchwindowsize,
+            async_=True)
+
+    def expect_iter(self, *args, **kwargs):
+        raise TypeError('expect_iter() would block the event loop; with an '
+                        'AsyncSpawn, await expect() in a loop instead.')
+
+    def passthrough(self, *args, **kwargs):
+        raise TypeError('passthrough() would block the event loop, and '
+                        'cannot be used with an AsyncSpawn.')
+
+    def __iter__(self):
+        raise TypeError('Iterating would block the event loop; with an '
+                        'AsyncSpawn, await readline() in a loop instead.')
+
+    async def read_nonblocking(self, size=1, timeout=-1):
+        """Read at most 'size' characters, as many as have come, waiting up
+        to 'timeout' seconds (self.timeout if -1, forever if None) for
+        some. Raises TIMEOUT if none come in time, and EOF at the end of
+        the output."""
+        if size == 0:
+            return self.string_type()
+        pattern = '.{1,%d}' % size
+        if self.encoding is None:
+            pattern = pattern.encode('ascii')
+        await self.expect(re.compile(pattern, re.DOTALL), timeout=timeout)
+        return self.after
+
+    async def read(self, size=-1):
+        """Read at most 'size' characters, or until EOF if 'size' is
+        negative, as spawn.read() does."""
+        if size == 0:
+            return self.string_type()
+        if size < 0:
+            await self.expect(EOF)
+            return self.before
+        pattern = '.{%d}' % size
+        if self.encoding is None:
+            pattern = pattern.encode('ascii')
+        index = await self.expect([re.compile(pattern, re.DOTALL), EOF])
+        if index == 0:
+            return self.after
+        return self.before
+
+    async def readline(self, size=-1):
+        """Read one line, as spawn.readline() does: it ends with '\\r\\n',
+        unless EOF came first. 'size' is only looked at for 0, which returns
+        an empty string."""
+        if size == 0:
+            return self.string_type()
+        index = await self.expect([re.compile(re.escape(self.crlf)), EOF])
+        if index == 0:
+            return self.before + self.crlf
+        return self.before
+
+    async def wait(self):
+        """Wait for the child to exit, and return its exit status (None if
+        a signal ended it, with signalstatus set). As with spawn.wait(), a
+        child blocked writing output which is not being read never exits."""
+        return await _wait(self)
+
+    async def _wait_exit(self, delay):
+        return await _wait_exit(self, delay)
+
+    async def terminate(self, force=False):
+        """As spawn.terminate(), waiting for the child without blocking."""
+        return await _terminate(self, force)
+
+    async def close(self, force=True):
+        """Close the transports and the terminal, then give the child
+        delayafterclose seconds to exit before terminating it (with SIGKILL
+        as a last resort if 'force' is set). Calling it again does nothing.
+        What is still buffered in the write transport is written first, if
+        the child takes it."""
+        if self.closed:
+            return
+        if self._write_transport is not None:
+            self._write_transport.close()
+            self._write_transport = None
+        if self.async_pw_transport is not None:
+            self.async_pw_transport[1].close()
+            self.async_pw_transport = None
+        await _close_pty(self, force)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, etype, evalue, tb):
+        await self.close()
+
+    def __enter__(self):
+        raise TypeError('Use "async with" with an AsyncSpawn.')
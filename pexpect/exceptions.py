@@ -34,3 +34,8 @@ class EOF(ExceptionPexpect):
 
 class TIMEOUT(ExceptionPexpect):
     """Raised when a read time exceeds the timeout. """
+
+
+class BufferOverflow(ExceptionPexpect):
+    """Raised when the buffer grows past maxbuffer and maxbuffer_policy is
+    'raise'."""
@@ -1,6 +1,113 @@
+import copy
+import inspect
+import re
+import threading
 import time
+from collections import OrderedDict
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
 from .exceptions import EOF, TIMEOUT
 
+_UNBOUNDED = getattr(sre_parse, 'MAXWIDTH', sre_parse.MAXREPEAT) - 1
+
+
+class ExpectStats(object):
+    """Counters and timers for the expect calls of a spawn. They are kept
+    when an instance is assigned to the spawn's 'stats' attribute (it is
+    None by default, which costs next to nothing)::
+
+        child.stats = pexpect.ExpectStats()
+        child.expect(...)
+        print(child.stats)
+
+    Attributes, added up over all calls until reset():
+
+        expects         - number of expect calls
+        reads           - number of reads which returned data
+        bytes_read      - how much those reads returned (characters, if the
+                          spawn has an encoding)
+        read_time       - seconds spent in read_nonblocking(), which
+                          includes the two below
+        select_time     - seconds spent waiting for the child in select()
+                          or poll()
+        decode_time     - seconds spent decoding what was read
+        searches        - number of searches of the buffer
+        search_time     - seconds spent searching
+        bytes_rescanned - how much of what was searched had been read before
+                          the last read, such as the lookback for matches
+                          straddling two reads
+    """
+
+    _fields = ('expects', 'reads', 'bytes_read', 'read_time', 'select_time',
+               'decode_time', 'searches', 'search_time', 'bytes_rescanned')
+
+    clock = staticmethod(getattr(time, 'perf_counter', time.time))
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Set all counters and timers back to zero."""
+        for name in self._fields:
+            setattr(self, name, 0)
+
+    def __str__(self):
+        return '\n'.join('%s: %s' % (name, getattr(self, name))
+                         for name in self._fields)
+
+    def __repr__(self):
+        return '<ExpectStats %s>' % ' '.join(
+            '%s=%r' % (name, getattr(self, name)) for name in self._fields)
+
+
+class GatherStats(object):
+    """Counters and timers for a gather_expect() or expect_as_completed()
+    call, kept when an instance is passed as its 'stats' argument, and added
+    up over calls until reset().
+
+    Attributes:
+
+        started         - number of children whose wait was started (given
+                          a slot, under max_concurrency)
+        completed       - number of children which gave a result, including
+                          the index of EOF or TIMEOUT
+        failed          - number of children whose wait raised
+        cancelled       - number of children whose wait was cancelled
+        timeouts        - number of children which timed out, whether
+                          TIMEOUT was raised or matched
+        peak_running    - the most children waited on at the same time
+        queue_time      - seconds the children spent waiting for a slot
+        expect_time     - seconds spent in the children's waits, added up
+        max_expect_time - seconds of the longest wait
+        elapsed         - seconds from the call until the last child was
+                          done
+    """
+
+    _fields = ('started', 'completed', 'failed', 'cancelled', 'timeouts',
+               'peak_running', 'queue_time', 'expect_time', 'max_expect_time',
+               'elapsed')
+
+    clock = staticmethod(getattr(time, 'perf_counter', time.time))
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Set all counters and timers back to zero."""
+        for name in self._fields:
+            setattr(self, name, 0)
+        self.running = 0
+
+    def __str__(self):
+        return '\n'.join('%s: %s' % (name, getattr(self, name))
+                         for name in self._fields)
+
+    def __repr__(self):
+        return '<GatherStats %s>' % ' '.join(
+            '%s=%r' % (name, getattr(self, name)) for name in self._fields)
+
 
 class Expecter(object):
 
@@ -13,27 +120,495 @@ class Expecter(object):
         self.lookback = None
         if hasattr(searcher, 'longest_string'):
             self.lookback = searcher.longest_string
+        # searcher_string can resume a search where the last one stopped;
+        # it is told where the searched data starts in the spawn's output,
+        # and to start afresh when the buffer has been replaced.
+        self._resumable = isinstance(searcher, searcher_string)
+        self._searched_buffer = None
+        self._data_offset = 0
+
+    def fresh_length(self, incoming):
+        """Return how much of the end of the buffer to search after
+        'incoming' has been appended to it: the new data, plus enough of the
+        old data to find a match that straddles the two."""
+        buflen = len(self.spawn._buffer)
+        if self.lookback is None:
+            return buflen
+        return min(buflen, len(incoming) + self.lookback)
+
+    def do_search(self, freshlen):
+        """Search the last 'freshlen' characters of the spawn's buffer. On a
+        match, this sets the spawn's match, match_index, before and after
+        attributes, removes the data up to the end of the match from the
+        buffer and returns the index; otherwise it returns -1."""
+        return self._search(freshlen)[0]
+
+    def _search(self, freshlen, new=0):
+        """do_search(), also returning the data that was searched. 'new' is
+        how many characters at the end of the buffer were just read, for the
+        spawn's stats."""
+        spawn = self.spawn
+        buf = spawn._buffer
+        size = freshlen
+        if self.lookback is not None:
+            # Leave some context before the fresh data, for lookbehind
+            # assertions and anchors.
+            size += self.lookback + 1
+        if self.searchwindowsize is not None:
+            size = max(size, self.searchwindowsize)
+        data = buf.search_data(size)
+        window = self.searchwindowsize
+        if window is not None and window > len(buf):
+            # The data may be more than the buffer, as with mmapspawn, where
+            # it is the whole mapping; keep the window inside the buffer.
+            window = len(buf)
+        if self._resumable:
+            if buf is not self._searched_buffer:
+                self.searcher.restart()
+                self._searched_buffer = buf
+            self._data_offset = buf.data_offset(data)
+        stats = spawn.stats
+        if stats is None:
+            index = self._search_data(data, freshlen, window)
+        else:
+            started = stats.clock()
+            index = self._search_data(data, freshlen, window)
+            stats.search_time += stats.clock() - started
+            stats.searches += 1
+            searched = freshlen
+            if self.searchwindowsize is not None:
+                searched = min(len(data), self.searchwindowsize)
+            stats.bytes_rescanned += max(0, searched - new)
+        if index < 0:
+            return -1, data
+
+        offset = len(buf) - len(data)
+        before, spawn.after = buf.consume(offset + self.searcher.start,
+                                          offset + self.searcher.end)
+        spawn.before = spawn._unspill(before)
+        spawn.match = buf.wrap_match(self.searcher.match)
+        spawn.match_index = index
+        return index, data
+
+    def _search_data(self, data, freshlen, window):
+        if self._resumable:
+            return self.searcher.search(data, freshlen, window,
+                                        self._data_offset)
+        return self.searcher.search(data, freshlen, window)
+
+    def feed(self, incoming):
+        """Append 'incoming', just read from the child, to the spawn's buffer
+        and search it as do_search() does. This is for when something else
+        does the reading, as expect_many() does."""
+        spawn = self.spawn
+        spawn._buffer.write(incoming)
+        spawn._limit_buffer()
+        return self._search(self.fresh_length(incoming), len(incoming))[0]
+
+    def existing_data(self):
+        """For expect_async(): search what is in the buffer already, as
+        expect_loop() does first. Returns the index, or None."""
+        spawn = self.spawn
+        if spawn.stats is not None:
+            spawn.stats.expects += 1
+        index = self._search(len(spawn._buffer))[0]
+        return index if index >= 0 else None
+
+    def new_data(self, data):
+        """For expect_async(): feed() data read by the event loop. Returns
+        the index, or None."""
+        index = self.feed(data)
+        return index if index >= 0 else None
+
+    def errored(self):
+        """For expect_async(): set the spawn's attributes after an error,
+        leaving the buffer as it is."""
+        spawn = self.spawn
+        spawn.before = spawn._buffer.getvalue()
+        spawn.after = None
+        spawn.match = None
+        spawn.match_index = None
+
+    def expect_async(self, timeout=None):
+        """Coroutine version of expect_loop(), for expect(async_=True):
+        the spawn's output is read through an asyncio read pipe transport
+        (see pexpect._async)."""
+        from ._async import expect_async
+        return expect_async(self, timeout)
+
+    def _read(self, timeout):
+        """Read from the spawn, keeping its stats if they are on."""
+        spawn = self.spawn
+        stats = spawn.stats
+        if stats is None:
+            return spawn._read_chunk(spawn._next_read_size(), timeout)
+        started = stats.clock()
+        try:
+            incoming = spawn._read_chunk(spawn._next_read_size(), timeout)
+        finally:
+            stats.read_time += stats.clock() - started
+        if incoming:
+            stats.reads += 1
+            stats.bytes_read += len(incoming)
+        return incoming
+
+    def _search_rest(self, data, pos):
+        """Search 'data' (as returned by _search()) from 'pos' on, without
+        touching the spawn's buffer. Returns the index or -1."""
+        window = self.searchwindowsize
+        if window is not None:
+            window = min(window, len(data) - pos)
+        stats = self.spawn.stats
+        if stats is None:
+            return self._search_data(data, len(data) - pos, window)
+        started = stats.clock()
+        index = self._search_data(data, len(data) - pos, window)
+        stats.search_time += stats.clock() - started
+        stats.searches += 1
+        return index
+
+    def eof(self):
+        """Set the spawn's attributes for end of file, emptying the buffer.
+        Returns the index of EOF in the pattern list, or -1."""
+        spawn = self.spawn
+        spawn.before = spawn._unspill(spawn._buffer.getvalue())
+        spawn._buffer = spawn.buffer_type()
+        spawn.after = EOF
+        index = self.searcher.eof_index
+        spawn.match = EOF if index >= 0 else None
+        spawn.match_index = index if index >= 0 else None
+        return index
+
+    def timeout(self):
+        """Set the spawn's attributes for a timeout, leaving the buffer as it
+        is. Returns the index of TIMEOUT in the pattern list, or -1."""
+        spawn = self.spawn
+        spawn.before = spawn._buffer.getvalue()
+        spawn.after = TIMEOUT
+        index = self.searcher.timeout_index
+        spawn.match = TIMEOUT if index >= 0 else None
+        spawn.match_index = index if index >= 0 else None
+        return index
 
     def expect_loop(self, timeout=-1):
         """Blocking expect"""
+        spawn = self.spawn
         if timeout is not None:
             end_time = time.time() + timeout
+        if spawn.stats is not None:
+            spawn.stats.expects += 1
+
+        try:
+            freshlen = len(spawn._buffer)
+            incoming = b''
+            while True:
+                idx = self._search(freshlen, len(incoming))[0]
+                if idx >= 0:
+                    return idx
+
+                # No match at this point
+                if timeout is not None and timeout < 0:
+                    raise TIMEOUT('Timeout exceeded.')
+
+                # Still have time left, so read more data
+                incoming = self._read(timeout)
+                if not incoming:
+                    raise EOF('End Of File (EOF).')
+                spawn._buffer.write(incoming)
+                spawn._limit_buffer()
+                freshlen = self.fresh_length(incoming)
+                if timeout is not None:
+                    timeout = end_time - time.time()
+        except EOF as e:
+            if self.eof() < 0:
+                self._reraise(e)
+            return spawn.match_index
+        except TIMEOUT as e:
+            if self.timeout() < 0:
+                self._reraise(e)
+            return spawn.match_index
 
+    def _reraise(self, err):
+        """Raise EOF or TIMEOUT, when it is not in the pattern list, with
+        the state of the spawn and of the searcher added to the message."""
+        msg = str(err) + '\n' + str(self.spawn)
+        msg += '\nsearcher: %s' % self.searcher
+        exc = type(err)(msg)
+        exc.__cause__ = None  # in Python 3.x we can use "raise exc from None"
+        raise exc
+
+    def expect_iter(self, timeout=-1, total_timeout=None):
+        """Generator behind spawn.expect_iter(). For each match it sets the
+        spawn's attributes as expect_loop() does and yields the index.
+
+        When the searched data holds more than one match, only the first is
+        removed from the buffer straight away; the rest are found by
+        searching on from the end of the previous one, and the buffer is
+        caught up just once, before more data is read."""
+        spawn = self.spawn
+        searcher = self.searcher
+        if timeout == -1:
+            timeout = spawn.timeout
+        deadline = None
+        if total_timeout is not None:
+            deadline = time.time() + total_timeout
+        if spawn.stats is not None:
+            spawn.stats.expects += 1
+
+        freshlen = len(spawn._buffer)
+        searched = False
         while True:
-            idx = self.searcher.search(self.spawn.buffer, len(self.spawn.buffer))
-            if idx >= 0:
-                return idx
+            end_time = None
+            if timeout is not None:
+                end_time = time.time() + timeout
+            if deadline is not None and (end_time is None or
+                                         deadline < end_time):
+                end_time = deadline
+
+            # Wait for a match, reading as needed.
+            index = -1
+            if not searched:
+                index, data = self._search(freshlen)
+            searched = False
+            while index < 0:
+                remaining = None
+                if end_time is not None:
+                    remaining = max(0, end_time - time.time())
+                try:
+                    incoming = self._read(remaining)
+                except TIMEOUT:
+                    incoming = None
+                except EOF:
+                    incoming = b''
+                if incoming is not None:
+                    if not incoming:
+                        if self.eof() >= 0:
+                            yield spawn.match_index
+                        return
+                    spawn._buffer.write(incoming)
+                    spawn._limit_buffer()
+                    index, data = self._search(self.fresh_length(incoming),
+                                               len(incoming))
+                if (index < 0 and end_time is not None and
+                        time.time() >= end_time):
+                    break
+            if index < 0:
+                if self.timeout() < 0:
+                    raise TIMEOUT('Timeout exceeded in expect_iter().')
+                yield spawn.match_index
+                if end_time == deadline:
+                    return
+                searched = True
+                continue
+            yield index
+
+            # The buffer now holds data[base:]. Look for further matches in
+            # place, until there are no more or the buffer is used elsewhere.
+            # After an empty match, the next search starts one further on.
+            buf = spawn._buffer
+            base = pos = searcher.end
+            nextpos = pos + (searcher.start == searcher.end)
+            view = memoryview(data) if isinstance(data, bytearray) else data
+            while (nextpos <= len(data) and spawn._buffer is buf and
+                   len(buf) == len(data) - base):
+                index = self._search_rest(data, nextpos)
+                if index < 0:
+                    break
+                start, end = searcher.start, searcher.end
+                spawn.before = buf.wrap(view[pos:start])
+                spawn.after = buf.wrap(view[start:end])
+                spawn.match = buf.wrap_match(searcher.match)
+                spawn.match_index = index
+                pos = end
+                nextpos = end + (start == end)
+                yield index
+            if spawn._buffer is buf and len(buf) == len(data) - base:
+                buf.consume(pos - base, pos - base)
+                searched = True
+            else:
+                freshlen = len(spawn._buffer)
+
+
+def expect_many(pairs, timeout=-1):
+    """Wait on many spawn objects at once, from one thread. 'pairs' is a
+    list of (child, pattern) pairs, where 'pattern' is anything expect()
+    takes. This is a generator which yields (child, index) for each child
+    as soon as it matches, until all have matched::
+
+        children = [pexpect.spawn('ssh', [host, 'uptime']) for host in hosts]
+        pattern = [pexpect.EOF, 'load average: ([\\d.]+)']
+        for child, index in pexpect.expect_many([(c, pattern)
+                                                 for c in children]):
+            if index == 1:
+                print(child.args, child.match.group(1))
+
+    Each child's before, after, match and match_index are set as by
+    expect(). All the children's file descriptors are registered in one
+    epoll or poll set (whichever the platform has), and what each read
+    brings in is searched for that child's patterns only. This works with
+    spawn, fdspawn and SocketSpawn, and any other spawn whose child_fd can
+    be polled and whose read_nonblocking() takes a timeout.
+
+    If 'timeout' is -1, each child's own timeout attribute applies, counted
+    from the call. When a child times out, or reaches end of file, without
+    TIMEOUT (or EOF) in its patterns, TIMEOUT (or EOF) is raised, as
+    expect() would; the children still waiting are left as they are.
+
+    A child whose read_nonblocking() is a coroutine, as an AsyncSpawn's is,
+    raises TypeError; wait on those with gather_expect() instead. A child
+    may only appear once in 'pairs': put all its patterns in one list, or
+    ValueError is raised."""
+    started = time.time()
+    pairs = list(pairs)
+    seen = set()
+    for child, pattern in pairs:
+        if inspect.iscoroutinefunction(child.read_nonblocking):
+            raise TypeError('expect_many() cannot read from %r, which is '
+                            'read with coroutines; use gather_expect() '
+                            'instead.' % (child,))
+        if id(child) in seen:
+            raise ValueError('%r appears more than once in expect_many(); '
+                             'give it a single list of patterns.' % (child,))
+        seen.add(id(child))
+    waiting = []
+    for child, pattern in pairs:
+        compiled_pattern_list = child.compile_pattern_list(pattern)
+        exp = Expecter(child, child._re_searcher(compiled_pattern_list))
+        if child.stats is not None:
+            child.stats.expects += 1
+        index = exp.do_search(len(child._buffer))
+        if index >= 0:
+            yield child, index
+            continue
+        child_timeout = child.timeout if timeout == -1 else timeout
+        end_time = None
+        if child_timeout is not None:
+            end_time = started + child_timeout
+        waiting.append((exp, end_time))
+
+    # selectors is only imported here, for pexpect to import where it is
+    # missing (Python 2).
+    import selectors
+    selector = selectors.DefaultSelector()
+    try:
+        for exp, end_time in waiting:
+            selector.register(exp.spawn.child_fd, selectors.EVENT_READ,
+                              (exp, end_time))
+        while selector.get_map():
+            deadlines = [key.data[1] for key in selector.get_map().values()
+                         if key.data[1] is not None]
+            wait = None
+            if deadlines:
+                wait = max(0, min(deadlines) - time.time())
+            ready = [key for key, events in selector.select(wait)]
+            now = time.time()
+            expired = [key for key in selector.get_map().values()
+                       if key.data[1] is not None and key.data[1] <= now
+                       and key not in ready]
+
+            for key in ready:
+                exp = key.data[0]
+                try:
+                    incoming = exp._read(0)
+                except TIMEOUT:
+                    continue
+                except EOF:
+                    incoming = None
+                if not incoming:
+                    selector.unregister(key.fd)
+                    index = exp.eof()
+                    if index < 0:
+                        raise EOF('End Of File (EOF) in expect_many() from '
+                                  '%s.\nsearcher: %s'
+                                  % (exp.spawn, exp.searcher))
+                    yield exp.spawn, index
+                    continue
+                index = exp.feed(incoming)
+                if index >= 0:
+                    selector.unregister(key.fd)
+                    yield exp.spawn, index
+
+            for key in expired:
+                exp = key.data[0]
+                selector.unregister(key.fd)
+                index = exp.timeout()
+                if index < 0:
+                    raise TIMEOUT('Timeout exceeded in expect_many() for '
+                                  '%s.\nsearcher: %s'
+                                  % (exp.spawn, exp.searcher))
+                yield exp.spawn, index
+    finally:
+        selector.close()
+
+
+def gather_expect(pairs, timeout=-1, max_concurrency=None,
+                  return_exceptions=False, close_cancelled=True, stats=None):
+    """Coroutine which waits on many spawn objects at once from the running
+    asyncio event loop, and returns a list of the results, in the order of
+    'pairs'. 'pairs' is a list of (child, pattern) pairs, where 'pattern'
+    is anything expect() takes, and the result for the child is the index
+    expect() would return::
+
+        children = [pexpect.spawn('ssh', [host, 'uptime']) for host in hosts]
+        pattern = [pexpect.EOF, 'load average: ([\\d.]+)']
+        indexes = await pexpect.gather_expect([(c, pattern) for c in children],
+                                              max_concurrency=50)
+
+    'pattern' may also be a coroutine function, which is called with the
+    child, to run a whole dialog; what it returns is the result. This is how
+    to fan the same dialog out to many children::
+
+        async def login(child):
+            await child.expect_async('assword:')
+            child.sendline(password)
+            return await child.expect_async(['\\$ ', 'denied'])
+
+    Each child's expect is expect_async() (with AsyncSpawn, its expect()),
+    so its output is read through a PatternWaiter protocol in the loop.
+
+    At most 'max_concurrency' children are waited on at a time (all of them
+    if it is None); the others wait for a slot, on an asyncio.Semaphore, in
+    the order of 'pairs'. Each child's deadline is counted from when it gets
+    its slot: 'timeout' seconds, or the child's own timeout attribute if
+    'timeout' is -1. A dialog which goes over its deadline is cancelled and
+    TIMEOUT raised, as it is for an expect without TIMEOUT in its patterns.
+
+    As with asyncio.gather(), an exception from one child is raised, unless
+    'return_exceptions' is set, in which case it takes the place of that
+    child's result. Either way, and when this coroutine is cancelled, the
+    children which have not finished are cancelled, and closed if
+    'close_cancelled' is set (an AsyncSpawn by awaiting its close()), since
+    their dialogs were left half done.
+
+    Pass a GatherStats as 'stats' to have the call's counts and timings
+    added to it.
+
+    This and expect_as_completed() need Python 3.6 or later; on older
+    versions, calling them raises ImportError."""
+    from ._async import gather_expect
+    return gather_expect(pairs, timeout, max_concurrency, return_exceptions,
+                         close_cancelled, stats)
+
 
-            # No match
-            if timeout is not None and time.time() > end_time:
-                return self.searcher.timeout_index
+def expect_as_completed(pairs, timeout=-1, max_concurrency=None,
+                        close_cancelled=True, stats=None):
+    """Asynchronous iterator which yields (child, result) for each of the
+    'pairs' as soon as it has a result, as expect_many() does in a thread::
 
-            # Read more data
-            incoming = self.spawn.read_nonblocking(self.spawn.maxread, timeout)
-            if incoming == b'':
-                return self.searcher.eof_index
+        async for child, index in pexpect.expect_as_completed(
+                [(c, pattern) for c in children], max_concurrency=50):
+            if index == 1:
+                print(child.args, child.match.group(1))
 
-            self.spawn.buffer += incoming
+    The arguments are as for gather_expect(). An exception from a child is
+    raised from the iteration. When the iteration ends early, by an
+    exception or by leaving the loop, the children which have not finished
+    are cancelled, and closed if 'close_cancelled' is set. As with any
+    asynchronous generator, that happens when it is closed; wrap it in
+    contextlib.aclosing() for that to be straight away after a ``break``."""
+    from ._async import expect_as_completed
+    return expect_as_completed(pairs, timeout, max_concurrency,
+                               close_cancelled, stats)
 
 
 class searcher_string(object):
@@ -53,8 +628,16 @@ class searcher_string(object):
         end   - index into the buffer, first byte after match
         match - the matching string itself
 
+    When there are at least 'automaton_threshold' strings, they are compiled
+    once into an Aho-Corasick automaton, so that each search is a single pass
+    over the buffer however many strings there are. The automaton state is
+    kept between calls, so when the data searched has only grown since the
+    last unsuccessful search, only the fresh data is scanned. For short lists one
+    str.find() per string is faster, as that loop runs in C.
     """
 
+    automaton_threshold = 32
+
     def __init__(self, strings):
         """This creates an instance of searcher_string. This argument 'strings'
         may be a list; a sequence of strings; or the EOF or TIMEOUT types. """
@@ -72,6 +655,23 @@ class searcher_string(object):
             self._strings.append((n, s))
             if len(s) > self.longest_string:
                 self.longest_string = len(s)
+        self._automaton = None
+        if (len(self._strings) >= self.automaton_threshold and
+                all(s for n, s in self._strings)):
+            self._automaton = _AhoCorasick(self._strings)
+        self.restart()
+
+    def restart(self):
+        """Forget where the last search stopped, so that the next one starts
+        afresh: for when the data to search is not a continuation of what
+        was searched before."""
+        # Where the last unsuccessful automaton scan stopped, as a position
+        # in the data counted as the 'offset' argument of search() counts,
+        # the state it stopped in, and the tail of the data that state was
+        # derived from.
+        self._resume_pos = -1
+        self._resume_state = None
+        self._resume_tail = None
 
     def __str__(self):
         """This returns a human-readable string that represents the state of
@@ -87,13 +687,17 @@ class searcher_string(object):
         ss = list(zip(*ss))[1]
         return '\n'.join(ss)
 
-    def search(self, buffer, freshlen, searchwindowsize=None):
+    def search(self, buffer, freshlen, searchwindowsize=None, offset=0):
         """This searches 'buffer' for the first occurrence of one of the search
         strings.  'freshlen' must indicate the number of bytes at the end of
         'buffer' which have not been searched before. It helps to avoid
         searching the same, possibly big, buffer over and over again.
 
-        See class spawn for the 'searchwindowsize' argument.
+        See class spawn for the 'searchwindowsize' argument. 'offset' is the
+        position of buffer[0] in the data searched so far, so that a search
+        can carry on from the last one when 'buffer' is a slice of that data,
+        or has had its front removed since. By default each buffer is taken
+        to start where the one searched before did.
 
         If there is a match this returns the index of that string, and sets
         'start', 'end' and 'match'. Otherwise, this returns -1. """
@@ -107,15 +711,188 @@ class searcher_string(object):
             searchstart = max(0, absend - searchwindowsize)
             searchend = absend
 
+        if self._automaton is not None:
+            return self._search_automaton(buffer, abstart, searchstart,
+                                          searchend, searchwindowsize,
+                                          offset)
+
+        first_match = searchend
+        best_index = None
         for index, s in self._strings:
             pos = buffer.find(s, searchstart, searchend)
-            if pos >= 0:
-                self.match = s
-                self.start = pos
-                self.end = pos + len(s)
-                return index
+            if 0 <= pos < first_match:
+                first_match = pos
+                best_index, best_match = index, s
+        if best_index is None:
+            return -1
+
+        self.match = best_match
+        self.start = first_match
+        self.end = first_match + len(best_match)
+        return best_index
+
+    def _search_automaton(self, buffer, abstart, searchstart, searchend,
+                          searchwindowsize, offset):
+        """Single pass search of buffer[searchstart:searchend] using the
+        Aho-Corasick automaton. The scan resumes from the saved state if the
+        buffer still ends, at the fresh data, with what was scanned before."""
+        automaton = self._automaton
+        tail_len = self.longest_string - 1
+        state = None
+        pos = self._resume_pos - offset
+        if (searchwindowsize is None and self._resume_pos >= 0 and
+                abstart <= pos <= searchend and
+                buffer[max(0, pos - tail_len):pos] == self._resume_tail):
+            state = self._resume_state
+            searchstart = pos
+        self._resume_pos = -1
+
+        found, state = automaton.search(buffer, searchstart, searchend, state)
+        if found is None:
+            self._resume_pos = offset + searchend
+            self._resume_state = state
+            self._resume_tail = buffer[max(0, searchend - tail_len):searchend]
+            return -1
+
+        start, index, s = found
+        self.match = s
+        self.start = start
+        self.end = start + len(s)
+        return index
+
+
+class _AhoCorasick(object):
+    """Aho-Corasick automaton over a list of (index, string) pairs, used by
+    searcher_string. The strings must be non-empty and all of the same type
+    (bytes or text); the searched buffer must be of that type too.
+
+    States are integers. For each state we keep its goto transitions, its
+    failure link and the strings that end there (including those reached by
+    following failure links), longest first. Full transitions are worked out
+    from these on first use and memoized."""
+
+    def __init__(self, strings):
+        self.strings = strings
+        self.longest = max(len(s) for n, s in strings)
+        goto = [{}]
+        outputs = [[]]
+        for order, (index, s) in enumerate(strings):
+            state = 0
+            for c in s:
+                nxt = goto[state].get(c)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][c] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append((len(s), order))
+
+        # Breadth first construction of the failure links.
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for c, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                if state:
+                    fail[nxt] = goto[f].get(c, 0)
+                outputs[nxt] = outputs[nxt] + outputs[fail[nxt]]
+        for out in outputs:
+            out.sort(key=lambda lo: (-lo[0], lo[1]))
+
+        self.goto = goto
+        self.fail = fail
+        self.outputs = outputs
+        # Memoized transitions, with the failure links already followed.
+        self.trans = [{} for state in goto]
+
+        # While in the root state, skip ahead with a (C speed) regex search
+        # for any byte or character that can start one of the strings.
+        first = sorted(set(re.escape(s[:1]) for n, s in strings))
+        if isinstance(first[0], bytes):
+            self.skip = re.compile(b'[' + b''.join(first) + b']')
+        else:
+            self.skip = re.compile(u'[' + u''.join(first) + u']')
 
-        return -1
+    def _delta(self, state, c):
+        """Transition from 'state' on 'c', following failure links."""
+        goto = self.goto
+        nxt = goto[state].get(c)
+        while nxt is None and state:
+            state = self.fail[state]
+            nxt = goto[state].get(c)
+        return nxt or 0
+
+    def search(self, buffer, start, end, state=None):
+        """Scan buffer[start:end] starting in 'state' (the root if None).
+
+        Returns ((match_start, index, string), state). The match is the
+        leftmost one, ties broken by order in the string list, or None if no
+        string was found. A match may begin before 'start' when scanning
+        resumes from a saved state."""
+        trans = self.trans
+        outputs = self.outputs
+        skip = self.skip.search
+        if state is None:
+            state = 0
+        best = None
+        # Once a match is seen, a string beginning at or left of it can still
+        # complete within the next (longest - 1) elements.
+        limit = end
+        pos = start
+        while pos < limit:
+            if not state:
+                m = skip(buffer, pos, limit)
+                if m is None:
+                    pos = limit
+                    break
+                pos = m.start()
+            c = buffer[pos]
+            nxt = trans[state].get(c)
+            if nxt is None:
+                nxt = trans[state][c] = self._delta(state, c)
+            state = nxt
+            pos += 1
+            out = outputs[state]
+            if out:
+                # outputs are longest first: the rest start further right
+                length, order = out[0]
+                mstart = pos - length
+                if best is None or (mstart, order) < best:
+                    best = (mstart, order)
+                    limit = min(limit, mstart + self.longest)
+        if best is None:
+            return None, state
+        index, s = self.strings[best[1]]
+        return (best[0], index, s), state
+
+    def present(self, buffer, start, end):
+        """Return the set of positions, in the string list, of every string
+        that occurs in buffer[start:end]."""
+        trans = self.trans
+        outputs = self.outputs
+        skip = self.skip.search
+        state = 0
+        seen = set()
+        pos = start
+        while pos < end:
+            if not state:
+                m = skip(buffer, pos, end)
+                if m is None:
+                    break
+                pos = m.start()
+            c = buffer[pos]
+            nxt = trans[state].get(c)
+            if nxt is None:
+                nxt = trans[state][c] = self._delta(state, c)
+            state = nxt
+            pos += 1
+            if outputs[state]:
+                seen.add(state)
+        return set(order for state in seen for length, order in outputs[state])
 
 
 class searcher_re(object):
@@ -135,8 +912,19 @@ class searcher_re(object):
         end   - index into the buffer, first byte after match
         match - the re.match object returned by a successful re.search
 
+    The 'longest_string' attribute is the most a match can span, including
+    anything assertions need to see around it, or None if that is unbounded
+    (e.g. the pattern contains '.*').
+
+    Patterns which begin with a literal and share the same flags are joined
+    into one alternation, so that the buffer is scanned once for all of
+    them. Others (for instance those with backreferences, inline flags or
+    different flags) are searched for one by one. Below 'combine_threshold'
+    such patterns, one search per pattern is faster.
     """
 
+    combine_threshold = 8
+
     def __init__(self, patterns):
         """This creates an instance that searches for 'patterns' Where
         'patterns' may be a list or other sequence of compiled regular
@@ -144,6 +932,7 @@ class searcher_re(object):
         self.eof_index = -1
         self.timeout_index = -1
         self._searches = []
+        self.longest_string = 0
         for n, s in enumerate(patterns):
             if s is EOF:
                 self.eof_index = n
@@ -152,6 +941,17 @@ class searcher_re(object):
                 self.timeout_index = n
                 continue
             self._searches.append((n, s))
+            if self.longest_string is not None:
+                width = _max_width(s)
+                if width is None:
+                    self.longest_string = None
+                elif width > self.longest_string:
+                    self.longest_string = width
+        self._build()
+
+    def _build(self):
+        self._combined, self._joined, self._separate = _combine(
+            self._searches, self.combine_threshold)
 
     def __str__(self):
         """This returns a human-readable string that represents the state of
@@ -188,12 +988,316 @@ class searcher_re(object):
             searchstart = max(0, absend - searchwindowsize)
             searchend = absend
 
-        for index, s in self._searches:
-            match = s.search(buffer, searchstart, searchend)
+        best = self._search(buffer, searchstart, searchend)
+        if best is None:
+            return -1
+
+        start, index, match = best
+        self.match = match
+        self.start = match.start()
+        self.end = match.end()
+        return index
+
+    def _search(self, buffer, searchstart, searchend):
+        """Return (start, index, match) for the first pattern found in
+        buffer[searchstart:searchend], or None."""
+        best = None
+        if self._combined is not None:
+            match = self._combined.search(buffer, searchstart, searchend)
             if match is not None:
-                self.match = match
-                self.start = match.start()
-                self.end = match.end()
-                return index
+                # The earliest match of the alternation is the earliest of
+                # any joined pattern; at that position the first pattern (in
+                # list order) that matches is the one the alternation chose.
+                start = match.start()
+                for index, s in self._joined:
+                    match = s.match(buffer, start, searchend)
+                    if match is not None:
+                        best = (start, index, match)
+                        break
+        for index, s in self._separate:
+            match = s.search(buffer, searchstart, searchend)
+            if match is not None and (
+                    best is None or (match.start(), index) < best[:2]):
+                best = (match.start(), index, match)
+        return best
+
+
+class searcher_prefilter(searcher_re):
+    """A searcher_re for long lists of patterns, such as catalogues of known
+    error messages. It finds the same matches as searcher_re.
+
+    Patterns that searcher_re would join into one alternation are joined
+    here too. For each of the others, the longest run of literal characters
+    that any match must contain is worked out from the parsed expression.
+    These literals go into one Aho-Corasick automaton, which is run once
+    over the searched part of the buffer; then only the patterns whose
+    literal turned up are searched for. Patterns with no such literal (say
+    '\\d+' or anything case-insensitive) are searched for every time.
+
+    Scanning for the literals costs about as much as a search or two, so
+    spawn.expect_list() only uses this searcher for lists of at least
+    'prefilter_threshold' patterns.
+    """
+
+    prefilter_threshold = 16
+
+    def _build(self):
+        searcher_re._build(self)
+        literals = []
+        separate = []
+        for index, s in self._separate:
+            literal = _required_literal(s)
+            if literal is None or (literals and
+                    type(literal) is not type(literals[0][1])):
+                separate.append((index, s))
+            else:
+                literals.append((index, literal))
+        self._separate = separate
+        self._patterns = dict(self._searches)
+        self._literals = literals
+        self._index = _AhoCorasick(literals) if literals else None
+
+    def _search(self, buffer, searchstart, searchend):
+        best = searcher_re._search(self, buffer, searchstart, searchend)
+        if self._index is None:
+            return best
+        found = self._index.present(buffer, searchstart, searchend)
+        for index in sorted(self._literals[order][0] for order in found):
+            if best is not None and index > best[1] and best[0] == searchstart:
+                break
+            match = self._patterns[index].search(buffer, searchstart,
+                                                 searchend)
+            if match is not None and (
+                    best is None or (match.start(), index) < best[:2]):
+                best = (match.start(), index, match)
+        return best
+
+
+class PatternCache(object):
+    """A least recently used cache, shared by all spawn objects, of compiled
+    pattern lists and of the searchers built from them, so that calling
+    expect() over and over with the same patterns does not compile them and
+    build a searcher every time.
+
+    Attributes:
+
+        maxsize - how many entries are kept; 0 turns the cache off
+        hits    - how many lookups found an entry
+        misses  - how many lookups had to build one
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        """Return the value cached for 'key', calling factory() to make it
+        if there is none. Unhashable keys are not cached."""
+        try:
+            hash(key)
+        except TypeError:
+            return factory()
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries[key] = value
+                return value
+        value = factory()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def searcher(self, searcher_class, patterns):
+        """Return a searcher_class instance for 'patterns'. It is a shallow
+        copy of the cached one, so it shares the compiled state but not the
+        results of a search."""
+        patterns = tuple(patterns)
+        return copy.copy(self.get((searcher_class, patterns),
+                                  lambda: searcher_class(patterns)))
+
+    def clear(self):
+        """Empty the cache and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+pattern_cache = PatternCache()
+
+
+_GLOBAL_INLINE_FLAGS = re.compile(r'\(\?[aiLmsux]+\)')
+
+
+def _combine(searches, threshold=2):
+    """Join the (index, compiled pattern) pairs in 'searches' into a single
+    alternation of non-capturing groups, compiled with their common flags.
+
+    Only patterns that begin with a literal are joined: the regular
+    expression engine can then skip quickly to where one of them may start,
+    which is what makes a single pass faster than one search per pattern.
+    Capturing groups around the alternatives would defeat that, so the
+    pattern that matched is found afterwards with pattern.match().
+
+    Returns (combined, joined, separate): the combined pattern (or None if
+    fewer than 'threshold' patterns could be joined), the (index, pattern)
+    pairs it was built from, and those which must be searched for one by
+    one."""
+    joined = []
+    separate = []
+    names = set()
+    for index, s in searches:
+        if joined:
+            first = joined[0][1]
+            if (type(s.pattern) is not type(first.pattern) or
+                    s.flags != first.flags or
+                    names.intersection(s.groupindex)):
+                separate.append((index, s))
+                continue
+        if not _can_join(s):
+            separate.append((index, s))
+            continue
+        names.update(s.groupindex)
+        joined.append((index, s))
+    if len(joined) < max(2, threshold):
+        return None, [], searches
+
+    empty = joined[0][1].pattern[:0]
+    if isinstance(empty, bytes):
+        parts = [b'(?:' + s.pattern + b')' for index, s in joined]
+        source = b'|'.join(parts)
+    else:
+        parts = [u'(?:' + s.pattern + u')' for index, s in joined]
+        source = u'|'.join(parts)
+    try:
+        combined = re.compile(source, joined[0][1].flags)
+    except re.error:
+        return None, [], searches
+    return combined, joined, separate
+
+
+def _can_join(pattern):
+    """Return True if the compiled regular expression 'pattern' may be
+    joined with others by _combine()."""
+    source = pattern.pattern
+    if isinstance(source, bytes):
+        source = source.decode('latin-1')
+    # Global inline flags are only allowed at the start of the expression;
+    # case folding and verbose mode get in the way of the literal prefix.
+    if (pattern.flags & (re.IGNORECASE | re.VERBOSE) or
+            _GLOBAL_INLINE_FLAGS.search(source)):
+        return False
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return False
+    if not len(parsed) or parsed[0][0] is not sre_parse.LITERAL:
+        return False
+    return not _has_backreference(parsed)
+
+
+def _has_backreference(parsed):
+    """Return True if the parsed regular expression refers back to one of
+    its own groups, by number that would be wrong once it is joined."""
+    for op, av in _iter_ops(parsed):
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return True
+    return False
+
+
+def _iter_ops(parsed):
+    """Yield (op, av) for every node of a parsed regular expression."""
+    stack = [parsed]
+    while stack:
+        for op, av in stack.pop():
+            yield op, av
+            for item in av if isinstance(av, (tuple, list)) else (av,):
+                if isinstance(item, sre_parse.SubPattern):
+                    stack.append(item)
+                elif isinstance(item, list):
+                    stack.extend(i for i in item
+                                 if isinstance(i, sre_parse.SubPattern))
+
+
+_REPEATS = tuple(getattr(sre_parse, name) for name in
+                 ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+                 if hasattr(sre_parse, name))
+
+
+def _required_literal(pattern):
+    """Return the longest run of literal characters (bytes or text, like
+    the pattern) that every match of the compiled regular expression
+    'pattern' must contain, or None if there is none."""
+    if pattern.flags & re.IGNORECASE:
+        return None
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return None
+    runs = []
+    _literal_runs(parsed, runs)
+    if not runs:
+        return None
+    run = max(runs, key=len)
+    if isinstance(pattern.pattern, bytes):
+        return bytes(bytearray(run))
+    return u''.join(map(chr, run))
+
+
+def _literal_runs(parsed, runs):
+    """Append to 'runs' the runs of consecutive literal characters (as code
+    lists) that must occur in every match of the parsed 'parsed'. Literals
+    inside groups and repeats of at least one are included; alternatives,
+    optional parts and lookaround are not."""
+    run = []
+    for op, av in parsed:
+        if op is sre_parse.LITERAL:
+            run.append(av)
+            continue
+        if run:
+            runs.append(run)
+            run = []
+        if op is sre_parse.SUBPATTERN:
+            # (group, add_flags, del_flags, pattern); older Pythons have
+            # just (group, pattern).
+            if len(av) == 4 and av[1] & re.IGNORECASE:
+                continue
+            _literal_runs(av[-1], runs)
+        elif op in _REPEATS:
+            if av[0] >= 1:
+                _literal_runs(av[2], runs)
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            _literal_runs(av, runs)
+    if run:
+        runs.append(run)
+
 
-        return -1
+def _max_width(pattern):
+    """Return the most characters a match of the compiled regular expression
+    'pattern' can depend on, or None if that is unbounded or unknown."""
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+        width = parsed.getwidth()[1]
+    except Exception:
+        return None
+    # getwidth() ignores assertions, but lookahead reads past the end of the
+    # match and lookbehind before its start, so their width is added on, as
+    # is one character for anchors such as \b which look at a neighbour.
+    anchored = False
+    for op, av in _iter_ops(parsed):
+        if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            width += av[1].getwidth()[1]
+        elif op is sre_parse.AT:
+            anchored = True
+    width += anchored
+    if width >= _UNBOUNDED:
+        return None
+    return width
@@ -25,9 +25,9 @@ PEXPECT LICENSE
 
 """
 from .spawnbase import SpawnBase
-from .exceptions import ExceptionPexpect, TIMEOUT
-from .utils import select_ignore_interrupts, poll_ignore_interrupts
+from .exceptions import ExceptionPexpect, TIMEOUT, EOF
 import os
+import errno
 __all__ = ['fdspawn']
 
 
@@ -62,6 +62,7 @@ class fdspawn(SpawnBase):
         self.closed = False
         self.name = '<file descriptor %d>' % fd
         self.use_poll = use_poll
+        self._open_read_selector()
 
     def close(self):
         """Close the file descriptor.
@@ -70,6 +71,7 @@ class fdspawn(SpawnBase):
         descriptor was closed elsewhere, :class:`OSError` will be raised.
         """
         if not self.closed:
+            self._close_read_selector()
             os.close(self.child_fd)
             self.closed = True
 
@@ -107,9 +109,9 @@ class fdspawn(SpawnBase):
         self.send(s)
 
     def writelines(self, sequence):
-        """Call self.write() for each item in sequence"""
-        for s in sequence:
-            self.write(s)
+        """Write all the items in sequence, with as few os.writev() calls as
+        the fd will take (see :meth:`send_bulk`)"""
+        self._send_bulk(sequence, -1)
 
     def read_nonblocking(self, size=1, timeout=-1):
         """
@@ -130,19 +132,17 @@ class fdspawn(SpawnBase):
         if timeout == -1:
             timeout = self.timeout
         
-        if self.use_poll:
-            rfd = poll_ignore_interrupts([self.child_fd], timeout)
-        else:
-            rfd = select_ignore_interrupts([self.child_fd], [], [], timeout)[0]
-        
-        if not rfd:
+        if not self._wait_readable(timeout):
             raise TIMEOUT('Timeout exceeded.')
         
         if self.closed:
             raise OSError('File descriptor %d is closed.' % self.child_fd)
 
         try:
-            s = os.read(self.child_fd, size)
+            if self.adaptive_read:
+                s = self._read_drain(size)
+            else:
+                s = os.read(self.child_fd, size)
         except OSError as err:
             if err.args[0] == errno.EIO:
                 # Linux-style EOF
@@ -155,6 +155,6 @@ class fdspawn(SpawnBase):
             self.flag_eof = True
             raise EOF('End Of File (EOF).')
 
-        s = self._decoder.decode(s, final=False)
+        s = self._decode(s)
         self._log(s, 'read')
         return s
@@ -0,0 +1,239 @@
+"""This is like :mod:`pexpect.fdpexpect`, but for regular files, which it
+searches through a memory mapping instead of reading them into a buffer.
+It is meant for looking for markers in big log files.
+
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+import functools
+import mmap
+import os
+import stat
+import time
+from .spawnbase import SpawnBase, _BytesBuffer
+from .exceptions import ExceptionPexpect, TIMEOUT, EOF
+__all__ = ['mmapspawn']
+
+
+class _MmapBuffer(_BytesBuffer):
+    """The buffer of an mmapspawn: the part of the file's mapping from the
+    end of the last match to as far as has been read, which is the end of
+    the mapping. Nothing is copied. The searchers are given the mapping
+    itself, in which positions are those in the buffer plus its start, and
+    'before' and 'after' are memoryviews of it.
+    """
+
+    def __init__(self, spawn):
+        self._spawn = spawn
+        self._map = None
+        self._start = self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def write(self, data):
+        """Take in 'data', which must be what the spawn has just read."""
+        spawn = self._spawn
+        start = spawn._pos - len(data)
+        if self._map is None or self._end != start:
+            # Empty, or the data in between went to read_nonblocking(); the
+            # buffer can only hold one run of the file.
+            self._start = start
+        self._map = spawn._map
+        self._end = spawn._pos
+
+    def getvalue(self):
+        if self._map is None:
+            return b''
+        return self._map[self._start:self._end]
+
+    def search_data(self, size):
+        if self._map is None:
+            return b''
+        return self._map
+
+    def data_offset(self, data):
+        # Positions in the mapping are positions in the file.
+        return 0
+
+    def consume(self, start, end):
+        if self._map is None:
+            return b'', b''
+        view = memoryview(self._map)
+        start += self._start
+        end += self._start
+        before = view[self._start:start]
+        self._start = end
+        return before, view[start:end]
+
+    def discard(self, size):
+        size = min(size, len(self))
+        removed = self._map[self._start:self._start + size]
+        self._start += size
+        return removed
+
+
+class mmapspawn(SpawnBase):
+    """This is like :class:`pexpect.fdpexpect.fdspawn` for a regular file,
+    but rather than reading the file into a buffer, it maps the file into
+    memory, and the searchers run over the mapping in place. 'before' and
+    'after' are slices of the mapping, only copied out when they are looked
+    at. The whole file (or, when following, all that has been added to it)
+    is searched at once, not in maxread sized pieces.
+
+    With follow=True, the file is watched for growth like ``tail -f``: when
+    everything mapped has been searched, its size is checked every
+    follow_interval seconds, and it is mapped again once it has grown,
+    until the expect times out. Otherwise, the end of the file is EOF.
+
+    Only bytes are searched; there is no encoding argument. The file should
+    only ever be appended to while it is mapped: if it is truncated, reading
+    the mapping past its new end kills the process with SIGBUS. When the
+    file is seen to have shrunk, EOF is raised. Patterns anchored with ``^``
+    match only at the start of the file or of a line, not just after the
+    previous match, since the search does not start over from there."""
+
+    def __init__(self, file, follow=False, timeout=30, maxread=2000,
+        searchwindowsize=None, logfile=None, follow_interval=0.1):
+        """This takes the path to a regular file, or its file descriptor
+        (an int) or an object with a fileno() method. A file opened from
+        a path is closed by close(); a descriptor passed in is not."""
+        self.own_fd = False
+        if isinstance(file, (str, bytes)):
+            fd = os.open(file, os.O_RDONLY)
+            self.own_fd = True
+        elif type(file) != type(0) and hasattr(file, 'fileno'):
+            fd = file.fileno()
+        else:
+            fd = file
+        if type(fd) != type(0):
+            raise ExceptionPexpect('The file argument is not a path, an int '
+                                   'or an object with a fileno() method.')
+        try:
+            mode = os.fstat(fd).st_mode
+        except OSError:
+            raise ExceptionPexpect(
+                'The file argument is not a valid file descriptor.')
+        if not stat.S_ISREG(mode):
+            if self.own_fd:
+                os.close(fd)
+            raise ExceptionPexpect('mmapspawn needs a regular file; use '
+                                   'fdspawn for other file descriptors.')
+        self.args = None
+        self.command = None
+        SpawnBase.__init__(self, timeout, maxread, searchwindowsize,
+            logfile)
+        self.child_fd = fd
+        self.closed = False
+        self.name = '<mmap of file descriptor %d>' % fd
+        self.follow = follow
+        self.follow_interval = follow_interval
+        self._map = None
+        # How far into the mapping has been read.
+        self._pos = 0
+        self._remap()
+        self.buffer_type = functools.partial(_MmapBuffer, self)
+        self._buffer = self.buffer_type()
+
+    def close(self):
+        """Unmap the file, and close it if it was opened from a path.
+
+        'before' and 'after' may still be memoryviews of the mapping, in
+        which case it is unmapped once they are gone."""
+        if not self.closed:
+            self._map = None
+            self._buffer = self.buffer_type()
+            if self.own_fd:
+                os.close(self.child_fd)
+            self.closed = True
+
+    def isalive(self):
+        """The file is alive until close() is called."""
+        return not self.closed
+
+    def terminate(self, force=False):
+        """Deprecated and invalid. Just raises an exception."""
+        raise ExceptionPexpect('This method is not valid for files.')
+
+    def send_bulk(self, s, timeout=-1):
+        """Invalid, as the file is only read. Just raises an exception."""
+        raise ExceptionPexpect('This method is not valid for files.')
+
+    def _mapped(self):
+        return 0 if self._map is None else len(self._map)
+
+    def _remap(self):
+        """Map the file again if it has grown, and return True if it has.
+        The old mapping is left to be unmapped when nothing refers to it,
+        as the buffer and earlier slices may. Raises EOF if the file has
+        shrunk."""
+        size = os.fstat(self.child_fd).st_size
+        mapped = self._mapped()
+        if size < mapped:
+            raise EOF('File truncated.')
+        if size == mapped:
+            return False
+        self._map = mmap.mmap(self.child_fd, size, access=mmap.ACCESS_READ)
+        return True
+
+    def _wait_for_data(self, timeout):
+        """Wait for there to be more of the file mapped than has been read,
+        raising EOF at the end of the file when not following it, and
+        TIMEOUT if it has not grown within 'timeout' seconds."""
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        if self._pos < self._mapped():
+            return
+        if not self.follow:
+            if not self._remap():
+                raise EOF('End Of File (EOF).')
+            return
+        if timeout == -1:
+            timeout = self.timeout
+        if timeout is not None:
+            end_time = time.time() + timeout
+        while not self._remap():
+            if timeout is not None:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    raise TIMEOUT('Timeout exceeded.')
+                time.sleep(min(self.follow_interval, remaining))
+            else:
+                time.sleep(self.follow_interval)
+
+    def read_nonblocking(self, size=1, timeout=-1):
+        """Read up to 'size' bytes from the file, and return them as bytes.
+
+        At the end of what is mapped, this maps more of the file if it has
+        grown. Otherwise it raises EOF, or, when following the file, waits
+        up to 'timeout' seconds (self.timeout if -1, forever if None) for
+        it to grow and raises TIMEOUT if it does not."""
+        self._wait_for_data(timeout)
+        s = self._map[self._pos:self._pos + size]
+        self._pos += len(s)
+        self._log(s, 'read')
+        return s
+
+    def _read_chunk(self, size, timeout):
+        """For the expect loop: everything mapped that has not been read,
+        as a memoryview of the mapping, whatever 'size' is."""
+        self._wait_for_data(timeout)
+        s = memoryview(self._map)[self._pos:]
+        self._pos = len(self._map)
+        self._log(s, 'read')
+        return s
@@ -1,5 +1,6 @@
 """Provides an interface like pexpect.spawn interface using subprocess.Popen
 """
+import codecs
 import os
 import threading
 import subprocess
@@ -12,15 +13,65 @@ try:
 except ImportError:
     from Queue import Queue, Empty
 from .spawnbase import SpawnBase, PY3
-from .exceptions import EOF
+from .exceptions import ExceptionPexpect, EOF, TIMEOUT
 from .utils import string_types
+try:
+    import selectors
+except ImportError:  # Python 2
+    selectors = None
+
+# Read the child's output through a thread and a queue, rather than
+# directly: on Windows, where pipes cannot be waited on with a selector,
+# and where there is no selectors module or os.set_blocking() (Python 2).
+_THREADED_READS = (sys.platform == 'win32' or selectors is None or
+                   not hasattr(os, 'set_blocking'))
+
+
+class _Stream(object):
+    """The read state of the child's output pipe which is not being
+    expected on: PopenSpawn swaps it with its own when expect_stderr()
+    switches pipes. See PopenSpawn._stream_attrs."""
+
+    def __init__(self, child_fd, decoder, buffer):
+        self.child_fd = child_fd
+        self._decoder = decoder
+        self._buffer = buffer
+        self.flag_eof = False
+        self._read_reached_eof = False
+        self._log_decoder = None
 
 
 class PopenSpawn(SpawnBase):
+    """Like spawn, but runs the child with subprocess.Popen and talks to it
+    through pipes.
+
+    On POSIX systems the child's stdout is read directly, in
+    read_nonblocking(), waiting for it with a selector like spawn does for
+    its pty, so children cost no more than their pipes. On Windows, where
+    pipes cannot be waited on that way, and on Python 2, a thread per child
+    reads the pipe into a queue instead. child_fd, and so fileno(), is the
+    stdout pipe when it is read directly, for reading only: what is sent
+    goes to proc.stdin.
+
+    The child's stderr goes to the same pipe as its stdout, unless
+    separate_stderr is set (POSIX and Python 3 only). Then it has a pipe and a buffer of
+    its own, which expect_stderr() searches, and is logged to logfile and
+    logfile_stderr. Both pipes are waited on together, so whichever pipe is
+    being expected on, output to the other is read into its buffer as it
+    comes and the child never blocks writing it. They are waited on with a
+    selector of their own, rather than the one for child_fd alone.
+    """
+
+    # What is swapped with the _Stream of the other pipe by expect_stderr().
+    _stream_attrs = ('child_fd', '_decoder', '_buffer', 'flag_eof',
+                     '_read_reached_eof', '_log_decoder')
 
     def __init__(self, cmd, timeout=30, maxread=2000, searchwindowsize=None,
         logfile=None, cwd=None, env=None, encoding=None, codec_errors=
-        'strict', preexec_fn=None):
+        'strict', preexec_fn=None, separate_stderr=False):
+        if separate_stderr and _THREADED_READS:
+            raise ExceptionPexpect('separate_stderr is not supported on '
+                                   'Windows or Python 2.')
         super(PopenSpawn, self).__init__(timeout=timeout, maxread=maxread,
             searchwindowsize=searchwindowsize, logfile=logfile, encoding=
             encoding, codec_errors=codec_errors)
@@ -29,8 +80,8 @@ class PopenSpawn(SpawnBase):
         else:
             self.crlf = self.string_type(os.linesep)
         kwargs = dict(bufsize=0, stdin=subprocess.PIPE, stderr=subprocess.
-            STDOUT, stdout=subprocess.PIPE, cwd=cwd, preexec_fn=preexec_fn,
-            env=env)
+            PIPE if separate_stderr else subprocess.STDOUT, stdout=
+            subprocess.PIPE, cwd=cwd, preexec_fn=preexec_fn, env=env)
         if sys.platform == 'win32':
             startupinfo = subprocess.STARTUPINFO()
             startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
@@ -42,11 +93,31 @@ class PopenSpawn(SpawnBase):
         self.pid = self.proc.pid
         self.closed = False
         self._buf = self.string_type()
-        self._read_queue = Queue()
-        self._read_thread = threading.Thread(target=self._read_incoming)
-        self._read_thread.daemon = True
-        self._read_thread.start()
+        self.logfile_stderr = None
+        if _THREADED_READS:
+            self._read_queue = Queue()
+            self._read_thread = threading.Thread(target=self._read_incoming)
+            self._read_thread.daemon = True
+            self._read_thread.start()
+        else:
+            self.child_fd = self.proc.stdout.fileno()
+            os.set_blocking(self.child_fd, False)
+            # There may be more children than select() can handle.
+            self.use_poll = True
+            if not separate_stderr:
+                self._open_read_selector()
+        if separate_stderr:
+            stderr_fd = self.proc.stderr.fileno()
+            os.set_blocking(stderr_fd, False)
+            self._other = _Stream(stderr_fd, codecs.getincrementaldecoder(
+                encoding)(codec_errors) if encoding is not None else
+                self._decoder, self.buffer_type())
+            self._streams = selectors.DefaultSelector()
+            self._streams.register(self.child_fd, selectors.EVENT_READ)
+            self._streams.register(stderr_fd, selectors.EVENT_READ)
     _read_reached_eof = False
+    _other = None
+    _reading_stderr = False
 
     def _read_incoming(self):
         """Run in a thread to move output from a pipe to a queue."""
@@ -55,12 +126,175 @@ class PopenSpawn(SpawnBase):
                 data = os.read(self.proc.stdout.fileno(), 1024)
             except OSError:
                 # This happens when the fd is closed
-                break
+                data = b''
             if data == b'':
-                self._read_reached_eof = True
+                self._read_queue.put(None)
                 break
             self._read_queue.put(data)
 
+    def read_nonblocking(self, size, timeout=-1):
+        """Read at most 'size' characters from the child's output, waiting
+        up to 'timeout' seconds (self.timeout if -1, forever if None) for
+        some to come. Raises TIMEOUT if none did, and EOF once the output
+        has all been read."""
+        if timeout == -1:
+            timeout = self.timeout
+        if self._read_reached_eof and not self._buf:
+            self.flag_eof = True
+            raise EOF('End Of File (EOF).')
+        if _THREADED_READS:
+            return self._read_queued(size, timeout)
+
+        if timeout is not None:
+            end_time = time.time() + timeout
+        while True:
+            if not self._wait_output(timeout):
+                raise TIMEOUT('Timeout exceeded.')
+            try:
+                return super(PopenSpawn, self).read_nonblocking(size)
+            except BlockingIOError:
+                # Woken up with nothing to read after all.
+                if timeout is not None:
+                    timeout = max(0, end_time - time.time())
+            except EOF:
+                self._read_reached_eof = True
+                if self._other is None:
+                    self._close_read_selector()
+                else:
+                    self._streams.unregister(self.child_fd)
+                raise
+
+    def _wait_output(self, timeout):
+        """Wait up to 'timeout' seconds for the pipe being expected on to
+        become readable, and return True if it did. With separate_stderr,
+        output on the other pipe meanwhile is read into its buffer."""
+        if self._other is None:
+            return self._wait_readable(timeout)
+        if timeout is not None:
+            end_time = time.time() + timeout
+        stats = self.stats
+        while True:
+            ready = False
+            if stats is not None:
+                started = stats.clock()
+            events = self._streams.select(timeout)
+            if stats is not None:
+                stats.select_time += stats.clock() - started
+            for key, mask in events:
+                if key.fd == self.child_fd:
+                    ready = True
+                else:
+                    self._read_other()
+            if ready:
+                return True
+            if timeout is not None:
+                timeout = end_time - time.time()
+                if timeout <= 0:
+                    return False
+
+    def _read_other(self):
+        """Read what there is on the pipe not being expected on into its
+        buffer. Its buffer is kept to maxbuffer by dropping the oldest data,
+        whatever buffer_policy is, as nothing is searching it to match."""
+        other = self._other
+        try:
+            s = os.read(other.child_fd, self.maxread)
+        except BlockingIOError:
+            return
+        if not s:
+            other.flag_eof = other._read_reached_eof = True
+            self._streams.unregister(other.child_fd)
+            return
+        s = other._decoder.decode(s, final=False)
+        # Decoded already, even if expect() is reading for lazy_decode.
+        raw_reads, self._raw_reads = self._raw_reads, False
+        try:
+            self._log_stream(s, stderr=not self._reading_stderr)
+        finally:
+            self._raw_reads = raw_reads
+        other._buffer.write(s)
+        if self.maxbuffer is not None:
+            excess = len(other._buffer) - self.maxbuffer
+            if excess > 0:
+                other._buffer.discard(excess)
+
+    def _swap_streams(self):
+        other = self._other
+        for name in self._stream_attrs:
+            mine = getattr(self, name)
+            setattr(self, name, getattr(other, name))
+            setattr(other, name, mine)
+        self._reading_stderr = not self._reading_stderr
+        # lazy_decode may have been switched while this buffer was parked.
+        fresh = self.buffer_type()
+        if type(self._buffer) is not type(fresh):
+            fresh.write(self._buffer.getvalue())
+            self._buffer = fresh
+
+    def expect_stderr(self, pattern, timeout=-1, searchwindowsize=-1):
+        """Like expect(), but searches the child's stderr, for a spawn made
+        with separate_stderr. before, after and match are set as expect()
+        sets them; the stdout buffer is left alone, save for output read
+        into it meanwhile."""
+        if self._other is None:
+            raise ExceptionPexpect('expect_stderr() needs a spawn made with '
+                                   'separate_stderr=True.')
+        self._swap_streams()
+        try:
+            return self.expect(pattern, timeout=timeout,
+                               searchwindowsize=searchwindowsize)
+        finally:
+            self._swap_streams()
+
+    def _log(self, s, direction):
+        if direction == 'read' and self._reading_stderr:
+            self._log_stream(s, stderr=True)
+        else:
+            super(PopenSpawn, self)._log(s, direction)
+
+    def _log_stream(self, s, stderr):
+        """Log output read from stderr, or from stdout."""
+        if not stderr:
+            return super(PopenSpawn, self)._log(s, 'read')
+        if self._raw_reads and (self.logfile is not None or
+                                self.logfile_stderr is not None):
+            if self._log_decoder is None:
+                self._log_decoder = codecs.getincrementaldecoder(
+                    self.encoding)(self.codec_errors)
+            s = self._log_decoder.decode(s, final=False)
+        for log in (self.logfile, self.logfile_stderr):
+            if log is not None:
+                log.write(s)
+                log.flush()
+
+    def _read_queued(self, size, timeout):
+        """read_nonblocking() for the reader thread's queue."""
+        buf = self._buf
+        if not buf:
+            try:
+                incoming = self._read_queue.get(timeout=timeout)
+            except Empty:
+                raise TIMEOUT('Timeout exceeded.')
+            if incoming is None:
+                self._read_reached_eof = True
+                self.flag_eof = True
+                raise EOF('End Of File (EOF).')
+            buf = self._decode(incoming)
+            # Take whatever else has come in meanwhile.
+            while len(buf) < size:
+                try:
+                    incoming = self._read_queue.get_nowait()
+                except Empty:
+                    break
+                if incoming is None:
+                    self._read_reached_eof = True
+                    break
+                buf += self._decode(incoming)
+
+        r, self._buf = buf[:size], buf[size:]
+        self._log(r, 'read')
+        return r
+
     def write(self, s):
         """This is similar to send() except that there is no return value.
         """
@@ -69,6 +303,18 @@ class PopenSpawn(SpawnBase):
         self.proc.stdin.write(s)
         self.proc.stdin.flush()
 
+    def _send_fd(self):
+        return self.proc.stdin.fileno()
+
+    def _write_buffers(self, buffers, timeout):
+        if sys.platform != 'win32':
+            return super(PopenSpawn, self)._write_buffers(buffers, timeout)
+        # The pipe cannot be polled here; write it in the usual blocking
+        # way, without the timeout.
+        for b in buffers:
+            self.proc.stdin.write(b)
+        self.proc.stdin.flush()
+
     def writelines(self, sequence):
         """This calls write() for each element in the sequence.
 
@@ -3,6 +3,7 @@ import sys
 import time
 import pty
 import tty
+import select
 import errno
 import signal
 from contextlib import contextmanager
@@ -10,13 +11,16 @@ import ptyprocess
 from ptyprocess.ptyprocess import use_native_pty_fork
 from .exceptions import ExceptionPexpect, EOF, TIMEOUT
 from .spawnbase import SpawnBase
-from .utils import which, split_command_line, select_ignore_interrupts, poll_ignore_interrupts
+from .utils import which, split_command_line
 
 
 @contextmanager
 def _wrap_ptyprocess_err():
     """Turn ptyprocess errors into our own ExceptionPexpect errors"""
-    pass
+    try:
+        yield
+    except ptyprocess.PtyProcessError as e:
+        raise ExceptionPexpect(*e.args)
 
 
 PY3 = sys.version_info[0] >= 3
@@ -78,6 +82,56 @@ class spawn(SpawnBase):
         :meth:`~.expect` returns, the full buffer attribute remains up to
         size *maxread* irrespective of *searchwindowsize* value.
 
+        By default the buffer of data that has not yet been matched may grow
+        without limit, for instance while a child prints gigabytes of output
+        before the expected pattern. Set the *maxbuffer* attribute to bound
+        it, in bytes (or characters, with an encoding). What happens to the
+        oldest data when the buffer outgrows it depends on the
+        *maxbuffer_policy* attribute: ``'drop'`` (the default) throws it
+        away, ``'spill'`` moves it to a temporary file, in which case the
+        ``before`` attribute after the next match is that file object,
+        rewound, rather than a string, and ``'raise'`` raises
+        :class:`BufferOverflow`. Patterns are only searched for in the data
+        still in the buffer::
+
+            child = pexpect.spawn('some_command')
+            child.maxbuffer = 10 * 1024 * 1024
+            child.maxbuffer_policy = 'spill'
+            child.expect('Done')
+            shutil.copyfileobj(child.before, fout)
+
+        A child which writes a lot of output in bursts makes the expect
+        methods go round waiting, reading *maxread* bytes and searching many
+        times. Set the *adaptive_read* attribute to True to have each read
+        take all the output pending (as reported by ``FIONREAD``) in one go,
+        into a buffer which is reused from one read to the next. The read
+        size then starts at *maxread*, doubles while reads fill it, up to
+        *adaptive_read_max* bytes, and shrinks back when they do not, so
+        each burst is searched once rather than in *maxread* slices.
+
+        With an *encoding*, everything read is decoded before it is
+        searched. Set the *lazy_decode* attribute to True to keep the buffer
+        as bytes instead, and search it with the patterns encoded once: only
+        ``before``, ``after`` and the groups of ``match`` are decoded, when
+        they are looked at. This works for UTF-8 and for encodings with one
+        byte per character. Regular expressions then see bytes, and those
+        which would match something else there raise ValueError: ``\\w``,
+        ``\\d``, ``\\s`` and ``\\b`` unless compiled with ``re.ASCII``,
+        non-ASCII characters with IGNORECASE, and in UTF-8 ``.``, negated
+        classes, non-ASCII characters in a class and repeated non-ASCII
+        characters, which could match part of a character. Pass those as
+        bytes to search the bytes as they are. *maxbuffer* counts bytes in
+        this mode.
+
+        To find out where the time goes in a slow run, set the *stats*
+        attribute to an :class:`ExpectStats` object. The expect calls then
+        add up in it how much was read and how often, and the time spent
+        waiting for the child, decoding and searching::
+
+            child.stats = pexpect.ExpectStats()
+            child.expect('Done')
+            print(child.stats)
+
         When the keyword argument ``timeout`` is specified as a number,
         (default: *30*), then :class:`TIMEOUT` will be raised after the value
         specified has elapsed, in seconds, for any of the :meth:`~.expect`
@@ -142,6 +196,25 @@ class spawn(SpawnBase):
         second (50 ms) seems to be enough to clear up the problem. You can set
         delaybeforesend to None to return to the old behavior.
 
+        Those 50 ms are paid on every send(), and close() and terminate()
+        similarly sleep for delayafterclose and delayafterterminate before
+        looking whether the child has exited. Set the *low_latency*
+        attribute to True to wait for the events themselves instead, where
+        there is one to wait for: close() and terminate() return as soon as
+        the child exits (watched with a pidfd where the system has them),
+        with the delays only as upper bounds, and waitnoecho() checks the
+        terminal's ECHO flag within a millisecond or two of it changing
+        rather than every tenth of a second. send() simply does not sleep:
+        nothing tells when the child is ready for its input, so the race
+        which delaybeforesend guards against is left to the caller. Wait
+        for a prompt before sending, and call waitnoecho() before sending a
+        password in this mode::
+
+            child.low_latency = True
+            child.expect('Password:')
+            child.waitnoecho()
+            child.sendline(mypassword)
+
         Note that spawn is clever about finding commands on your path.
         It uses the same logic that "which" uses to find executables.
 
@@ -191,13 +264,15 @@ class spawn(SpawnBase):
         self.echo = echo
         self.ignore_sighup = ignore_sighup
         self.__irix_hack = sys.platform.lower().startswith('irix')
+        self.use_poll = use_poll
+        self.low_latency = False
         if command is None:
             self.command = None
             self.args = None
             self.name = '<pexpect factory incomplete>'
         else:
             self._spawn(command, args, preexec_fn, dimensions)
-        self.use_poll = use_poll
+            self._open_read_selector()
 
     def __str__(self):
         """This returns a human-readable string that represents the state of
@@ -283,11 +358,61 @@ class spawn(SpawnBase):
         and SIGINT). """
         if not self.closed:
             self.flush()
-            self.ptyproc.close(force=force)
+            self._close_read_selector()
+            if self.low_latency:
+                self._close_low_latency(force)
+            else:
+                self.ptyproc.close(force=force)
             self.isalive()  # Update exit status
             self.child_fd = -1
             self.closed = True
 
+    def _close_low_latency(self, force):
+        """What ptyproc.close() does, but waiting for the child to exit
+        rather than sleeping for delayafterclose."""
+        ptyproc = self.ptyproc
+        ptyproc.fileobj.close()
+        if not self._wait_exit(self.delayafterclose):
+            if not self.terminate(force):
+                raise ExceptionPexpect('Could not terminate the child.')
+        ptyproc.fd = -1
+        ptyproc.closed = True
+
+    def _wait_exit(self, delay):
+        """Give the child up to 'delay' seconds to exit and return True if it
+        has. Without low_latency this sleeps for 'delay' and then looks; with
+        it, this returns as soon as the child exits: a pidfd for the child is
+        polled where os.pidfd_open() is available, else its status is looked
+        at after short, growing sleeps."""
+        if not self.low_latency:
+            time.sleep(delay)
+            return not self.isalive()
+        if not self.isalive():
+            return True
+        end_time = time.time() + delay
+        pidfd_open = getattr(os, 'pidfd_open', None)
+        if pidfd_open is not None:
+            try:
+                pidfd = pidfd_open(self.pid)
+            except OSError:
+                pass
+            else:
+                try:
+                    poller = select.poll()
+                    poller.register(pidfd, select.POLLIN)
+                    poller.poll(delay * 1000)
+                finally:
+                    os.close(pidfd)
+                return not self.isalive()
+        pause = 0.0005
+        while self.isalive():
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(pause, remaining))
+            pause = min(pause * 2, 0.05)
+        return True
+
     def isatty(self):
         """This returns True if the file descriptor is open and connected to a
         tty(-like) device, else False.
@@ -318,12 +443,15 @@ class spawn(SpawnBase):
             timeout = self.timeout
         if timeout is not None:
             end_time = time.time() + timeout
+        # With low_latency, look again after 1 ms, then less and less often.
+        pause = 0.001 if self.low_latency else 0.1
         while True:
             if not self.getecho():
                 return True
             if timeout is not None and time.time() > end_time:
                 return False
-            time.sleep(0.1)
+            time.sleep(pause)
+            pause = min(pause * 2, 0.1)
 
     def getecho(self):
         """This returns the terminal echo mode. This returns True if echo is
@@ -395,39 +523,85 @@ class spawn(SpawnBase):
         to read, the buffer will be filled, regardless of timeout.
 
         This is a wrapper around os.read(). It uses select.select() or
-        select.poll() to implement the timeout. """
+        select.poll() (epoll where available) to implement the timeout, with
+        a selector which is set up once for the life of the spawn. """
         if timeout == -1:
             timeout = self.timeout
-        
-        if not self.isalive():
-            raise EOF('End Of File (EOF). Child process has exited.')
 
-        if self.use_poll:
-            poller = poll_ignore_interrupts()
-            poller.register(self.child_fd, POLLIN)
-        else:
-            poller = None
-
-        try:
-            s, _ = self._read_nonblocking_impl(size, timeout, poller)
-        except TIMEOUT:
+        if not self.isalive():
+            # The process is dead, but there may or may not be data
+            # available to read. Note that some systems such as Solaris
+            # do not give an EOF when the child dies. In fact, you can
+            # still try to read from the child_fd -- it will block
+            # forever or until TIMEOUT. For that reason, it's important
+            # to do this check before calling select() with timeout.
+            if self._wait_readable(0):
+                return super(spawn, self).read_nonblocking(size)
             self.flag_eof = True
-            raise
+            raise EOF('End Of File (EOF). Braindead platform.')
+        elif self.__irix_hack:
+            # Irix takes a long time before it realizes a child was terminated.
+            # Make sure that the timeout is at least 2 seconds.
+            if timeout is not None and timeout < 2:
+                timeout = 2
+
+        # If there is data available to read right now, read as much as
+        # we can. We do this to increase performance if there are a lot
+        # of bytes to be read. This also avoids calling isalive() too
+        # often.
+        if self._wait_readable(0):
+            try:
+                incoming = super(spawn, self).read_nonblocking(size)
+            except EOF:
+                # Maybe the child is dead: update some attributes in that case
+                self.isalive()
+                raise
+            # Adaptive reads have drained the pty already.
+            while (not self.adaptive_read and len(incoming) < size and
+                    self._wait_readable(0)):
+                try:
+                    incoming += super(spawn, self).read_nonblocking(
+                        size - len(incoming))
+                except EOF:
+                    # Maybe the child is dead: update some attributes in that case
+                    self.isalive()
+                    # Don't raise EOF, just return what we read so far.
+                    return incoming
+            return incoming
+
+        # Because of the check above, we know that no data is available
+        # right now. But if a non-zero timeout is given (possibly
+        # timeout=None), we wait with a timeout.
+        if (timeout != 0) and self._wait_readable(timeout):
+            return super(spawn, self).read_nonblocking(size)
 
-        self._log(s, 'read')
-        return s
+        if not self.isalive():
+            # Some platforms, such as Irix, will claim that their
+            # processes are alive; timeout on the select; and
+            # then finally admit that they are not alive.
+            self.flag_eof = True
+            raise EOF('End of File (EOF). Very slow platform.')
+        else:
+            # Timeout.
+            raise TIMEOUT('Timeout exceeded.')
 
     def write(self, s):
         """This is similar to send() except that there is no return value.
         """
-        pass
+        self.send(s)
 
     def writelines(self, sequence):
-        """This calls write() for each element in the sequence. The sequence
-        can be any iterable object producing strings, typically a list of
-        strings. This does not add line separators. There is no return value.
+        """This writes each element in the sequence. The sequence can be any
+        iterable object producing strings, typically a list of strings. This
+        does not add line separators. There is no return value.
+
+        Unlike calling write() for each element, the strings are written
+        together, with as few os.writev() calls as the child will take, and
+        in full, as :meth:`send_bulk` does. So, as there, :class:`TIMEOUT`
+        is raised if the child has not taken everything within self.timeout
+        seconds.
         """
-        pass
+        self._send_bulk(sequence, -1)
 
     def send(self, s):
         """Sends string ``s`` to the child process, returning the number of
@@ -462,8 +636,21 @@ class spawn(SpawnBase):
             >>> bash.sendline('stty -icanon')
             >>> bash.sendline('base64')
             >>> bash.sendline('x' * 5000)
+
+        To send large amounts of data, use :meth:`send_bulk`, which works
+        around this limit and waits for the child to take everything.
         """
-        pass
+        if self.delaybeforesend is not None and not self.low_latency:
+            time.sleep(self.delaybeforesend)
+        return self._send_now(s)
+
+    def _send_now(self, s):
+        """send() without the delaybeforesend pause."""
+        s = self._coerce_send_string(s)
+        self._log(s, 'send')
+
+        b = self._encoder.encode(s, final=False)
+        return os.write(self.child_fd, b)
 
     def sendline(self, s=''):
         """Wraps send(), sending string ``s`` to child process, with
@@ -471,7 +658,8 @@ class spawn(SpawnBase):
         written.  Only a limited number of bytes may be sent for each
         line in the default terminal mode, see docstring of :meth:`send`.
         """
-        pass
+        s = self._coerce_send_string(s)
+        return self.send(s + self.linesep)
 
     def _log_control(self, s):
         """Write control characters to the appropriate log files"""
@@ -507,14 +695,36 @@ class spawn(SpawnBase):
     def eof(self):
         """This returns True if the EOF exception was ever raised.
         """
-        pass
+        return self.flag_eof
 
     def terminate(self, force=False):
         """This forces a child process to terminate. It starts nicely with
         SIGHUP and SIGINT. If "force" is True then moves onto SIGKILL. This
         returns True if the child was terminated. This returns False if the
         child could not be terminated. """
-        pass
+
+        if not self.isalive():
+            return True
+        try:
+            self.kill(signal.SIGHUP)
+            if self._wait_exit(self.delayafterterminate):
+                return True
+            self.kill(signal.SIGCONT)
+            if self._wait_exit(self.delayafterterminate):
+                return True
+            self.kill(signal.SIGINT)
+            if self._wait_exit(self.delayafterterminate):
+                return True
+            if force:
+                self.kill(signal.SIGKILL)
+                return self._wait_exit(self.delayafterterminate)
+            return False
+        except OSError:
+            # I think there are kernel timing issues that sometimes cause
+            # this to happen. I think isalive() reports True, but the
+            # process is dead to the kernel.
+            # Make one last attempt to see if the kernel is up to date.
+            return self._wait_exit(self.delayafterterminate)
 
     def wait(self):
         """This waits until the child exits. This is a blocking call. This will
@@ -527,7 +737,18 @@ class spawn(SpawnBase):
         previously or :meth:`isalive` method returns False.  It simply returns
         the previously determined exit status.
         """
-        pass
+
+        ptyproc = self.ptyproc
+        with _wrap_ptyprocess_err():
+            # exception may occur if "Is some other process attempting
+            # "job control with our child pid?"
+            exitstatus = ptyproc.wait()
+        self.status = ptyproc.status
+        self.exitstatus = ptyproc.exitstatus
+        self.signalstatus = ptyproc.signalstatus
+        self.terminated = True
+
+        return exitstatus
 
     def isalive(self):
         """This tests if the child process is running or not. This is
@@ -535,13 +756,27 @@ class spawn(SpawnBase):
         exitstatus or signalstatus of the child. This returns True if the child
         process appears to be running or False if not. It can take literally
         SECONDS for Solaris to return the right status. """
-        pass
+
+        ptyproc = self.ptyproc
+        with _wrap_ptyprocess_err():
+            alive = ptyproc.isalive()
+
+        if not alive:
+            self.status = ptyproc.status
+            self.exitstatus = ptyproc.exitstatus
+            self.signalstatus = ptyproc.signalstatus
+            self.terminated = True
+
+        return alive
 
     def kill(self, sig):
         """This sends the given signal to the child application. In keeping
         with UNIX tradition it has a misleading name. It does not necessarily
         kill the child unless you send the right signal. """
-        pass
+
+        # Same as os.kill, but the pid is given for you.
+        if self.isalive():
+            os.kill(self.pid, sig)
 
     def getwinsize(self):
         """This returns the terminal window size of the child tty. The return
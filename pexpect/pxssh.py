@@ -152,20 +152,27 @@ class pxssh(spawn):
         should be read almost immediately. Worst case performance for this
         method is timeout_multiplier * 3 seconds.
         """
-        timeout = self.timeout
-        pause = 0.1
-        max_attempts = 30
-        self.timeout = 0.1
-        for _ in range(int(max_attempts * timeout_multiplier)):
+        # maximum time allowed to read the first response
+        first_char_timeout = timeout_multiplier * 0.5
+        # maximum time allowed between subsequent characters
+        inter_char_timeout = timeout_multiplier * 0.1
+        # maximum time for reading the entire prompt
+        total_timeout = timeout_multiplier * 3.0
+
+        prompt = self.string_type()
+        begin = time.time()
+        expired = 0.0
+        timeout = first_char_timeout
+
+        while expired < total_timeout:
             try:
-                self.read_nonblocking(size=1024, timeout=pause)
-                return True
+                prompt += self.read_nonblocking(size=1, timeout=timeout)
+                expired = time.time() - begin # updated total time expired
+                timeout = inter_char_timeout
             except TIMEOUT:
-                time.sleep(pause)
-            except EOF:
-                return False
-        self.timeout = timeout
-        return False
+                break
+
+        return prompt
 
     def sync_original_prompt(self, sync_multiplier=1.0):
         """This attempts to find the prompt. Basically, press enter and record
@@ -175,7 +182,38 @@ class pxssh(spawn):
         can take 12 seconds. Low latency connections are more likely to fail
         with a low sync_multiplier. Best case sync time gets worse with a
         high sync multiplier (500 ms with default). """
-        pass
+
+        # All of these timing pace values are magic.
+        # I came up with these based on what seemed reliable for
+        # connecting to a heavily loaded machine I have.
+        self.sendline()
+        time.sleep(0.1)
+
+        try:
+            # Clear the buffer before getting the prompt.
+            self.try_read_prompt(sync_multiplier)
+        except TIMEOUT:
+            pass
+
+        self.sendline()
+        self.try_read_prompt(sync_multiplier)
+
+        self.sendline()
+        a = self.try_read_prompt(sync_multiplier)
+
+        self.sendline()
+        b = self.try_read_prompt(sync_multiplier)
+
+        return self._similar_prompts(a, b)
+
+    def _similar_prompts(self, a, b):
+        ld = self.levenshtein_distance(a,b)
+        len_a = len(a)
+        if len_a == 0:
+            return False
+        if float(ld)/len_a < 0.4:
+            return True
+        return False
 
     def login(self, server, username=None, password='', terminal_type=
         'ansi', original_prompt='[#$]', login_timeout=10, port=None,
@@ -231,58 +269,182 @@ class pxssh(spawn):
         namespaces. For example ```cmd="ip netns exec vlan2 ssh"``` to execute the ssh in
         network namespace named ```vlan```.
         """
-        if not spawn_local_ssh:
-            raise NotImplementedError("Non-local SSH spawning is not implemented")
-
-        ssh_options = ''
-        if ssh_key:
-            if isinstance(ssh_key, str):
-                ssh_options += f' -i {ssh_key}'
-            elif ssh_key is True:
-                ssh_options += ' -A'
-        
-        if ssh_config:
-            ssh_options += f' -F {ssh_config}'
-        
-        if port is not None:
-            ssh_options += f' -p {port}'
-        
-        if username is not None:
-            server = f'{username}@{server}'
-        
-        cmd = f'{cmd}{ssh_options} {server}'
-        
+        session_regex_array, session_init_regex_array = \
+            self._login_patterns(original_prompt, password_regex)
+        cmd = self._login_command(server, username, port, ssh_key, quiet,
+                                  check_local_ip, ssh_tunnels,
+                                  spawn_local_ssh, ssh_config, cmd)
         if self.debug_command_string:
-            return cmd
+            return(cmd)
 
-        spawn.__init__(self, cmd, timeout=login_timeout)
+        # Are we asking for a local ssh command or to spawn one in another session?
+        if spawn_local_ssh:
+            spawn._spawn(self, cmd)
+        else:
+            self.sendline(cmd)
+
+        # This does not distinguish between a remote server 'password' prompt
+        # and a local ssh 'passphrase' prompt (for unlocking a private key).
+        i = self.expect(session_init_regex_array, timeout=login_timeout)
+
+        # First phase
+        if i==0:
+            # New certificate -- always accept it.
+            # This is what you get if SSH does not have the remote host's
+            # public key stored in the 'known_hosts' cache.
+            self.sendline("yes")
+            i = self.expect(session_regex_array)
+        if i==2: # password or passphrase
+            self.sendline(password)
+            i = self.expect(session_regex_array)
+        if i==4:
+            self.sendline(terminal_type)
+            i = self.expect(session_regex_array)
 
-        if not self.sync_original_prompt(sync_multiplier):
+        # Second phase
+        try:
+            self._check_login_response(i)
+        except ExceptionPxssh:
             self.close()
-            raise ExceptionPxssh('Could not synchronize with original prompt')
-
+            raise
+        if sync_original_prompt:
+            if not self.sync_original_prompt(sync_multiplier):
+                self.close()
+                raise ExceptionPxssh('could not synchronize with original prompt')
+        # We appear to be in.
+        # set shell prompt to something unique.
         if auto_prompt_reset:
             if not self.set_unique_prompt():
                 self.close()
-                raise ExceptionPxssh('Could not set shell prompt')
-
-        if password:
-            self.waitnoecho()
-            self.sendline(password)
-            try:
-                i = self.expect([original_prompt, password_regex, TIMEOUT], timeout=login_timeout)
-                if i == 1:
-                    self.close()
-                    raise ExceptionPxssh('Password refused')
-                elif i == 2:
-                    self.close()
-                    raise ExceptionPxssh('Login timed out')
-            except EOF:
-                self.close()
-                raise ExceptionPxssh('Unexpected EOF')
-        
+                raise ExceptionPxssh('could not set shell prompt '
+                                     '(received: %r, expected: %r).' % (
+                                         self.before, self.PROMPT,))
         return True
 
+    def _login_patterns(self, original_prompt, password_regex):
+        """The pattern lists of the login dialog: the second adds those
+        which can only come before the first response."""
+        session_regex_array = ["(?i)are you sure you want to continue connecting", original_prompt, password_regex, "(?i)permission denied", "(?i)terminal type", TIMEOUT]
+        session_init_regex_array = []
+        session_init_regex_array.extend(session_regex_array)
+        session_init_regex_array.extend(["(?i)connection closed by remote host", EOF])
+        return session_regex_array, session_init_regex_array
+
+    def _login_command(self, server, username, port, ssh_key, quiet,
+                       check_local_ip, ssh_tunnels, spawn_local_ssh,
+                       ssh_config, cmd):
+        """The ssh command line for login()."""
+        ssh_options = ''.join([" -o '%s=%s'" % (o, v) for (o, v) in self.options.items()])
+        if quiet:
+            ssh_options = ssh_options + ' -q'
+        if not check_local_ip:
+            ssh_options = ssh_options + " -o'NoHostAuthenticationForLocalhost=yes'"
+        if self.force_password:
+            ssh_options = ssh_options + ' ' + self.SSH_OPTS
+        if ssh_config is not None:
+            if spawn_local_ssh and not os.path.isfile(ssh_config):
+                raise ExceptionPxssh('SSH config does not exist or is not a file.')
+            ssh_options = ssh_options + ' -F ' + ssh_config
+        if port is not None:
+            ssh_options = ssh_options + ' -p %s'%(str(port))
+        if ssh_key is not None:
+            # Allow forwarding our SSH key to the current session
+            if ssh_key==True:
+                ssh_options = ssh_options + ' -A'
+            else:
+                if spawn_local_ssh and not os.path.isfile(ssh_key):
+                    raise ExceptionPxssh('private ssh key does not exist or is not a file.')
+                ssh_options = ssh_options + ' -i %s' % (ssh_key)
+
+        # SSH tunnels, make sure you know what you're putting into the lists
+        # under each heading. Do not expect these to open 100% of the time,
+        # The port you're requesting might be bound.
+        #
+        # The structure should be like this:
+        # { 'local': ['2424:localhost:22'],  # Local SSH tunnels
+        # 'remote': ['2525:localhost:22'],   # Remote SSH tunnels
+        # 'dynamic': [8888] } # Dynamic/SOCKS tunnels
+        if ssh_tunnels!={} and isinstance({},type(ssh_tunnels)):
+            tunnel_types = {
+                'local':'L',
+                'remote':'R',
+                'dynamic':'D'
+            }
+            for tunnel_type in tunnel_types.keys():
+                cmd_type = tunnel_types[tunnel_type]
+                if tunnel_type in ssh_tunnels:
+                    tunnels = ssh_tunnels[tunnel_type]
+                    for tunnel in tunnels:
+                        if spawn_local_ssh==False:
+                            tunnel = quote(str(tunnel))
+                        ssh_options = ssh_options + ' -' + cmd_type + ' ' + str(tunnel)
+
+        if username is not None:
+            ssh_options = ssh_options + ' -l ' + username
+        elif ssh_config is None:
+            raise TypeError('login() needs either a username or an ssh_config')
+        else:  # make sure ssh_config has an entry for the server with a username
+            with open(ssh_config, 'rt') as f:
+                lines = [l.strip() for l in f.readlines()]
+
+            server_regex = r'^Host\s+%s\s*$' % server
+            user_regex = r'^User\s+\w+\s*$'
+            config_has_server = False
+            server_has_username = False
+            for line in lines:
+                if not config_has_server and re.match(server_regex, line, re.IGNORECASE):
+                    config_has_server = True
+                elif config_has_server and 'hostname' in line.lower():
+                    pass
+                elif config_has_server and 'host' in line.lower():
+                    server_has_username = False  # insurance
+                    break  # we have left the relevant section
+                elif config_has_server and re.match(user_regex, line, re.IGNORECASE):
+                    server_has_username = True
+                    break
+
+            if not config_has_server:
+                raise TypeError('login() ssh_config has no Host entry for %s' % server)
+            elif not server_has_username:
+                raise TypeError('login() ssh_config has no user entry for %s' % server)
+
+        return cmd + " %s %s" % (ssh_options, server)
+
+    def _check_login_response(self, i):
+        """Raise ExceptionPxssh unless 'i', the index matched after the
+        first phase of login(), means we are in. The caller closes the
+        connection."""
+        if i==7:
+            raise ExceptionPxssh('Could not establish connection to host')
+        if i==0:
+            # This is weird. This should not happen twice in a row.
+            raise ExceptionPxssh('Weird error. Got "are you sure" prompt twice.')
+        elif i==1: # can occur if you have a public key pair set to authenticate.
+            ### TODO: May NOT be OK if expect() got tricked and matched a false prompt.
+            pass
+        elif i==2: # password prompt again
+            # For incorrect passwords, some ssh servers will
+            # ask for the password again, others return 'denied' right away.
+            # If we get the password prompt again then this means
+            # we didn't get the password right the first time.
+            raise ExceptionPxssh('password refused')
+        elif i==3: # permission denied -- password was bad.
+            raise ExceptionPxssh('permission denied')
+        elif i==4: # terminal type again? WTF?
+            raise ExceptionPxssh('Weird error. Got "terminal type" prompt twice.')
+        elif i==5: # Timeout
+            #This is tricky... I presume that we are at the command-line prompt.
+            #It may be that the shell prompt was so weird that we couldn't match
+            #it. Or it may be that we couldn't log in for some other reason. I
+            #can't be sure, but it's safe to guess that we did login because if
+            #I presume wrong and we are not logged in then this should be caught
+            #later when I try to set the shell prompt.
+            pass
+        elif i==6: # Connection closed by remote host
+            raise ExceptionPxssh('connection closed')
+        else: # Unexpected
+            raise ExceptionPxssh('unexpected login response')
+
     def logout(self):
         """Sends exit to the remote shell.
 
@@ -345,3 +507,176 @@ class pxssh(spawn):
                 if i == 0:  # timeout
                     return False
         return True
+
+    async def login_async(self, server, username=None, password='',
+        terminal_type='ansi', original_prompt=r"[#$]", login_timeout=10,
+        port=None, auto_prompt_reset=True, ssh_key=None, quiet=True,
+        sync_multiplier=1, check_local_ip=True,
+        password_regex=r'(?i)(?:password:)|(?:passphrase for key)',
+        ssh_tunnels={}, spawn_local_ssh=True, sync_original_prompt=True,
+        ssh_config=None, cmd='ssh'):
+        """Coroutine version of :meth:`login`, with the same arguments, for
+        logging into many hosts at once from one asyncio event loop::
+
+            async def uptime(host):
+                s = pxssh.pxssh()
+                await s.login_async(host, username, password)
+                s.sendline('uptime')
+                await s.prompt_async()
+                output = s.before
+                await s.logout_async()
+                return output
+
+            outputs = await asyncio.gather(*[uptime(h) for h in hosts])
+
+        The dialog is the same as login()'s, with the expects done through
+        expect_async(), and the pauses of the prompt synchronization and
+        delaybeforesend waited out with asyncio.sleep(). Spawning ssh is
+        not asynchronous, but is quick.
+
+        When these coroutines close the connection, they wait for ssh to
+        exit as AsyncSpawn.close() does, without holding up the event loop.
+        """
+        session_regex_array, session_init_regex_array = \
+            self._login_patterns(original_prompt, password_regex)
+        cmd = self._login_command(server, username, port, ssh_key, quiet,
+                                  check_local_ip, ssh_tunnels,
+                                  spawn_local_ssh, ssh_config, cmd)
+        if self.debug_command_string:
+            return(cmd)
+
+        if spawn_local_ssh:
+            spawn._spawn(self, cmd)
+        else:
+            await self._sendline_async(cmd)
+
+        i = await self.expect_async(session_init_regex_array,
+                                    timeout=login_timeout)
+        if i==0:
+            await self._sendline_async("yes")
+            i = await self.expect_async(session_regex_array)
+        if i==2:
+            await self._sendline_async(password)
+            i = await self.expect_async(session_regex_array)
+        if i==4:
+            await self._sendline_async(terminal_type)
+            i = await self.expect_async(session_regex_array)
+
+        try:
+            self._check_login_response(i)
+        except ExceptionPxssh:
+            await self._close_async()
+            raise
+        if sync_original_prompt:
+            if not await self._sync_original_prompt_async(sync_multiplier):
+                await self._close_async()
+                raise ExceptionPxssh('could not synchronize with original prompt')
+        if auto_prompt_reset:
+            if not await self._set_unique_prompt_async():
+                await self._close_async()
+                raise ExceptionPxssh('could not set shell prompt '
+                                     '(received: %r, expected: %r).' % (
+                                         self.before, self.PROMPT,))
+        return True
+
+    async def prompt_async(self, timeout=-1):
+        """Coroutine version of :meth:`prompt`: returns True if the shell
+        prompt was matched, False if the timeout was reached."""
+        if timeout == -1:
+            timeout = self.timeout
+        i = await self.expect_async([self.PROMPT, TIMEOUT], timeout=timeout)
+        return i == 0
+
+    async def logout_async(self):
+        """Coroutine version of :meth:`logout`."""
+        await self._sendline_async("exit")
+        index = await self.expect_async([EOF, "(?i)there are stopped jobs"])
+        if index == 1:
+            await self._sendline_async("exit")
+            await self.expect_async(EOF)
+        await self._close_async()
+
+    async def _sendline_async(self, s=''):
+        """sendline(), with delaybeforesend waited out in the event loop."""
+        if self.delaybeforesend is not None and not self.low_latency:
+            import asyncio
+            await asyncio.sleep(self.delaybeforesend)
+        return self._send_now(self._coerce_send_string(s) + self.linesep)
+
+    def _async_pipe(self):
+        # A duplicate, as with AsyncSpawn, so that the read transport of the
+        # coroutines closing it at end of file does not close the spawn,
+        # which would block the event loop.
+        return open(os.dup(self.child_fd), 'rb', buffering=0)
+
+    def _close_transport(self):
+        # The duplicate held by the read transport keeps the terminal open,
+        # so it is closed first, for the child to get SIGHUP.
+        if self.async_pw_transport is not None:
+            transport = self.async_pw_transport[1]
+            self.async_pw_transport = None
+            try:
+                transport.close()
+            except RuntimeError:
+                pass  # The event loop is closed.
+            transport.get_extra_info('pipe').close()
+
+    def close(self, force=True):
+        self._close_transport()
+        spawn.close(self, force)
+
+    async def _close_async(self, force=True):
+        """close(), waiting for ssh to exit without blocking the loop."""
+        from pexpect._async_w_await import _close_pty
+        if not self.closed:
+            self._close_transport()
+            await _close_pty(self, force)
+
+    async def _try_read_prompt_async(self, timeout_multiplier):
+        """Coroutine version of try_read_prompt()."""
+        first_char_timeout = timeout_multiplier * 0.5
+        inter_char_timeout = timeout_multiplier * 0.1
+        total_timeout = timeout_multiplier * 3.0
+
+        prompt = self.string_type()
+        begin = time.time()
+        expired = 0.0
+        timeout = first_char_timeout
+
+        while expired < total_timeout:
+            if await self.expect_async(['.+', TIMEOUT], timeout=timeout) == 1:
+                break
+            prompt += self.after
+            expired = time.time() - begin
+            timeout = inter_char_timeout
+
+        return prompt
+
+    async def _sync_original_prompt_async(self, sync_multiplier=1.0):
+        """Coroutine version of sync_original_prompt()."""
+        import asyncio
+        await self._sendline_async()
+        await asyncio.sleep(0.1)
+
+        # Clear the buffer before getting the prompt.
+        await self._try_read_prompt_async(sync_multiplier)
+
+        await self._sendline_async()
+        await self._try_read_prompt_async(sync_multiplier)
+
+        await self._sendline_async()
+        a = await self._try_read_prompt_async(sync_multiplier)
+
+        await self._sendline_async()
+        b = await self._try_read_prompt_async(sync_multiplier)
+
+        return self._similar_prompts(a, b)
+
+    async def _set_unique_prompt_async(self):
+        """Coroutine version of set_unique_prompt()."""
+        for prompt_set in (self.PROMPT_SET_SH, self.PROMPT_SET_CSH,
+                           self.PROMPT_SET_ZSH):
+            await self._sendline_async(prompt_set)
+            if await self.expect_async([TIMEOUT, self.PROMPT], timeout=10) == 1:
+                return True
+        return False
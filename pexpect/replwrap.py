@@ -1,8 +1,11 @@
 """Generic wrapper for read-eval-print-loops, a.k.a. interactive shells
 """
+import collections
 import os.path
 import signal
 import sys
+import threading
+import time
 import pexpect
 PY3 = sys.version_info[0] >= 3
 if PY3:
@@ -28,6 +31,10 @@ class REPLWrapper(object):
       disabling pagers.
     """
 
+    #: How long to wait for the prompt after interrupting incomplete input,
+    #: before interrupting again.
+    interrupt_wait = 0.5
+
     def __init__(self, cmd_or_spawn, orig_prompt, prompt_change, new_prompt
         =PEXPECT_PROMPT, continuation_prompt=PEXPECT_CONTINUATION_PROMPT,
         extra_init_cmd=None):
@@ -50,6 +57,10 @@ class REPLWrapper(object):
         if extra_init_cmd is not None:
             self.run_command(extra_init_cmd)
 
+    def set_prompt(self, orig_prompt, prompt_change):
+        self.child.expect(orig_prompt)
+        self.child.sendline(prompt_change)
+
     def run_command(self, command, timeout=-1, async_=False):
         """Send a command to the REPL, wait for and return output.
 
@@ -65,45 +76,237 @@ class REPLWrapper(object):
           :mod:`asyncio` Future, which you can yield from to get the same
           result that this method would normally give directly.
         """
+        # Split up multiline commands and feed them in bit-by-bit
+        cmdlines = command.splitlines()
+        # splitlines ignores trailing newlines - add it back in manually
+        if command.endswith('\n'):
+            cmdlines.append('')
+        if not cmdlines:
+            raise ValueError("No command was given")
+
         if async_:
-            import asyncio
-            return asyncio.ensure_future(self._run_command_async(command, timeout))
-        
-        self.child.sendline(command)
-        self._expect_prompt(timeout=timeout)
-        
-        # Remove the echoed command and the final prompt
-        return self.child.before.strip()
-
-    async def _run_command_async(self, command, timeout):
-        self.child.sendline(command)
-        await self._expect_prompt_async(timeout=timeout)
-        return self.child.before.strip()
+            from ._async import repl_run_command_async
+            return repl_run_command_async(self, cmdlines, timeout)
+
+        res = []
+        self.child.sendline(cmdlines[0])
+        for line in cmdlines[1:]:
+            self._expect_prompt(timeout=timeout)
+            res.append(self.child.before)
+            self.child.sendline(line)
+
+        # Command was fully submitted, now wait for the next prompt
+        if self._expect_prompt(timeout=timeout) == 1:
+            # We got the continuation prompt - command was incomplete
+            self._interrupt()
+            raise ValueError("Continuation prompt found - input was incomplete:\n"
+                             + command)
+        return u''.join(res + [self.child.before])
+
+    def _interrupt(self, timeout=5):
+        """Interrupt incomplete input, and wait for the main prompt.
+
+        The REPL may still be busy when its continuation prompt is seen, and
+        lose an interrupt which comes before it reads input again, so the
+        interrupt is sent until the prompt comes back. The prompts brought
+        by any sent before then, which came late, are read as well, so that
+        they are not taken for the end of the next command."""
+        end_time = time.time() + timeout
+        while True:
+            self.child.kill(signal.SIGINT)
+            try:
+                if self._expect_prompt(timeout=self.interrupt_wait) == 0:
+                    break
+            except pexpect.TIMEOUT:
+                if time.time() >= end_time:
+                    raise
+        while True:
+            try:
+                self._expect_prompt(timeout=self.interrupt_wait)
+            except pexpect.TIMEOUT:
+                break
 
     def _expect_prompt(self, timeout=-1):
-        return self.child.expect([self.prompt, self.continuation_prompt], timeout=timeout)
+        return self.child.expect_exact([self.prompt, self.continuation_prompt], timeout=timeout)
 
     async def _expect_prompt_async(self, timeout=-1):
-        return await self.child.expect_async([self.prompt, self.continuation_prompt], timeout=timeout)
+        return await self.child.expect_exact([self.prompt, self.continuation_prompt], timeout=timeout, async_=True)
+
+
+class REPLPool(object):
+    """A pool of warm REPLs, started once, which runs batches of commands
+    across all of them at once::
+
+        with REPLPool(replwrap.python, size=8) as pool:
+            results = pool.map(snippets, timeout=10)
+
+    :param factory: A callable which starts a REPL and returns a
+      :class:`REPLWrapper`, such as :func:`python`, :func:`bash` or
+      :func:`zsh` (use :func:`functools.partial` to give it arguments).
+    :param int size: How many REPLs to keep. The default is the number of
+      CPUs. They are started at the same time, in threads.
+
+    A member whose process has died, or which timed out, is closed and
+    replaced by a new one from the factory; :attr:`restarts` counts these.
+    If the factory raises while replacing a member, the command's
+    :class:`~pexpect.EOF` or :class:`~pexpect.TIMEOUT` is raised with the
+    factory's exception as its cause, and the member is started again for
+    the next command it gets.
+    """
+
+    def __init__(self, factory=None, size=None):
+        self.factory = python if factory is None else factory
+        if size is None:
+            size = _cpu_count()
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self.members = [None] * size
+        errors = _in_threads(self._start, range(size))
+        if errors:
+            self.close()
+            raise errors[0]
+
+    def _start(self, slot):
+        self.members[slot] = self.factory()
+
+    def _restart(self, slot):
+        # The slot is left empty until the new member has started, so that
+        # if the factory raises, the next command tries again.
+        member = self.members[slot]
+        self.members[slot] = None
+        if member is not None:
+            try:
+                member.child.close(force=True)
+            except Exception:
+                pass
+        self._start(slot)
+        with self._lock:
+            self.restarts += 1
+
+    def _run(self, slot, command, timeout):
+        member = self.members[slot]
+        if member is None or not member.child.isalive():
+            self._restart(slot)
+        try:
+            return self.members[slot].run_command(command, timeout=timeout)
+        except (pexpect.EOF, pexpect.TIMEOUT) as e:
+            # The REPL died, or is still busy with the command; neither can
+            # be relied on to come back, so start again.
+            try:
+                self._restart(slot)
+            except Exception as restart_error:
+                raise e from restart_error
+            raise
+
+    def map(self, commands, timeout=-1, return_exceptions=False):
+        """Run each of the commands with :meth:`REPLWrapper.run_command`, and
+        return a list of their outputs, in the order of the commands.
+
+        Each member takes the next command from a shared queue as soon as it
+        is free, so a few slow commands do not hold up the rest. The
+        commands should not depend on each other, nor on which member runs
+        them, or on what earlier batches left in its namespace.
+
+        :param int timeout: As for :meth:`REPLWrapper.run_command`, for each
+          command.
+        :param bool return_exceptions: If a command raises (:exc:`ValueError`
+          for incomplete input, or :class:`~pexpect.TIMEOUT` or
+          :class:`~pexpect.EOF`), put the exception in its place in the
+          list. Otherwise, no more commands are started, and the first
+          exception is raised once the running ones are done.
+        """
+        commands = list(commands)
+        results = [None] * len(commands)
+        pending = collections.deque(enumerate(commands))
+        failed = []
+
+        def work(slot):
+            while not failed:
+                try:
+                    index, command = pending.popleft()
+                except IndexError:
+                    return
+                try:
+                    results[index] = self._run(slot, command, timeout)
+                except Exception as e:
+                    if not return_exceptions:
+                        failed.append(e)
+                        return
+                    results[index] = e
+
+        slots = range(min(len(self.members), len(commands)))
+        errors = _in_threads(work, slots)
+        if failed or errors:
+            raise (failed + errors)[0]
+        return results
+
+    def close(self):
+        """Close the REPLs' processes."""
+        for member in self.members:
+            if member is not None:
+                member.child.close(force=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, evalue, tb):
+        self.close()
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def _in_threads(function, args):
+    """Call function(arg) for each of 'args', each in its own thread, and
+    return the exceptions which they raised."""
+    errors = []
+
+    def call(arg):
+        try:
+            function(arg)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(arg,)) for arg in args]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
 
 
 def python(command=sys.executable):
     """Start a Python shell and return a :class:`REPLWrapper` object."""
-    orig_prompt = '>>>'
-    prompt_change = 'import sys; sys.ps1={0!r}; sys.ps2={1!r}'
-    return REPLWrapper(command, orig_prompt, prompt_change)
+    return REPLWrapper(command, u">>> ", u"import sys; sys.ps1={0!r}; sys.ps2={1!r}")
+
+
+def _repl_sh(command, args, non_printable_insert):
+    child = pexpect.spawn(command, args, echo=False, encoding='utf-8')
+
+    # If the user runs 'env', the value of PS1 will be in the output. To avoid
+    # replwrap seeing that as the next prompt, we'll embed the marker characters
+    # for invisible characters in the prompt; these show up when inspecting the
+    # environment variable, but not when bash displays the prompt.
+    ps1 = PEXPECT_PROMPT[:5] + non_printable_insert + PEXPECT_PROMPT[5:]
+    ps2 = PEXPECT_CONTINUATION_PROMPT[:5] + non_printable_insert + PEXPECT_CONTINUATION_PROMPT[5:]
+    prompt_change = u"PS1='{0}' PS2='{1}' PROMPT_COMMAND=''".format(ps1, ps2)
+
+    return REPLWrapper(child, u'\\$', prompt_change,
+                       extra_init_cmd="export PAGER=cat")
 
 
-def bash(command='bash'):
+def bash(command="bash"):
     """Start a bash shell and return a :class:`REPLWrapper` object."""
-    orig_prompt = r'[$#] '
-    prompt_change = "PS1='{0}'; PS2='{1}'"
-    return REPLWrapper(command, orig_prompt, prompt_change)
+    bashrc = os.path.join(os.path.dirname(__file__), 'bashrc.sh')
+    return _repl_sh(command, ['--rcfile', bashrc], non_printable_insert='\\[\\]')
 
 
-def zsh(command='zsh', args=('--no-rcs', '-V', '+Z')):
+def zsh(command="zsh", args=("--no-rcs", "-V", "+Z")):
     """Start a zsh shell and return a :class:`REPLWrapper` object."""
-    orig_prompt = r'[%#] '
-    prompt_change = "PROMPT='{0}'; PROMPT2='{1}'"
-    cmd = [command] + list(args)
-    return REPLWrapper(' '.join(cmd), orig_prompt, prompt_change)
+    return _repl_sh(command, list(args), non_printable_insert='%(!..)')
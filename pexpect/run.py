@@ -91,53 +91,134 @@ def run(command, timeout=30, withexitstatus=False, events=None, extra_args=
     instead of bytes. You can pass *codec_errors* to control how errors in
     encoding and decoding are handled.
     """
-    child = spawn(command, timeout=timeout, maxread=2000, logfile=logfile, cwd=cwd, env=env, **kwargs)
-    
-    if events is None:
-        events = {}
-    if extra_args is None:
-        extra_args = {}
-    
-    output = []
+    if timeout == -1:
+        child = spawn(command, maxread=2000, logfile=logfile, cwd=cwd, env=env,
+                      **kwargs)
+    else:
+        child = spawn(command, timeout=timeout, maxread=2000, logfile=logfile,
+                      cwd=cwd, env=env, **kwargs)
+    patterns, responses = _split_events(events)
+    child_result_list = []
     event_count = 0
-    
     while True:
         try:
-            index = child.expect(list(events.keys()) + [EOF, TIMEOUT], timeout=timeout)
-        except EOF:
-            output.append(child.before)
-            break
+            index = child.expect(patterns)
+            if isinstance(child.after, child.allowed_string_types):
+                child_result_list.append(child.before + child.after)
+            else:
+                # child.after may have been a TIMEOUT or EOF,
+                # which we don't want appended to the list.
+                child_result_list.append(child.before)
+            if isinstance(responses[index], child.allowed_string_types):
+                child.send(responses[index])
+            elif _is_callback(responses[index]):
+                callback_result = responses[index](locals())
+                sys.stdout.flush()
+                if isinstance(callback_result, child.allowed_string_types):
+                    child.send(callback_result)
+                elif callback_result:
+                    break
+            else:
+                _bad_event(index, responses[index])
+            event_count = event_count + 1
         except TIMEOUT:
-            output.append(child.before)
+            child_result_list.append(child.before)
             break
-        
-        output.append(child.before)
-        event_count += 1
-        
-        if index < len(events):
-            event = list(events.values())[index]
-            if isinstance(event, str):
-                child.sendline(event)
-            elif callable(event):
-                callback_result = event({
-                    'child': child,
-                    'event_count': event_count,
-                    'extra_args': extra_args
-                })
-                if callback_result is True:
-                    break
-                elif isinstance(callback_result, str):
-                    child.sendline(callback_result)
-    
+        except EOF:
+            child_result_list.append(child.before)
+            break
+    child_result = child.string_type().join(child_result_list)
     child.close()
-    exitstatus = child.exitstatus
-    
-    output = ''.join(output)
-    
     if withexitstatus:
-        return (output, exitstatus)
+        return (child_result, child.exitstatus)
     else:
-        return output
+        return child_result
+
+
+def _split_events(events):
+    """The pattern list and the responses of run()'s 'events'."""
+    if isinstance(events, list):
+        patterns = [x for x, y in events]
+        responses = [y for x, y in events]
+    elif isinstance(events, dict):
+        patterns = list(events.keys())
+        responses = list(events.values())
+    else:
+        # This assumes EOF or TIMEOUT will eventually cause run to terminate.
+        patterns = None
+        responses = None
+    return patterns, responses
+
+
+def _is_callback(response):
+    return isinstance(response, (types.FunctionType, types.MethodType))
+
+
+def _bad_event(index, response):
+    raise TypeError("parameter `event' at index {index} must be "
+                    "a string, method, or function: {value!r}"
+                    .format(index=index, value=response))
+
+
+def run_async(command, timeout=30, withexitstatus=False, events=None,
+              extra_args=None, logfile=None, cwd=None, env=None, **kwargs):
+    """Coroutine version of run(), for an asyncio event loop: the command is
+    run with :class:`~pexpect.async_spawn.AsyncSpawn`, so that the loop does
+    other things, such as running other commands, while it waits::
+
+        output, status = await pexpect.run_async('ls -l /bin',
+                                                 withexitstatus=True)
+
+    The arguments, and 'events', are as for run(). A callback may also be a
+    coroutine function, in which case what its coroutine returns is taken
+    as the callback's result. The child is always closed before this
+    returns."""
+    from ._async import run_async
+    return run_async(command, timeout, withexitstatus, events, extra_args,
+                     logfile, cwd, env, **kwargs)
+
+
+def run_many(commands, max_concurrency=16, timeout=30, events=None,
+             extra_args=None, logfile=None, cwd=None, env=None, **kwargs):
+    """Run many commands at once, at most 'max_concurrency' at a time, from
+    one asyncio event loop (see run_async()). This is a generator which
+    yields (command, output, exitstatus) for each command as soon as it has
+    finished, so in the order they finish::
+
+        for command, output, status in pexpect.run_many(
+                ['ssh %s uptime' % host for host in hosts],
+                max_concurrency=64):
+            print(command, status, output)
+
+    'commands' may be any iterable; a command is only taken from it when a
+    slot is free. With 'max_concurrency' None, all of them are started
+    straight away. The other arguments apply to every command, as for run().
+    The loop is private to the generator, so this cannot be called from a
+    running event loop; there, gather run_async() calls instead.
+
+    If a command raises, as run() would (for one which is not found, say),
+    the exception is raised here, and the commands still running are
+    stopped and closed. So they are when the generator is closed before it
+    is done.
+
+    This and run_async() need Python 3.6 or later; on older versions,
+    calling them raises ImportError."""
+    import asyncio
+    from ._async import run_many_async
+    loop = asyncio.new_event_loop()
+    results = run_many_async(commands, max_concurrency, timeout, events,
+                             extra_args, logfile, cwd, env, **kwargs)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(results.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        try:
+            loop.run_until_complete(results.aclose())
+        finally:
+            loop.close()
 
 
 def runu(command, timeout=30, withexitstatus=False, events=None, extra_args
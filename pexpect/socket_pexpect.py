@@ -25,12 +25,18 @@ from .exceptions import TIMEOUT, EOF
 from .spawnbase import SpawnBase
 __all__ = ['SocketSpawn']
 
+_MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+
 
 class SocketSpawn(SpawnBase):
     """This is like :mod:`pexpect.fdpexpect` but uses the cross-platform python socket api,
     rather than the unix-specific file descriptor api. Thus, it works with
     remote connections on both unix and windows."""
 
+    #: writelines() joins items into batches of about this many bytes for
+    #: each sendall() call.
+    send_batch = 65536
+
     def __init__(self, socket: socket.socket, args=None, timeout=30,
         maxread=2000, searchwindowsize=None, logfile=None, encoding=None,
         codec_errors='strict', use_poll=False):
@@ -44,6 +50,8 @@ class SocketSpawn(SpawnBase):
         self.closed = False
         self.name = '<socket %s>' % socket
         self.use_poll = use_poll
+        self._recv_buffer = None
+        self._open_read_selector()
 
     def close(self):
         """Close the socket.
@@ -52,6 +60,7 @@ class SocketSpawn(SpawnBase):
         descriptor was closed elsewhere, :class:`OSError` will be raised.
         """
         if not self.closed:
+            self._close_read_selector()
             self.socket.close()
             self.closed = True
 
@@ -78,9 +87,29 @@ class SocketSpawn(SpawnBase):
         self.socket.sendall(s)
 
     def writelines(self, sequence):
-        """Call self.write() for each item in sequence"""
+        """Write all the items in sequence, joined into as few sendall()
+        calls as will each take up to send_batch bytes. Items are coerced
+        and logged as send() would have them; bytes are written as they are
+        even with an encoding."""
+        batch = []
+        pending = 0
         for item in sequence:
-            self.write(item)
+            item = self._coerce_send_string(item)
+            if isinstance(item, bytes):
+                self._log(item if self.encoding is None else
+                          item.decode(self.encoding, self.codec_errors),
+                          'send')
+            else:
+                self._log(item, 'send')
+                item = self._encoder.encode(item, final=False)
+            batch.append(item)
+            pending += len(item)
+            if pending >= self.send_batch:
+                self.socket.sendall(b''.join(batch))
+                batch = []
+                pending = 0
+        if batch:
+            self.socket.sendall(b''.join(batch))
 
     def read_nonblocking(self, size=1, timeout=-1):
         """
@@ -90,28 +119,50 @@ class SocketSpawn(SpawnBase):
         to os.read will not block (timeout parameter is ignored). This is not
         the case for POSIX file-like objects such as sockets and serial ports.
 
-        Use :func:`select.select`, timeout is implemented conditionally for
-        POSIX systems.
+        The socket is waited on with a selector kept for the life of the
+        spawn (see :meth:`_wait_readable`), and read with ``recv_into()``
+        into a buffer which is kept too. Once it is readable, it is read
+        from until *size* bytes have come or it has no more to give.
 
         :param int size: Read at most *size* bytes.
         :param int timeout: Wait timeout seconds for file descriptor to be
             ready to read. When -1 (default), use self.timeout. When 0, poll.
         :return: String containing the bytes read
         """
-        import select
-
         if timeout == -1:
             timeout = self.timeout
 
         try:
-            ready, _, _ = select.select([self.socket], [], [], timeout)
-            if not ready:
+            if not self._wait_readable(timeout):
                 raise TIMEOUT('Timeout exceeded')
-            
-            data = self.socket.recv(size)
-            if not data:
-                raise EOF('End of file')
-            
-            return self.decoder.decode(data, final=False)
+
+            buf = self._recv_buffer
+            if buf is None or len(buf) < size:
+                buf = self._recv_buffer = bytearray(size)
+            with memoryview(buf) as view:
+                n = self.socket.recv_into(view, size)
+                if not n:
+                    raise EOF('End of file')
+                # Drain what else has come, without blocking: a socket with
+                # a timeout waits for it even with MSG_DONTWAIT, so only
+                # what is already pending is read. Where there is no
+                # MSG_DONTWAIT (Windows), one recv is all there is. Errors
+                # are left for the next read, so what came is kept.
+                while (_MSG_DONTWAIT and n < size and
+                       self._wait_readable(0)):
+                    try:
+                        got = self.socket.recv_into(view[n:], size - n,
+                                                    _MSG_DONTWAIT)
+                    except socket.error:
+                        break
+                    if not got:
+                        # EOF; the next read raises it.
+                        break
+                    n += got
+                data = bytes(view[:n])
+
+            return self._decode(data)
+        except socket.timeout:
+            raise TIMEOUT('Timeout exceeded')
         except socket.error as e:
             raise EOF('Connection closed: %s' % str(e))
@@ -1,11 +1,28 @@
-from io import StringIO, BytesIO
 import codecs
 import os
 import sys
 import re
 import errno
-from .exceptions import ExceptionPexpect, EOF, TIMEOUT
-from .expect import Expecter, searcher_string, searcher_re
+import functools
+import select
+import stat
+import tempfile
+import time
+from array import array
+try:
+    import fcntl
+    import termios
+except ImportError:  # Windows
+    fcntl = termios = None
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+from .exceptions import ExceptionPexpect, EOF, TIMEOUT, BufferOverflow
+from .utils import ReadSelector
+from .expect import (Expecter, searcher_string, searcher_re,
+                     searcher_prefilter, pattern_cache)
 PY3 = sys.version_info[0] >= 3
 text_type = str if PY3 else unicode
 
@@ -13,6 +30,482 @@ text_type = str if PY3 else unicode
 class _NullCoder(object):
     """Pass bytes through unchanged."""
 
+    @staticmethod
+    def encode(b, final=False):
+        return b
+
+    @staticmethod
+    def decode(b, final=False):
+        return b
+
+
+class _BytesBuffer(object):
+    """The buffer of bytes read from the child but not yet matched.
+
+    Data is appended to a bytearray in amortized constant time, and searched
+    in place. When a match consumes the front of the buffer, only the data
+    after the match is copied; 'before' and 'after' are handed back as
+    memoryviews of the old array, which is never modified again.
+    """
+
+    def __init__(self, data=b''):
+        self._data = bytearray(data)
+        # How many bytes have been removed from the front.
+        self.consumed = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def write(self, data):
+        self._data += data
+
+    def getvalue(self):
+        return bytes(self._data)
+
+    def search_data(self, size):
+        """Return an object which the searchers can search, ending with (at
+        least) the last 'size' bytes of the buffer."""
+        return self._data
+
+    def data_offset(self, data):
+        """Return the position of data[0], for 'data' as returned by
+        search_data(), counting from the first byte ever written."""
+        return self.consumed + len(self) - len(data)
+
+    def consume(self, start, end):
+        """Remove everything up to 'end' from the buffer, returning the data
+        before 'start' and between 'start' and 'end' as lazy slices."""
+        view = memoryview(self._data)
+        self._data = bytearray(view[end:])
+        self.consumed += end
+        return view[:start], view[start:end]
+
+    def discard(self, size):
+        """Remove and return the oldest 'size' bytes of the buffer."""
+        removed = bytes(self._data[:size])
+        # deleting from the front of a bytearray does not move the rest
+        del self._data[:size]
+        self.consumed += len(removed)
+        return removed
+
+    @staticmethod
+    def wrap(value):
+        """Return a slice of searched data as it should be handed out."""
+        return value
+
+    @staticmethod
+    def wrap_match(match):
+        """Return a searcher's match as it should be handed out."""
+        return match
+
+
+class _TextSlice(tuple):
+    """Chunks of text which make up a lazily joined 'before' or 'after'."""
+
+
+class _TextBuffer(object):
+    """The buffer of text read from the child but not yet matched.
+
+    Text is kept as a list of chunks, so appending does not copy what is
+    already there. Searches are given a string built from just the end of
+    the buffer they need.
+    """
+
+    def __init__(self, data=u''):
+        self._chunks = [data] if data else []
+        self._len = len(data)
+        # How many characters have been removed from the front.
+        self.consumed = 0
+
+    def __len__(self):
+        return self._len
+
+    def write(self, data):
+        if data:
+            self._chunks.append(data)
+            self._len += len(data)
+
+    def getvalue(self):
+        if len(self._chunks) > 1:
+            self._chunks = [u''.join(self._chunks)]
+        return self._chunks[0] if self._chunks else u''
+
+    def search_data(self, size):
+        """Return a string to search, ending with (at least) the last 'size'
+        characters of the buffer."""
+        if size >= self._len:
+            return self.getvalue()
+        if size <= 0:
+            return u''
+        chunks = self._chunks
+        i = len(chunks)
+        n = 0
+        while n < size:
+            i -= 1
+            n += len(chunks[i])
+        return chunks[i][n - size:] + u''.join(chunks[i + 1:])
+
+    def data_offset(self, data):
+        """Return the position of data[0], for 'data' as returned by
+        search_data(), counting from the first character ever written."""
+        return self.consumed + self._len - len(data)
+
+    def consume(self, start, end):
+        """Remove everything up to 'end' from the buffer, returning the text
+        before 'start' and between 'start' and 'end' as lazy slices."""
+        before = []
+        after = []
+        pos = 0
+        chunks = self._chunks
+        for i, chunk in enumerate(chunks):
+            nxt = pos + len(chunk)
+            if pos < start:
+                before.append(chunk[:start - pos])
+            if nxt > start and pos < end:
+                after.append(chunk[max(0, start - pos):end - pos])
+            if nxt >= end:
+                self._chunks = [chunk[end - pos:]] + chunks[i + 1:]
+                break
+            pos = nxt
+        else:
+            self._chunks = []
+        if self._chunks and not self._chunks[0]:
+            del self._chunks[0]
+        self._len -= end
+        self.consumed += end
+        return _TextSlice(before), _TextSlice(after)
+
+    def discard(self, size):
+        """Remove and return the oldest 'size' characters of the buffer."""
+        removed, _ = self.consume(size, size)
+        return u''.join(removed)
+
+    wrap = staticmethod(_BytesBuffer.wrap)
+    wrap_match = staticmethod(_BytesBuffer.wrap_match)
+
+
+class _Undecoded(object):
+    """Bytes from the buffer of a lazy_decode spawn, to be decoded when they
+    are looked at."""
+
+    __slots__ = ('data', 'encoding', 'errors')
+
+    def __init__(self, data, encoding, errors):
+        self.data = data
+        self.encoding = encoding
+        self.errors = errors
+
+    def decode(self):
+        return text_type(self.data, self.encoding, self.errors)
+
+
+class _DecodedMatch(object):
+    """A match object from searching undecoded bytes. The groups it returns
+    are decoded; everything else, such as start() and end(), comes from the
+    bytes match as it is, so positions count bytes."""
+
+    __slots__ = ('_match', '_encoding', '_errors')
+
+    def __init__(self, match, encoding, errors):
+        self._match = match
+        self._encoding = encoding
+        self._errors = errors
+
+    def _decode(self, value):
+        if value is None:
+            return None
+        return value.decode(self._encoding, self._errors)
+
+    def group(self, *groups):
+        value = self._match.group(*groups)
+        if len(groups) > 1:
+            return tuple(self._decode(v) for v in value)
+        return self._decode(value)
+
+    def __getitem__(self, group):
+        return self._decode(self._match[group])
+
+    def groups(self, default=None):
+        return tuple(self._decode(v) for v in self._match.groups(default))
+
+    def groupdict(self, default=None):
+        return dict((k, self._decode(v)) for k, v in
+                    self._match.groupdict(default).items())
+
+    def __getattr__(self, name):
+        return getattr(self._match, name)
+
+    def __repr__(self):
+        return '<decoded %r>' % (self._match,)
+
+
+def _lazy_decodable(encoding):
+    """Whether undecoded bytes in the given encoding can be searched and
+    sliced without cutting characters in two: UTF-8, where patterns made of
+    whole characters can only match at character boundaries, and encodings
+    with one byte per character."""
+    if codecs.lookup(encoding).name == 'utf-8':
+        return True
+    every_byte = bytes(bytearray(range(256)))
+    return len(every_byte.decode(encoding, 'replace')) == 256
+
+
+def _changed_on_bytes(pattern, flags, encoding):
+    """Name what, in the text regular expression 'pattern' compiled with
+    'flags', would match something else once the pattern is encoded to
+    search bytes in 'encoding', or return None if nothing would."""
+    unicode_classes = PY3 or flags & re.UNICODE
+    parsed = sre_parse.parse(pattern.encode(encoding), flags & ~re.UNICODE)
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    multibyte = codecs.lookup(encoding).name == 'utf-8'
+    return _changed_in(parsed, state.flags, unicode_classes, encoding,
+                       multibyte)
+
+
+def _changed_in(subpattern, flags, unicode_classes, encoding, multibyte):
+    c = sre_constants
+    if flags & getattr(re, 'ASCII', 0):
+        unicode_classes = False
+    items = list(subpattern)
+    for i, (op, av) in enumerate(items):
+        if multibyte and _runs_to_ascii(items, i):
+            # Run over whole characters; only what else is in a negated
+            # class is left to look at.
+            body_op, body_av = av[2][0]
+            if body_op == c.IN:
+                changed = _changed_in(
+                    [(c.IN, [item for item in body_av
+                             if item[0] != c.NEGATE])],
+                    flags, unicode_classes, encoding, multibyte)
+                if changed is not None:
+                    return changed
+            continue
+        if op == c.ANY:
+            if multibyte:
+                return "'.'"
+        elif op == c.NOT_LITERAL:
+            if multibyte:
+                return 'a negated class'
+        elif op == c.LITERAL:
+            if av > 0x7f and flags & re.IGNORECASE:
+                return 'a non-ASCII character with IGNORECASE'
+        elif op == c.IN:
+            for item_op, item_av in av:
+                if item_op == c.NEGATE and multibyte:
+                    return 'a negated class'
+                if item_op == c.CATEGORY and unicode_classes:
+                    return r'\w, \d or \s'
+                if item_op == c.LITERAL and item_av > 0x7f and (
+                        multibyte or flags & re.IGNORECASE):
+                    return 'a non-ASCII character in a class'
+                if item_op == c.RANGE and item_av[1] > 0x7f and (
+                        multibyte or flags & re.IGNORECASE or
+                        not _range_kept(item_av[0], item_av[1], encoding)):
+                    return 'a non-ASCII range in a class'
+        elif op == c.AT:
+            if (av in (c.AT_BOUNDARY, c.AT_NON_BOUNDARY) and
+                    unicode_classes):
+                return r'\b or \B'
+        else:
+            if multibyte and op in (c.MAX_REPEAT, c.MIN_REPEAT):
+                # Only the last byte of a character would be repeated.
+                repeated = list(av[2])
+                if (len(repeated) == 1 and repeated[0][0] == c.LITERAL and
+                        repeated[0][1] > 0x7f):
+                    return 'a repeated non-ASCII character'
+            sub_flags = flags
+            if op == c.SUBPATTERN and len(av) == 4:
+                sub_flags = (flags | av[1]) & ~av[2]
+            for sub in _subpatterns(av):
+                changed = _changed_in(sub, sub_flags, unicode_classes,
+                                      encoding, multibyte)
+                if changed is not None:
+                    return changed
+    return None
+
+
+def _runs_to_ascii(items, i):
+    """Whether items[i] is '.' or a negated class repeated greedily without
+    an upper bound, and followed by an ASCII literal. Searching UTF-8 bytes,
+    such a repeat matches single bytes rather than characters, but it can
+    only stop where the literal's byte is, which is never inside a
+    character, so it matches the same as in the text. Alone, under a lazy
+    or counted repeat, or at the end of the pattern, it could stop halfway
+    through a character."""
+    c = sre_constants
+    op, av = items[i]
+    if op != c.MAX_REPEAT or av[0] > 1 or av[1] != c.MAXREPEAT:
+        return False
+    if i + 1 == len(items) or items[i + 1][0] != c.LITERAL or (
+            items[i + 1][1] > 0x7f):
+        return False
+    body = list(av[2])
+    if len(body) != 1:
+        return False
+    body_op, body_av = body[0]
+    return (body_op in (c.ANY, c.NOT_LITERAL) or
+            (body_op == c.IN and (c.NEGATE, None) in body_av))
+
+
+def _subpatterns(av):
+    if isinstance(av, sre_parse.SubPattern):
+        return [av]
+    if isinstance(av, (tuple, list)):
+        return [sub for v in av for sub in _subpatterns(v)]
+    return []
+
+
+def _range_kept(low, high, encoding):
+    """Whether the bytes from 'low' to 'high' in a single byte encoding
+    decode to a range of characters, as in the text pattern."""
+    chars = bytes(bytearray(range(low, high + 1))).decode(encoding, 'replace')
+    return all(ord(ch) == ord(chars[0]) + i for i, ch in enumerate(chars))
+
+
+class _EncodedBuffer(_BytesBuffer):
+    """The buffer of a spawn with an encoding and lazy_decode set.
+
+    The bytes read from the child are kept and searched as _BytesBuffer
+    does, against patterns encoded to match; only what is handed out as
+    'before', 'after' and 'match' is decoded, and only when looked at.
+    Since decoding starts over from each match, a character split between
+    two reads is decoded whole.
+    """
+
+    def __init__(self, encoding, errors, data=b''):
+        _BytesBuffer.__init__(self)
+        self.encoding = encoding
+        self.errors = errors
+        self._utf8 = codecs.lookup(encoding).name == 'utf-8'
+        self.write(data)
+
+    def write(self, data):
+        if isinstance(data, text_type):
+            data = data.encode(self.encoding, self.errors)
+        self._data += data
+
+    def getvalue(self):
+        # An incomplete character at the end is left out until the rest of
+        # it has been read.
+        decoder = codecs.getincrementaldecoder(self.encoding)(self.errors)
+        return decoder.decode(self._data)
+
+    def consume(self, start, end):
+        before, after = _BytesBuffer.consume(self, start, end)
+        return self.wrap(before), self.wrap(after)
+
+    def discard(self, size):
+        data = self._data
+        if self._utf8:
+            # Do not cut a character in two: keep its continuation bytes.
+            while size < len(data) and 0x80 <= data[size] < 0xc0:
+                size += 1
+        removed = _BytesBuffer.discard(self, size)
+        return removed.decode(self.encoding, self.errors)
+
+    def wrap(self, value):
+        return _Undecoded(value, self.encoding, self.errors)
+
+    def wrap_match(self, match):
+        if isinstance(match, bytes):
+            return match.decode(self.encoding, self.errors)
+        return _DecodedMatch(match, self.encoding, self.errors)
+
+
+def _materialize(value):
+    """Turn a lazy slice made by consume() into bytes or text."""
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    if isinstance(value, _TextSlice):
+        return u''.join(value)
+    if isinstance(value, _Undecoded):
+        return value.decode()
+    return value
+
+
+try:
+    _IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 1024
+
+
+def _canonical_chunks(data, limit, eof):
+    """Split 'data' into buffers for a terminal in canonical mode which takes
+    lines of at most 'limit' bytes, newline included. Lines too long for it
+    are cut every limit - 1 bytes, and 'eof' (the terminal's VEOF character)
+    is put after each cut: that hands the part of the line written so far to
+    the reading program, rather than leaving it in the terminal's line
+    buffer to be overrun."""
+    view = memoryview(data)
+    chunks = []
+    start = 0
+    step = limit - 1
+    for m in re.finditer(b'[^\n]{%d,}' % limit, data):
+        for cut in range(m.start() + step, m.end(), step):
+            chunks.append(view[start:cut])
+            chunks.append(eof)
+            start = cut
+    chunks.append(view[start:])
+    return chunks
+
+
+def _write_all(fd, data):
+    """Write all of 'data' to fd, which may take more than one write."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _is_pipe(fd):
+    return stat.S_ISFIFO(os.fstat(fd).st_mode)
+
+
+def _drain_pipe(fd, sink):
+    """Copy whatever is buffered in the pipe fd to sink."""
+    while _pending(fd):
+        _write_all(sink, os.read(fd, 65536))
+
+
+def _pending(fd):
+    """Return how many bytes can be read from fd without blocking, as told
+    by the FIONREAD ioctl, or 0 where that is not available."""
+    if fcntl is None:
+        return 0
+    count = array('i', [0])
+    try:
+        fcntl.ioctl(fd, termios.FIONREAD, count, True)
+    except (IOError, OSError):
+        return 0
+    return count[0]
+
+
+class ExpectMatch(object):
+    """One match found by :meth:`SpawnBase.expect_iter`. 'index', 'match',
+    'before' and 'after' are what the spawn's attributes of the same names
+    were set to; 'before' and 'after' are only copied out of the buffer when
+    they are looked at."""
+
+    __slots__ = ('index', 'match', '_before', '_after')
+
+    def __init__(self, index, match, before, after):
+        self.index = index
+        self.match = match
+        self._before = before
+        self._after = after
+
+    @property
+    def before(self):
+        self._before = _materialize(self._before)
+        return self._before
+
+    @property
+    def after(self):
+        self._after = _materialize(self._after)
+        return self._after
+
+    def __repr__(self):
+        return '<ExpectMatch index=%r after=%r>' % (self.index, self.after)
+
 
 class SpawnBase(object):
     """A base class providing the backwards-compatible spawn API for Pexpect.
@@ -23,6 +516,16 @@ class SpawnBase(object):
     encoding = None
     pid = None
     flag_eof = False
+    use_poll = False
+    _read_selector = None
+    _raw_reads = False
+    _log_decoder = None
+    # How much of the stream passthrough() keeps to search, and reads at once.
+    passthrough_window = 4096
+    passthrough_chunk = 65536
+    _read_scratch = None
+    # The largest read size adaptive reads grow to.
+    adaptive_read_max = 1024 * 1024
 
     def __init__(self, timeout=30, maxread=2000, searchwindowsize=None,
         logfile=None, encoding=None, codec_errors='strict'):
@@ -46,11 +549,17 @@ class SpawnBase(object):
         self.logfile_read = None
         self.logfile_send = None
         self.maxread = maxread
+        self.adaptive_read = False
+        self._read_size = maxread
         self.searchwindowsize = searchwindowsize
         self.delaybeforesend = 0.05
         self.delayafterclose = 0.1
         self.delayafterterminate = 0.1
         self.delayafterread = 0.0001
+        self.maxbuffer = None
+        self.maxbuffer_policy = 'drop'
+        self._spill = None
+        self.stats = None
         self.softspace = False
         self.name = '<' + repr(self) + '>'
         self.closed = True
@@ -59,7 +568,7 @@ class SpawnBase(object):
         if encoding is None:
             self._encoder = self._decoder = _NullCoder()
             self.string_type = bytes
-            self.buffer_type = BytesIO
+            self.buffer_type = _BytesBuffer
             self.crlf = b'\r\n'
             if PY3:
                 self.allowed_string_types = bytes, str
@@ -81,7 +590,7 @@ class SpawnBase(object):
             self._decoder = codecs.getincrementaldecoder(encoding)(codec_errors
                 )
             self.string_type = text_type
-            self.buffer_type = StringIO
+            self.buffer_type = _TextBuffer
             self.crlf = u'\r\n'
             self.allowed_string_types = text_type,
             if PY3:
@@ -91,9 +600,607 @@ class SpawnBase(object):
             self.write_to_stdout = sys.stdout.write
         self.async_pw_transport = None
         self._buffer = self.buffer_type()
-        self._before = self.buffer_type()
+
+    def _get_buffer(self):
+        return self._buffer.getvalue()
+
+    def _set_buffer(self, value):
+        self._buffer = self.buffer_type()
+        self._buffer.write(value)
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    # This property is provided for backwards compatibility (self.buffer used
+    # to be a string/bytes object)
     buffer = property(_get_buffer, _set_buffer)
 
+    def _get_lazy_decode(self):
+        return isinstance(self._buffer, _EncodedBuffer)
+
+    def _set_lazy_decode(self, value):
+        if self.encoding is None or bool(value) == self.lazy_decode:
+            return
+        if value:
+            if not _lazy_decodable(self.encoding):
+                raise ValueError('lazy_decode needs UTF-8 or an encoding '
+                                 'with one byte per character, not %r'
+                                 % (self.encoding,))
+            self.buffer_type = functools.partial(
+                _EncodedBuffer, self.encoding, self.codec_errors)
+        else:
+            self.buffer_type = _TextBuffer
+        data = self._buffer.getvalue()
+        self._buffer = self.buffer_type()
+        self._buffer.write(data)
+
+    # With an encoding, lazy_decode keeps the buffer as bytes, searched
+    # with encoded patterns; see _EncodedBuffer.
+    lazy_decode = property(_get_lazy_decode, _set_lazy_decode)
+
+    # before and after may be set to slices of the buffer, which are only
+    # turned into bytes or text if they are looked at.
+    def _get_before(self):
+        self._before_value = _materialize(self._before_value)
+        return self._before_value
+
+    def _set_before(self, value):
+        self._before_value = value
+
+    before = property(_get_before, _set_before)
+
+    def _get_after(self):
+        self._after_value = _materialize(self._after_value)
+        return self._after_value
+
+    def _set_after(self, value):
+        self._after_value = value
+
+    after = property(_get_after, _set_after)
+
+    def _limit_buffer(self):
+        """Apply the maxbuffer_policy if the buffer is over maxbuffer
+        characters long.
+
+        With 'drop', the oldest data is thrown away. With 'spill', it is
+        moved to a temporary file, and the next match sets 'before' to that
+        file (rewound) rather than to a string. With 'raise', BufferOverflow
+        is raised and the buffer is left as it is."""
+        if self.maxbuffer is None:
+            return
+        excess = len(self._buffer) - self.maxbuffer
+        if excess <= 0:
+            return
+        if self.maxbuffer_policy == 'raise':
+            raise BufferOverflow('Buffer exceeded maxbuffer (%d).'
+                                 % self.maxbuffer)
+        if self.maxbuffer_policy not in ('drop', 'spill'):
+            raise ValueError('Unknown maxbuffer_policy: %r'
+                             % (self.maxbuffer_policy,))
+        removed = self._buffer.discard(excess)
+        if self.maxbuffer_policy == 'spill':
+            if self._spill is None:
+                if self.encoding is None:
+                    self._spill = tempfile.TemporaryFile()
+                else:
+                    self._spill = tempfile.TemporaryFile(
+                        'w+', encoding='utf-8', newline='')
+            self._spill.write(removed)
+
+    def _unspill(self, before):
+        """Return what 'before' should be set to for a match: 'before'
+        itself, or if data has been spilled, the temporary file holding the
+        spilled data followed by 'before'."""
+        spill = self._spill
+        if spill is None:
+            return before
+        self._spill = None
+        spill.write(_materialize(before))
+        spill.seek(0)
+        return spill
+
+    def _log(self, s, direction):
+        if self._raw_reads and (self.logfile is not None or
+                                self.logfile_read is not None):
+            # Undecoded data read for expect() on a lazy_decode spawn.
+            if self._log_decoder is None:
+                self._log_decoder = codecs.getincrementaldecoder(
+                    self.encoding)(self.codec_errors)
+            s = self._log_decoder.decode(s, final=False)
+        if self.logfile is not None:
+            self.logfile.write(s)
+            self.logfile.flush()
+        second_log = self.logfile_send if (direction=='send') else self.logfile_read
+        if second_log is not None:
+            second_log.write(s)
+            second_log.flush()
+
+    def _coerce_send_string(self, s):
+        if self.encoding is None and not isinstance(s, bytes):
+            return s.encode('utf-8')
+        return s
+
+    def _decode(self, s):
+        """Decode bytes read from the child, timing it if stats are kept."""
+        if self._raw_reads:
+            return s
+        stats = self.stats
+        if stats is None:
+            return self._decoder.decode(s, final=False)
+        started = stats.clock()
+        s = self._decoder.decode(s, final=False)
+        stats.decode_time += stats.clock() - started
+        return s
+
+    def _open_read_selector(self):
+        """Set up the selector which _wait_readable() uses for child_fd."""
+        self._close_read_selector()
+        self._read_selector = ReadSelector(self.child_fd, self.use_poll)
+
+    def _close_read_selector(self):
+        if self._read_selector is not None:
+            self._read_selector.close()
+            self._read_selector = None
+
+    def _wait_readable(self, timeout):
+        """Wait up to 'timeout' seconds (forever if None) for child_fd to
+        become readable, and return True if it did. The selector is kept
+        from one call to the next; it is set up again only if child_fd or
+        use_poll have changed."""
+        selector = self._read_selector
+        if (selector is None or selector.fd != self.child_fd or
+                selector.use_poll != self.use_poll):
+            self._open_read_selector()
+            selector = self._read_selector
+        stats = self.stats
+        if stats is None:
+            return selector.wait(timeout)
+        started = stats.clock()
+        ready = selector.wait(timeout)
+        stats.select_time += stats.clock() - started
+        return ready
+
+    def _canonical_limit(self):
+        """Return the longest line, newline included, which the terminal at
+        child_fd takes in canonical mode, and its VEOF character; or None if
+        child_fd is not a terminal in canonical mode.
+
+        Linux allows 4096 bytes (N_TTY_BUF_SIZE) whatever PC_MAX_CANON says,
+        and FreeBSD 1920; other systems use PC_MAX_CANON."""
+        if termios is None:
+            return None
+        try:
+            attrs = termios.tcgetattr(self.child_fd)
+        except (termios.error, OSError):
+            return None
+        if not attrs[3] & termios.ICANON:
+            return None
+        eof = attrs[6][termios.VEOF]
+        if not isinstance(eof, bytes):
+            eof = bytes(bytearray([eof]))
+        if sys.platform.startswith('linux'):
+            return 4096, eof
+        if sys.platform.startswith('freebsd'):
+            return 1920, eof
+        try:
+            return os.fpathconf(self.child_fd, 'PC_MAX_CANON'), eof
+        except (OSError, ValueError):
+            return 255, eof
+
+    def send_bulk(self, s, timeout=-1):
+        """Send 's' to the child in full, however long it is, and return the
+        number of bytes written.
+
+        Where send() makes a single write, which a terminal in canonical
+        mode truncates to its line limit (see :meth:`send`), this keeps
+        writing until everything has been taken:
+
+        * If child_fd is a terminal in canonical mode, lines longer than
+          its limit are cut, with the terminal's VEOF character after each
+          cut, so that the child reads them in parts instead of losing the
+          end of them.
+        * The data is written with os.writev() (os.write() where there is
+          none), partial writes are picked up where they stopped, and when
+          the child is not reading, this waits for it to catch up, with
+          poll() if use_poll is set, else select(). While waiting, any output
+          from the child is read into the buffer, to be matched by the next
+          expect(), so that a child echoing its input cannot block on us.
+        * :class:`TIMEOUT` is raised if the child has not taken everything
+          after *timeout* seconds (-1 for self.timeout, None to wait
+          forever).
+
+        The data goes to the file descriptor which _send_fd() returns:
+        child_fd, unless the child is written to some other way, as
+        PopenSpawn's is. This needs a POSIX system.
+        """
+        return self._send_bulk([s], timeout)
+
+    def _send_fd(self):
+        """The file descriptor send_bulk() writes to."""
+        return self.child_fd
+
+    def _send_bulk(self, strings, timeout):
+        """Encode, log and write out a sequence of strings, as send_bulk()
+        does for one. Many small strings are written with one os.writev()
+        call rather than one write each."""
+        buffers, total = self._bulk_buffers(strings)
+        if total:
+            self._write_buffers(buffers, timeout)
+        return total
+
+    def _bulk_buffers(self, strings):
+        """Encode and log a sequence of strings for sending, and return the
+        buffers to write, cut up for the terminal in canonical mode if
+        child_fd is one, and the number of bytes the strings came to."""
+        encoded = []
+        for s in strings:
+            s = self._coerce_send_string(s)
+            self._log(s, 'send')
+            b = self._encoder.encode(s, final=False)
+            if b:
+                encoded.append(b)
+        total = sum(len(b) for b in encoded)
+        if not total:
+            return [], 0
+        canonical = self._canonical_limit()
+        if canonical is not None:
+            limit, eof = canonical
+            return _canonical_chunks(b''.join(encoded), limit, eof), total
+        return [memoryview(b) for b in encoded], total
+
+    def _write_buffers(self, buffers, timeout):
+        """Write the list of buffers to _send_fd() in full. It is made
+        non-blocking meanwhile: when it is full, this polls for it to become
+        writable, reading the child's output (from child_fd) into the buffer
+        if that comes first."""
+        if fcntl is None:
+            raise ExceptionPexpect('send_bulk() needs a POSIX system.')
+        if timeout == -1:
+            timeout = self.timeout
+        if timeout is not None:
+            end_time = time.time() + timeout
+        fd = self._send_fd()
+        read_fd = self.child_fd
+        flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        if not flags & os.O_NONBLOCK:
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        writev = getattr(os, 'writev', None)  # Not in Python 2
+        poller = None
+        try:
+            i = 0
+            while i < len(buffers):
+                try:
+                    if writev is not None:
+                        n = writev(fd, buffers[i:i + _IOV_MAX])
+                    else:
+                        n = os.write(fd, buffers[i])
+                except OSError as err:
+                    if err.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        raise
+                    n = -1
+                if n >= 0:
+                    while n and n >= len(buffers[i]):
+                        n -= len(buffers[i])
+                        i += 1
+                    if n:
+                        buffers[i] = buffers[i][n:]
+                    continue
+
+                # The child is not keeping up: wait for it, with poll() if
+                # use_poll is set, as ReadSelector does, else with select().
+                if timeout is not None:
+                    timeout = end_time - time.time()
+                    if timeout <= 0:
+                        raise TIMEOUT('Timeout exceeded in send_bulk().')
+                if self.use_poll:
+                    if poller is None:
+                        poller = select.poll()
+                        if read_fd == fd:
+                            poller.register(fd, select.POLLIN |
+                                            select.POLLOUT)
+                        else:
+                            poller.register(fd, select.POLLOUT)
+                            poller.register(read_fd, select.POLLIN)
+                    events = poller.poll(None if timeout is None
+                                         else timeout * 1000)
+                    writable = any(event & select.POLLOUT
+                                   for ready_fd, event in events)
+                    readable = any(ready_fd == read_fd
+                                   for ready_fd, event in events)
+                else:
+                    readable, writable, _ = select.select(
+                        [read_fd], [fd], [], timeout)
+                if readable and not writable:
+                    self._read_while_sending()
+        finally:
+            if not flags & os.O_NONBLOCK:
+                fcntl.fcntl(fd, fcntl.F_SETFL, flags)
+
+    def _read_while_sending(self):
+        try:
+            incoming = self._read_chunk(self._next_read_size(), 0)
+        except TIMEOUT:
+            return
+        self._buffer.write(incoming)
+        self._limit_buffer()
+
+    def passthrough(self, sink, pattern=EOF, timeout=-1):
+        """Forward the child's output to 'sink', a file descriptor or an
+        object with a fileno() method, until 'pattern' is seen, and return
+        its index as expect() does. 'pattern' is anything expect() takes;
+        by default, everything up to EOF is forwarded.
+
+        The output is not decoded, logged or added to the buffer: only the
+        last passthrough_window bytes of it are kept, to find the pattern
+        in. Text patterns are encoded to match the bytes. On a match, the
+        data up to the end of the match has been forwarded, and what was
+        read after it is left in the buffer; 'before' only holds the window
+        before the match.
+
+        When the pattern list only has EOF and TIMEOUT in it, the data does
+        not go through Python at all: it is moved with os.splice() (through
+        a pipe, when neither end is one), else with os.sendfile(), and only
+        if neither works for these file descriptors, read and written.
+
+        With any other pattern, every chunk is read into Python, searched
+        together with the window before it, and written out again, so this
+        costs a copy and a search per passthrough_chunk bytes. That still
+        saves the decoding, logging and buffering which expect() does.
+        """
+        if not isinstance(sink, int):
+            sink = sink.fileno()
+        if timeout == -1:
+            timeout = self.timeout
+        end_time = None if timeout is None else time.time() + timeout
+        if not isinstance(pattern, list):
+            pattern = [pattern]
+        compiled = self.compile_pattern_list(
+            [self._encode_regex(p) for p in pattern])
+        searcher = self._re_searcher(compiled)
+
+        # Data read earlier goes first, starting with any spilled by
+        # maxbuffer_policy 'spill'.
+        self._forward_spill(sink)
+        pending = self._buffer.getvalue()
+        if not isinstance(pending, bytes):
+            pending = pending.encode(self.encoding, self.codec_errors)
+        self._buffer = self.buffer_type()
+
+        window = b''
+        eof = False
+        if all(p is EOF or p is TIMEOUT for p in compiled):
+            _write_all(sink, pending)
+            eof = self._forward(sink, end_time)
+        else:
+            while True:
+                if pending:
+                    data = window + pending
+                    index = searcher.search(data, len(data))
+                    if index >= 0:
+                        start, end = searcher.start, searcher.end
+                        _write_all(sink, memoryview(data)[len(window):end])
+                        self.before = self._passthrough_text(
+                            data[:start], 'replace')
+                        self.after = self._passthrough_text(data[start:end])
+                        self.match = searcher.match
+                        if self.encoding is not None:
+                            self.match = _DecodedMatch(
+                                self.match, self.encoding, self.codec_errors)
+                        self.match_index = index
+                        rest = data[end:]
+                        if not self.lazy_decode:
+                            rest = self._decoder.decode(rest, final=False)
+                        self._buffer.write(rest)
+                        return index
+                    _write_all(sink, pending)
+                    window = data[-self.passthrough_window:]
+                remaining = None
+                if end_time is not None:
+                    remaining = max(0, end_time - time.time())
+                if not self._wait_readable(remaining):
+                    break
+                pending = self._read_passthrough()
+                if not pending:
+                    eof = True
+                    break
+
+        self.before = self._passthrough_text(window, 'replace')
+        if eof:
+            self.flag_eof = True
+            self.after = EOF
+            index = searcher.eof_index
+        else:
+            self.after = TIMEOUT
+            index = searcher.timeout_index
+        if index < 0:
+            if eof:
+                raise EOF('End Of File (EOF) in passthrough().')
+            raise TIMEOUT('Timeout exceeded in passthrough().')
+        self.match = self.after
+        self.match_index = index
+        return index
+
+    def _forward_spill(self, sink):
+        """Write the data spilled from the buffer to sink, encoded as the
+        child sent it, and drop the spill file."""
+        spill = self._spill
+        if spill is None:
+            return
+        self._spill = None
+        try:
+            spill.seek(0)
+            while True:
+                chunk = spill.read(self.passthrough_chunk)
+                if not chunk:
+                    break
+                if not isinstance(chunk, bytes):
+                    chunk = chunk.encode(self.encoding, self.codec_errors)
+                _write_all(sink, chunk)
+        finally:
+            spill.close()
+
+    def _encode_regex(self, p):
+        """Return a text regular expression, plain or compiled, as bytes.
+        With lazy_decode, raise ValueError if it would then match something
+        else, as what the spawn searches would not be what it hands out."""
+        if self.lazy_decode:
+            if isinstance(p, text_type):
+                pattern = p
+                flags = re.IGNORECASE if self.ignorecase else 0
+            else:
+                pattern = getattr(p, 'pattern', None)
+                flags = getattr(p, 'flags', 0)
+            if isinstance(pattern, text_type):
+                changed = _changed_on_bytes(pattern, flags, self.encoding)
+                if changed is not None:
+                    raise ValueError(
+                        'Pattern %r would match something else searched as '
+                        '%s bytes, because of %s in it. Pass it as bytes, '
+                        'use re.ASCII for \\w, \\d, \\s and \\b, or turn '
+                        'lazy_decode off.' % (pattern, self.encoding, changed))
+        return self._encode_pattern(p)
+
+    def _encode_pattern(self, p):
+        """Return a text pattern, plain or compiled, as bytes."""
+        if isinstance(p, text_type):
+            return p.encode(self.encoding or 'ascii')
+        if isinstance(getattr(p, 'pattern', None), text_type):
+            return re.compile(p.pattern.encode(self.encoding or 'ascii'),
+                              p.flags & ~re.UNICODE)
+        return p
+
+    def _passthrough_text(self, data, errors=None):
+        if self.encoding is None:
+            return data
+        return data.decode(self.encoding, errors or self.codec_errors)
+
+    def _read_passthrough(self):
+        """Read a chunk for passthrough(), returning b'' at EOF."""
+        try:
+            data = os.read(self.child_fd, self.passthrough_chunk)
+        except OSError as err:
+            if err.args[0] == errno.EIO:
+                return b''
+            raise
+        if self.stats is not None and data:
+            self.stats.reads += 1
+            self.stats.bytes_read += len(data)
+        return data
+
+    def _forward(self, sink, end_time):
+        """Move the child's output to sink until EOF, returning True, or
+        until end_time, returning False. The first way of moving the data
+        which these file descriptors allow is kept."""
+        source = self.child_fd
+        size = self.passthrough_chunk
+        relay = None
+        moves = []
+        if getattr(os, 'splice', None) is not None:
+            if _is_pipe(source) or _is_pipe(sink):
+                moves.append(lambda: os.splice(source, sink, size))
+            else:
+                relay = os.pipe()
+
+                def move():
+                    n = os.splice(source, relay[1], size)
+                    done = 0
+                    while done < n:
+                        done += os.splice(relay[0], sink, n - done)
+                    return n
+                moves.append(move)
+        if getattr(os, 'sendfile', None) is not None:
+            moves.append(lambda: os.sendfile(sink, source, None, size))
+
+        def copy():
+            data = self._read_passthrough()
+            _write_all(sink, data)
+            return len(data)
+        moves.append(copy)
+
+        try:
+            while True:
+                remaining = None
+                if end_time is not None:
+                    remaining = max(0, end_time - time.time())
+                if not self._wait_readable(remaining):
+                    return False
+                while True:
+                    try:
+                        n = moves[0]()
+                        break
+                    except OSError as err:
+                        if err.args[0] == errno.EIO:
+                            return True
+                        if (err.args[0] not in (errno.EINVAL, errno.ENOSYS)
+                                or len(moves) == 1):
+                            raise
+                        # Not supported for these file descriptors.
+                        if relay is not None:
+                            _drain_pipe(relay[0], sink)
+                        del moves[0]
+                if not n:
+                    return True
+                if moves[0] is not copy:
+                    moves[1:] = []
+                    if self.stats is not None:
+                        self.stats.reads += 1
+                        self.stats.bytes_read += n
+        finally:
+            if relay is not None:
+                os.close(relay[0])
+                os.close(relay[1])
+
+    def _read_chunk(self, size, timeout):
+        """read_nonblocking(), for data going into the buffer: with
+        lazy_decode, it is left as bytes."""
+        if not self.lazy_decode:
+            return self.read_nonblocking(size, timeout)
+        self._raw_reads = True
+        try:
+            return self.read_nonblocking(size, timeout)
+        finally:
+            self._raw_reads = False
+
+    def _next_read_size(self):
+        """How much the expect loop asks read_nonblocking() for: maxread,
+        or with adaptive_read, the size learnt from the last reads."""
+        if self.adaptive_read:
+            return max(self._read_size, self.maxread)
+        return self.maxread
+
+    def _read_drain(self, size):
+        """Read up to 'size' bytes with os.readv() into a buffer kept for
+        the life of the spawn, reading again for as long as FIONREAD says
+        more is pending, so that a burst of output comes back as one string.
+
+        When 'size' is the learnt read size, it is doubled (up to
+        adaptive_read_max) if the read filled it and halved (down to
+        maxread) if the read used less than a quarter of it."""
+        fd = self.child_fd
+        scratch = self._read_scratch
+        if scratch is None or len(scratch) < size:
+            scratch = self._read_scratch = bytearray(size)
+        view = memoryview(scratch)
+        got = os.readv(fd, [view[:size]])
+        if got:
+            pending = _pending(fd)
+            while pending and got < size:
+                try:
+                    n = os.readv(fd, [view[got:min(size, got + pending)]])
+                except OSError:
+                    # Return what we have; the error comes up next read.
+                    break
+                if not n:
+                    break
+                got += n
+                pending = _pending(fd)
+        if size == self._read_size:
+            if got >= size:
+                self._read_size = min(size * 2, self.adaptive_read_max)
+            elif got < size // 4:
+                self._read_size = max(size // 2, self.maxread)
+        return bytes(view[:got])
+
     def read_nonblocking(self, size=1, timeout=None):
         """This reads data from the file descriptor.
 
@@ -102,11 +1209,24 @@ class SpawnBase(object):
         The timeout parameter is ignored.
         """
         try:
-            return os.read(self.child_fd, size)
-        except OSError as e:
-            if e.errno == errno.EAGAIN:
-                return None
+            if self.adaptive_read:
+                s = self._read_drain(size)
+            else:
+                s = os.read(self.child_fd, size)
+        except OSError as err:
+            if err.args[0] == errno.EIO:
+                # Linux-style EOF
+                self.flag_eof = True
+                raise EOF('End Of File (EOF). Exception style platform.')
             raise
+        if s == b'':
+            # BSD-style EOF
+            self.flag_eof = True
+            raise EOF('End Of File (EOF). Empty string style platform.')
+
+        s = self._decode(s)
+        self._log(s, 'read')
+        return s
 
     def compile_pattern_list(self, patterns):
         """This compiles a pattern-string or a list of pattern-strings.
@@ -130,16 +1250,34 @@ class SpawnBase(object):
                 ...
                 i = self.expect_list(cpl, timeout)
                 ...
+
+        Compiled pattern lists, and the searchers built from them, are kept
+        in the process-wide :data:`pexpect.expect.pattern_cache`, so that
+        repeating the same expect() is cheap even without doing this.
         """
         if patterns is None:
             return []
         if not isinstance(patterns, list):
             patterns = [patterns]
 
+        compile_flags = re.DOTALL  # Allow dot to match \n
+        if self.ignorecase:
+            compile_flags = compile_flags | re.IGNORECASE
+        key = ('compile_pattern_list', tuple(patterns), compile_flags,
+               self.encoding, self.lazy_decode)
+        return list(pattern_cache.get(
+            key, lambda: self._compile_pattern_list(patterns, compile_flags)))
+
+    def _compile_pattern_list(self, patterns, compile_flags):
         compiled_pattern_list = []
+        # Text patterns are searched for as bytes in a bytes spawn, and in
+        # one which decodes lazily.
+        encode = self.lazy_decode or self.encoding is None
         for p in patterns:
+            if encode:
+                p = self._encode_regex(p)
             if isinstance(p, (str, bytes)):
-                compiled_pattern_list.append(re.compile(p, re.DOTALL))
+                compiled_pattern_list.append(re.compile(p, compile_flags))
             elif p is EOF:
                 compiled_pattern_list.append(EOF)
             elif p is TIMEOUT:
@@ -253,6 +1391,12 @@ class SpawnBase(object):
                                 async_=async_,
                                 **kw)
 
+    def expect_async(self, pattern, timeout=-1, searchwindowsize=-1):
+        """Shorthand for expect() with ``async_=True``: this returns a
+        coroutine, to be awaited for the index."""
+        return self.expect(pattern, timeout=timeout,
+                           searchwindowsize=searchwindowsize, async_=True)
+
     def expect_list(self, pattern_list, timeout=-1, searchwindowsize=-1,
         async_=False, **kw):
         """This takes a list of compiled regular expressions and returns the
@@ -263,6 +1407,9 @@ class SpawnBase(object):
         may help if you are trying to optimize for speed, otherwise just use
         the expect() method.  This is called by expect().
 
+        Long pattern lists (searcher_prefilter.prefilter_threshold patterns
+        or more) are searched with searcher_prefilter, which only runs the
+        patterns whose literal text has turned up in the output.
 
         Like :meth:`expect`, passing ``async_=True`` will make this return an
         asyncio coroutine.
@@ -272,12 +1419,51 @@ class SpawnBase(object):
         if searchwindowsize == -1:
             searchwindowsize = self.searchwindowsize
 
-        exp = Expecter(self, searcher_re(pattern_list), searchwindowsize)
+        exp = Expecter(self, self._re_searcher(pattern_list), searchwindowsize)
         if async_:
             return exp.expect_async(timeout, **kw)
         else:
             return exp.expect_loop(timeout)
 
+    def _re_searcher(self, pattern_list):
+        if len(pattern_list) >= searcher_prefilter.prefilter_threshold:
+            searcher_class = searcher_prefilter
+        else:
+            searcher_class = searcher_re
+        return pattern_cache.searcher(searcher_class, pattern_list)
+
+    def expect_iter(self, pattern, timeout=-1, searchwindowsize=-1,
+                    total_timeout=None):
+        """This returns an iterator over successive matches of 'pattern'
+        (anything expect() takes) in the child output, for scraping a lot of
+        output without calling expect() over and over::
+
+            for m in child.expect_iter([r'(\\d+) bytes', r'error: (.*)\\r\\n']):
+                if m.index == 1:
+                    print('failed:', m.match.group(1))
+
+        Each item is an :class:`ExpectMatch` with the index, match, before
+        and after of that match; the spawn's attributes are set as well. One
+        searcher is used throughout, and when a read brings in several
+        matches they are found in place, without copying the rest of the
+        buffer for each one. A consequence is that lookbehind assertions
+        and anchors can see the end of the previous match.
+
+        The iterator ends at end of file (after yielding it if EOF is in the
+        pattern list), leaving what was not matched in 'before'.
+
+        'timeout' is the longest to wait for each match, and 'total_timeout'
+        for all of them. If either runs out, TIMEOUT is raised, or if TIMEOUT
+        is in the pattern list it is yielded instead: after a per-item
+        timeout the iteration then goes on, and after the total timeout it
+        ends."""
+        compiled_pattern_list = self.compile_pattern_list(pattern)
+        exp = Expecter(self, self._re_searcher(compiled_pattern_list),
+                       searchwindowsize)
+        for index in exp.expect_iter(timeout, total_timeout):
+            yield ExpectMatch(index, self.match, self._before_value,
+                              self._after_value)
+
     def expect_exact(self, pattern_list, timeout=-1, searchwindowsize=-1,
         async_=False, **kw):
         """This is similar to expect(), but uses plain string matching instead
@@ -295,7 +1481,22 @@ class SpawnBase(object):
         Like :meth:`expect`, passing ``async_=True`` will make this return an
         asyncio coroutine.
         """
-        pass
+        if timeout == -1:
+            timeout = self.timeout
+        if searchwindowsize == -1:
+            searchwindowsize = self.searchwindowsize
+        if (isinstance(pattern_list, (text_type, bytes)) or
+                pattern_list in (TIMEOUT, EOF)):
+            pattern_list = [pattern_list]
+        if self.lazy_decode or self.encoding is None:
+            pattern_list = [self._encode_pattern(p) for p in pattern_list]
+
+        searcher = pattern_cache.searcher(searcher_string, pattern_list)
+        exp = Expecter(self, searcher, searchwindowsize)
+        if async_:
+            return exp.expect_async(timeout, **kw)
+        else:
+            return exp.expect_loop(timeout)
 
     def expect_loop(self, searcher, timeout=-1, searchwindowsize=-1):
         """This is the common loop used inside expect. The 'searcher' should be
@@ -343,7 +1544,13 @@ class SpawnBase(object):
     def fileno(self):
         """Expose file descriptor for a file-like interface
         """
-        pass
+        return self.child_fd
+
+    def _async_pipe(self):
+        """The pipe which expect(async_=True) connects an asyncio read
+        transport to. It is the spawn itself, which the transport closes at
+        end of file."""
+        return self
 
     def flush(self):
         """This does nothing. It is here to support the interface for a
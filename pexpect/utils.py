@@ -101,3 +101,56 @@ def poll_ignore_interrupts(fds, timeout=None):
         except (select.error, InterruptedError) as e:
             if e.args[0] != errno.EINTR:
                 raise
+
+
+class ReadSelector(object):
+    """Waits for one file descriptor to become readable, with a poller which
+    is set up once and kept, where select_ignore_interrupts() and
+    poll_ignore_interrupts() set one up on every call. With use_poll, this
+    is epoll where there is one or else poll; otherwise it is select(),
+    which only handles descriptors below FD_SETSIZE. As with those
+    functions, waits interrupted by a signal are carried on with."""
+
+    def __init__(self, fd, use_poll=False):
+        self.fd = fd
+        self.use_poll = use_poll
+        self._epoll = self._poll = None
+        if use_poll and hasattr(select, 'epoll'):
+            self._epoll = select.epoll()
+            try:
+                self._epoll.register(fd, select.EPOLLIN)
+            except (IOError, OSError) as e:
+                # epoll refuses regular files, which poll handles.
+                self._epoll.close()
+                self._epoll = None
+                if e.errno != errno.EPERM:
+                    raise
+        if use_poll and self._epoll is None:
+            self._poll = select.poll()
+            self._poll.register(fd, select.POLLIN)
+        self._fds = [fd]
+
+    def _ready(self, timeout):
+        if self._epoll is not None:
+            return self._epoll.poll(-1 if timeout is None else timeout)
+        if self._poll is not None:
+            return self._poll.poll(None if timeout is None
+                                   else timeout * 1000)
+        return select.select(self._fds, [], [], timeout)[0]
+
+    def wait(self, timeout=None):
+        """Return True if the descriptor is readable within 'timeout'
+        seconds (or at all, if it is None)."""
+        while True:
+            try:
+                return bool(self._ready(timeout))
+            except (select.error, InterruptedError) as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+
+    def close(self):
+        """Stop watching the descriptor."""
+        if self._epoll is not None:
+            self._epoll.close()
+            self._epoll = None
+        self._poll = None
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import os
+import sys
+import threading
+import unittest
+
+import pexpect
+from pexpect.expect import ExpectStats
+from pexpect.fdpexpect import fdspawn
+from . import PexpectTestCase
+
+
+class AdaptiveReadTestCase(PexpectTestCase.PexpectTestCase):
+
+    def pipe_spawn(self, data):
+        r, w = os.pipe()
+
+        def writer():
+            with os.fdopen(w, 'wb') as fout:
+                fout.write(data)
+        t = threading.Thread(target=writer)
+        t.start()
+        self.addCleanup(t.join)
+        s = fdspawn(r, timeout=5)
+        self.addCleanup(s.close)
+        return s
+
+    def test_drains_in_one_read(self):
+        r, w = os.pipe()
+        s = fdspawn(r, timeout=5)
+        s.adaptive_read = True
+        os.write(w, b'x' * 30000)
+        # Everything pending comes back at once, not maxread at a time.
+        data = s.read_nonblocking(100000, timeout=1)
+        assert data == b'x' * 30000
+        os.close(w)
+        s.close()
+
+    def test_respects_size(self):
+        r, w = os.pipe()
+        s = fdspawn(r, timeout=5)
+        s.adaptive_read = True
+        os.write(w, b'abcdef')
+        assert s.read_nonblocking(2, timeout=1) == b'ab'
+        assert s.read_nonblocking(10, timeout=1) == b'cdef'
+        # A read of a size the caller chose does not change the learnt one.
+        assert s._read_size == s.maxread
+        os.close(w)
+        s.close()
+
+    def test_grows_and_shrinks(self):
+        r, w = os.pipe()
+        s = fdspawn(r, timeout=5, maxread=100)
+        s.adaptive_read = True
+        os.write(w, b'y' * 1000)
+        s.expect(b'y+', timeout=1)
+        # The first read filled maxread, so the next may be twice as big.
+        assert s._read_size > 100
+        for _ in range(10):
+            os.write(w, b'z\n')
+            s.expect(b'z\n', timeout=1)
+        assert s._read_size == 100
+        os.close(w)
+        s.close()
+
+    def test_fewer_reads(self):
+        data = b'0123456789abcdef' * 65536 + b'THE END'
+        plain = self.pipe_spawn(data)
+        plain.stats = ExpectStats()
+        plain.expect(b'THE END')
+        adaptive = self.pipe_spawn(data)
+        adaptive.adaptive_read = True
+        adaptive.stats = ExpectStats()
+        adaptive.expect(b'THE END')
+        assert len(adaptive.before) == len(plain.before) == len(data) - 7
+        assert adaptive.stats.reads < plain.stats.reads / 10
+
+    def test_eof(self):
+        s = self.pipe_spawn(b'last words')
+        s.adaptive_read = True
+        s.expect(pexpect.EOF)
+        assert s.before == b'last words'
+
+    def test_pty_spawn(self):
+        p = pexpect.spawn(sys.executable,
+                          ['-c', 'print("line\\n" * 20000 + "done")'],
+                          timeout=10)
+        p.adaptive_read = True
+        p.stats = ExpectStats()
+        p.expect(b'done')
+        assert p.before.count(b'line') == 20000
+        p.expect(pexpect.EOF)
+        # How much the pty hands over at a time varies from run to run, and
+        # so does the learnt read size; but each read takes many lines.
+        assert p.stats.reads < 20000 // 10
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import asyncio
+import time
+import unittest
+
+import pexpect
+from pexpect.async_spawn import AsyncSpawn
+
+from . import PexpectTestCase
+
+
+class AsyncSpawnTestCase(PexpectTestCase.AsyncPexpectTestCase):
+
+    async def test_send_expect(self):
+        async with AsyncSpawn('cat', timeout=5) as p:
+            await p.sendline(b'Hello asyncio')
+            assert await p.expect([b'nothing', b'asyncio']) == 1
+            assert p.before == b'Hello '
+            # cat echoes the line back after the terminal has.
+            assert await p.readline() == b'\r\n'
+            assert await p.readline() == b'Hello asyncio\r\n'
+            with self.assertRaises(pexpect.TIMEOUT):
+                await p.expect(b'foo', timeout=0.1)
+            await p.sendeof()
+            assert await p.read() == b''
+            assert await p.wait() == 0
+        assert p.closed
+
+    async def test_read(self):
+        p = AsyncSpawn('%s list100.py' % self.PYTHONBIN, encoding='utf-8')
+        assert await p.read(3) == '[0,'
+        rest = await p.read()
+        assert rest.endswith(' 99]\r\n')
+        assert await p.expect(pexpect.EOF) == 0
+        await p.close()
+
+    async def test_wait(self):
+        p = AsyncSpawn('%s exit1.py' % self.PYTHONBIN)
+        await p.expect(pexpect.EOF)
+        assert await p.wait() == 1
+        assert p.exitstatus == 1
+        await p.close()
+
+    async def test_close(self):
+        p = AsyncSpawn('%s sleep_for.py 100' % self.PYTHONBIN)
+        await p.expect(b'READY')
+        started = time.time()
+        await p.close()
+        assert time.time() - started < 5
+        assert not p.isalive()
+        assert p.closed
+        await p.close()
+
+    async def test_many_children(self):
+        children = [AsyncSpawn('echo %d' % n, timeout=10)
+                    for n in range(50)]
+        outputs = await asyncio.gather(*[p.read() for p in children])
+        assert outputs == [b'%d\r\n' % n for n in range(50)]
+        await asyncio.gather(*[p.close() for p in children])
+
+    async def test_send_waits_for_transport(self):
+        # More than the terminal holds, sent while it is being read, with
+        # send() pausing whenever the write transport fills up.
+        p = AsyncSpawn('cat', echo=False, timeout=10)
+        p.delaybeforesend = None
+        line = b'x' * 1000 + b'\n'
+
+        async def read_back():
+            for _ in range(500):
+                await p.expect(b'x+\r\n')
+
+        reader = asyncio.ensure_future(read_back())
+        for _ in range(500):
+            await p.send(line)
+        await p.drain()
+        await reader
+        await p.close()
+
+    async def test_delaybeforesend_does_not_block(self):
+        children = [AsyncSpawn('cat', timeout=5) for _ in range(5)]
+        for p in children:
+            p.delaybeforesend = 0.2
+        started = time.time()
+        await asyncio.gather(*[p.sendline(b'x') for p in children])
+        assert time.time() - started < 0.8
+        await asyncio.gather(*[p.close() for p in children])
+
+    async def test_write(self):
+        async with AsyncSpawn('cat', echo=False, timeout=5) as p:
+            await p.write('hello\n')
+            await p.expect(b'hello')
+            await p.writelines([b'abc', 'def', b'\n'])
+            assert await p.expect_exact([b'nothing', b'abcdef']) == 1
+            assert await p.expect_list(
+                p.compile_pattern_list(b'\r\n')) == 0
+            data = b''.join(b'%d:' % i + b'x' * (i * 37 % 9000) + b'\n'
+                            for i in range(50))
+
+            async def read_back():
+                await p.expect(b'49:x+\r\n')
+                return p.before
+            reader = asyncio.ensure_future(read_back())
+            assert await p.send_bulk(data) == len(data)
+            echoed = await reader
+            # The terminal turns each newline into CRLF; the lines over its
+            # limit were cut, with VEOF, which it does not echo.
+            assert (echoed + p.after).replace(b'\r\n', b'\n') == data
+
+    async def test_read_nonblocking(self):
+        async with AsyncSpawn('cat', echo=False, timeout=5) as p:
+            with self.assertRaises(pexpect.TIMEOUT):
+                await p.read_nonblocking(10, timeout=0.1)
+            await p.send(b'abcdef\n')
+            assert await p.read_nonblocking(3) == b'abc'
+            assert await p.read_nonblocking(10) == b'def\r\n'
+
+    async def test_blocking_methods(self):
+        async with AsyncSpawn('cat', timeout=5) as p:
+            with self.assertRaises(TypeError):
+                p.expect_iter(b'x')
+            with self.assertRaises(TypeError):
+                p.passthrough(1)
+            with self.assertRaises(TypeError):
+                iter(p)
+            with self.assertRaises(TypeError):
+                list(pexpect.expect_many([(p, b'x')]))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+suite = unittest.TestLoader().loadTestsFromTestCase(AsyncSpawnTestCase)
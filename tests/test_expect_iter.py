@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import unittest
+
+import pexpect
+from . import PexpectTestCase
+from .utils import ChunkSpawn
+
+
+class ExpectIterTestCase(PexpectTestCase.PexpectTestCase):
+
+    def test_matches_bytes(self):
+        spawn = ChunkSpawn([b'a=1 b=2 c', b'=3 d=', b'4 rest'])
+        found = [(m.index, m.before, m.match.group(1))
+                 for m in spawn.expect_iter([br'\w=(\d)', b'nope'])]
+        assert found == [(0, b'', b'1'), (0, b' ', b'2'), (0, b' ', b'3'),
+                         (0, b' ', b'4')]
+        assert spawn.before == b' rest'
+        assert spawn.buffer == b''
+
+    def test_matches_text(self):
+        spawn = ChunkSpawn([u'\xe9=1 b=2 c', u'=3 d=', u'4 rest'],
+                           encoding='utf-8')
+        found = [(m.before, m.after) for m in spawn.expect_iter(u'\\w=\\d')]
+        assert found == [(u'', u'\xe9=1'), (u' ', u'b=2'), (u' ', u'c=3'),
+                         (u' ', u'd=4')]
+        assert spawn.before == u' rest'
+
+    def test_eof_in_pattern_list(self):
+        spawn = ChunkSpawn([b'x1 x2 tail'])
+        found = [m.index for m in spawn.expect_iter([pexpect.EOF, b'x\\d'])]
+        assert found == [1, 1, 0]
+        assert spawn.before == b' tail'
+        assert spawn.after is pexpect.EOF
+
+    def test_interleaved_expect(self):
+        spawn = ChunkSpawn([b'x1 x2 y x3 x4'])
+        it = spawn.expect_iter(b'x\\d')
+        assert next(it).after == b'x1'
+        assert spawn.expect(b'y') == 0
+        assert spawn.before == b' x1 x2 '[3:]
+        assert [m.after for m in it] == [b'x3', b'x4']
+
+    def test_empty_matches(self):
+        # One in the empty buffer before anything is read, then one at each
+        # position of what is read; but never twice in the same place.
+        spawn = ChunkSpawn([b'ab'])
+        found = [m.before for m in spawn.expect_iter(b'x*')]
+        assert found == [b'', b'', b'a', b'b']
+
+    def test_timeout(self):
+        spawn = ChunkSpawn([b'x1', pexpect.TIMEOUT(''), b'x2'])
+        it = spawn.expect_iter(b'x\\d', timeout=0)
+        assert next(it).after == b'x1'
+        with self.assertRaises(pexpect.TIMEOUT):
+            next(it)
+
+        spawn = ChunkSpawn([b'x1 y', pexpect.TIMEOUT(''), b'x2'])
+        found = [m.index for m in spawn.expect_iter([b'x\\d', pexpect.TIMEOUT],
+                                                    timeout=0)]
+        assert found == [0, 1, 0]
+
+        spawn = ChunkSpawn([b'x1 y', pexpect.TIMEOUT(''), b'x2'])
+        found = [m.index for m in spawn.expect_iter([b'x\\d', pexpect.TIMEOUT],
+                                                    total_timeout=0)]
+        assert found == [0, 1]
+        assert spawn.before == b' y'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import os
+import socket
+import unittest
+
+import pexpect
+from pexpect.expect import expect_many
+from pexpect.fdpexpect import fdspawn
+from pexpect.socket_pexpect import SocketSpawn
+from . import PexpectTestCase
+
+
+class ExpectManyTestCase(PexpectTestCase.PexpectTestCase):
+
+    def setUp(self):
+        super(ExpectManyTestCase, self).setUp()
+        self.to_close = []
+
+    def tearDown(self):
+        for f in self.to_close:
+            f.close()
+        super(ExpectManyTestCase, self).tearDown()
+
+    def _pipe(self, **kwargs):
+        r, w = os.pipe()
+        child = fdspawn(r, **kwargs)
+        self.to_close.append(child)
+        return child, w
+
+    def _socket(self, **kwargs):
+        a, b = socket.socketpair()
+        child = SocketSpawn(a, **kwargs)
+        self.to_close.extend([child, b])
+        return child, b
+
+    def test_matches_in_arrival_order(self):
+        p1, w1 = self._pipe()
+        p2, w2 = self._pipe(encoding='utf-8')
+        s3, b3 = self._socket()
+        os.write(w2, b'second ready\n')
+        b3.sendall(b'third ')
+        os.write(w1, b'x')
+        results = expect_many([(p1, b'ready'), (p2, u'ready'),
+                               (s3, [b'nope', b'ready'])], timeout=5)
+        child, index = next(results)
+        assert (child, index) == (p2, 0)
+        assert p2.before == u'second '
+        b3.sendall(b'ready')
+        assert next(results) == (s3, 1)
+        assert s3.before == b'third '
+        os.write(w1, b' ready')
+        assert next(results) == (p1, 0)
+        assert p1.before == b'x '
+        assert list(results) == []
+        os.close(w1)
+        os.close(w2)
+
+    def test_buffered_data_matched_first(self):
+        p1, w1 = self._pipe()
+        p1.buffer = b'now ready'
+        assert list(expect_many([(p1, b'ready')], timeout=0)) == [(p1, 0)]
+        assert p1.before == b'now '
+        os.close(w1)
+
+    def test_eof_and_timeout(self):
+        p1, w1 = self._pipe()
+        p2, w2 = self._pipe()
+        os.write(w1, b'bye')
+        os.close(w1)
+        results = list(expect_many([(p1, [b'x', pexpect.EOF]),
+                                    (p2, [b'x', pexpect.TIMEOUT])],
+                                   timeout=0.2))
+        assert results == [(p1, 1), (p2, 1)]
+        assert p1.before == b'bye'
+        assert p2.after is pexpect.TIMEOUT
+
+        with self.assertRaises(pexpect.TIMEOUT):
+            list(expect_many([(p2, b'x')], timeout=0.1))
+        os.close(w2)
+
+    def test_eof_raised(self):
+        p1, w1 = self._pipe()
+        os.close(w1)
+        with self.assertRaises(pexpect.EOF):
+            list(expect_many([(p1, b'x')], timeout=5))
+
+    def test_same_child_twice(self):
+        p1, w1 = self._pipe()
+        with self.assertRaises(ValueError):
+            list(expect_many([(p1, b'x'), (p1, b'y')], timeout=5))
+        os.close(w1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -58,6 +58,23 @@ class ExpectTestCase(PexpectTestCase.PexpectTestCase):
         assert not s.isatty()
         s.close()
 
+    def test_selector_kept(self):
+        for use_poll in (False, True):
+            r, w = os.pipe()
+            s = fdpexpect.fdspawn(r, use_poll=use_poll)
+            selector = s._read_selector
+            assert selector is not None
+            os.write(w, b'one two ')
+            s.expect(b'one')
+            s.expect(b'two')
+            with self.assertRaises(pexpect.TIMEOUT):
+                s.read_nonblocking(10, timeout=0)
+            assert s._read_selector is selector
+            os.close(w)
+            s.expect(pexpect.EOF)
+            s.close()
+            assert s._read_selector is None
+
     def test_fileobj(self):
         f = open('TESTDATA.txt', 'r')
         s = fdpexpect.fdspawn(f)  # Should get the fileno from the file handle
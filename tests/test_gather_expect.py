@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import asyncio
+import unittest
+
+import pexpect
+from pexpect.async_spawn import AsyncSpawn
+from pexpect.expect import gather_expect, expect_as_completed, GatherStats
+from . import PexpectTestCase
+
+
+class GatherExpectTestCase(PexpectTestCase.AsyncPexpectTestCase):
+
+    def setUp(self):
+        super(GatherExpectTestCase, self).setUp()
+        self.children = []
+
+    async def asyncTearDown(self):
+        for child in self.children:
+            await child.close()
+
+    def _spawn(self, command, **kwargs):
+        child = AsyncSpawn(command, timeout=5, **kwargs)
+        self.children.append(child)
+        return child
+
+    def _sleeper(self, seconds):
+        return self._spawn("%s -c 'import time; time.sleep(%s); "
+                           "print(\"done\")'" % (self.PYTHONBIN, seconds))
+
+    async def test_gather_in_order(self):
+        slow = self._sleeper(0.4)
+        fast = self._sleeper(0)
+        stats = GatherStats()
+        results = await gather_expect([(slow, [b'x', b'done']),
+                                       (fast, b'done')], stats=stats)
+        assert results == [1, 0]
+        assert slow.after == fast.after == b'done'
+        assert stats.started == stats.completed == 2
+        assert stats.peak_running == 2
+        assert stats.max_expect_time >= 0.4
+        assert stats.elapsed >= stats.max_expect_time
+
+    async def test_as_completed(self):
+        slow = self._sleeper(0.4)
+        fast = self._sleeper(0)
+        seen = [child async for child, index in
+                expect_as_completed([(slow, b'done'), (fast, b'done')])]
+        assert seen == [fast, slow]
+
+    async def test_max_concurrency(self):
+        children = [self._sleeper(0.1) for _ in range(6)]
+        stats = GatherStats()
+        results = await gather_expect([(c, b'done') for c in children],
+                                      max_concurrency=2, stats=stats)
+        assert results == [0] * 6
+        assert stats.peak_running == 2
+        assert stats.queue_time > 0
+
+    async def test_timeout(self):
+        slow = self._sleeper(5)
+        fast = self._sleeper(0)
+        stats = GatherStats()
+        results = await gather_expect([(slow, [b'done', pexpect.TIMEOUT]),
+                                       (fast, b'done')], timeout=0.2,
+                                      stats=stats)
+        assert results == [1, 0]
+        assert stats.timeouts == 1
+        results = await gather_expect([(slow, b'done')], timeout=0.1,
+                                      return_exceptions=True)
+        assert isinstance(results[0], pexpect.TIMEOUT)
+
+    async def test_dialog(self):
+        async def dialog(child):
+            await child.expect('<in >')
+            await child.sendline('hello')
+            await child.expect('<out>(.*)\r\n')
+            return child.match.group(1)
+
+        children = [self._spawn('%s echo_w_prompt.py' % self.PYTHONBIN,
+                                encoding='utf-8') for _ in range(3)]
+        results = await gather_expect([(c, dialog) for c in children],
+                                      max_concurrency=2)
+        assert results == ['hello'] * 3
+
+        async def stuck(child):
+            await child.expect('never', timeout=None)
+
+        with self.assertRaises(pexpect.TIMEOUT):
+            await gather_expect([(children[0], stuck)], timeout=0.2)
+
+    async def test_error_closes_the_rest(self):
+        failing = self._spawn('%s exit1.py' % self.PYTHONBIN)
+        waiting = self._sleeper(5)
+        queued = self._sleeper(5)
+        stats = GatherStats()
+        with self.assertRaises(pexpect.EOF):
+            await gather_expect([(failing, b'done'), (waiting, b'done'),
+                                 (queued, b'done')],
+                                max_concurrency=2, stats=stats)
+        assert waiting.closed and queued.closed
+        assert not waiting.isalive()
+        assert stats.failed == 1
+        assert stats.cancelled == 2
+        assert stats.running == 0
+
+    async def test_cancel(self):
+        children = [self._sleeper(5) for _ in range(3)]
+        task = asyncio.ensure_future(
+            gather_expect([(c, b'done') for c in children]))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        assert all(c.closed for c in children)
+
+    async def test_break_closes_the_rest(self):
+        slow = self._sleeper(5)
+        fast = self._sleeper(0)
+        iterator = expect_as_completed([(slow, b'done'), (fast, b'done')],
+                                       close_cancelled=True)
+        async for child, index in iterator:
+            break
+        await iterator.aclose()
+        assert child is fast
+        assert slow.closed
+
+    async def test_plain_spawn(self):
+        child = pexpect.spawn('%s exit1.py' % self.PYTHONBIN, timeout=5)
+        try:
+            results = await gather_expect([(child, pexpect.EOF)])
+            assert results == [0]
+        finally:
+            child.close()
+
+    async def test_cancel_closes_plain_spawns_without_blocking(self):
+        children = [pexpect.spawn('sleep 30', timeout=5) for _ in range(10)]
+        gaps = []
+
+        async def ticker():
+            last = loop.time()
+            while True:
+                await asyncio.sleep(0.01)
+                gaps.append(loop.time() - last)
+                last = loop.time()
+
+        loop = asyncio.get_event_loop()
+        try:
+            task = asyncio.ensure_future(
+                gather_expect([(c, b'done') for c in children]))
+            await asyncio.sleep(0.1)
+            ticking = asyncio.ensure_future(ticker())
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            ticking.cancel()
+            assert all(c.closed and not c.isalive() for c in children)
+            # Each spawn.close() would have slept delayafterclose.
+            assert max(gaps) < children[0].delayafterclose
+        finally:
+            for child in children:
+                child.close(force=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+suite = unittest.TestLoader().loadTestsFromTestCase(GatherExpectTestCase)
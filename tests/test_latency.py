@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import signal
+import sys
+import time
+import unittest
+
+import pexpect
+from . import PexpectTestCase
+
+
+class LowLatencyTestCase(PexpectTestCase.PexpectTestCase):
+
+    def spawn(self, *args, **kwargs):
+        child = pexpect.spawn(*args, **kwargs)
+        child.low_latency = True
+        self.addCleanup(child.close)
+        return child
+
+    def test_round_trip(self):
+        child = self.spawn('cat', echo=False, timeout=5)
+        started = time.time()
+        for n in range(20):
+            child.sendline(b'ping %d' % n)
+            child.expect(b'ping %d' % n)
+        # With delaybeforesend, this would take a second.
+        assert time.time() - started < 0.5
+
+    def test_close(self):
+        child = self.spawn('cat', timeout=5)
+        started = time.time()
+        child.close()
+        assert time.time() - started < child.delayafterclose
+        assert not child.isalive()
+        assert child.signalstatus == signal.SIGHUP
+
+    def test_terminate(self):
+        child = self.spawn(sys.executable, ['-c', '''if 1:
+            import signal, time
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            print("ready")
+            time.sleep(30)'''], timeout=5)
+        child.expect(b'ready')
+        assert not child.terminate(force=False)
+        assert child.isalive()
+        started = time.time()
+        assert child.terminate(force=True)
+        assert time.time() - started < 4 * child.delayafterterminate
+        assert child.signalstatus == signal.SIGKILL
+
+    def test_waitnoecho(self):
+        child = self.spawn(sys.executable, ['-c', '''if 1:
+            import getpass
+            getpass.getpass("Password: ")'''], timeout=5)
+        child.expect(b'Password: ')
+        assert child.waitnoecho()
+        assert not child.getecho()
+        child.sendline(b'secret')
+        child.expect(pexpect.EOF)
+        assert b'secret' not in child.before
+
+
+if __name__ == '__main__':
+    unittest.main()
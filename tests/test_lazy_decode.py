@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import io
+import os
+import re
+import unittest
+
+import pexpect
+from pexpect.fdpexpect import fdspawn
+from . import PexpectTestCase
+
+
+class LazyDecodeTestCase(PexpectTestCase.PexpectTestCase):
+
+    def pipe_spawn(self, encoding='utf-8', **kwargs):
+        r, w = os.pipe()
+        s = fdspawn(r, encoding=encoding, timeout=5, **kwargs)
+        s.lazy_decode = True
+        self.addCleanup(s.close)
+        self.addCleanup(os.close, w)
+        return s, w
+
+    def test_text_out(self):
+        s, w = self.pipe_spawn()
+        os.write(w, u'naïve café\nuser@host$ '.encode('utf-8'))
+        assert s.expect(u'([a-z]+)@host\\$ ') == 0
+        assert s.before == u'naïve café\n'
+        assert s.after == u'user@host$ '
+        assert s.match.group(0) == u'user@host$ '
+        assert s.match.group(1) == u'user'
+        assert s.match.groups() == (u'user',)
+        assert s.match[1] == u'user'
+
+    def test_character_split_between_reads(self):
+        s, w = self.pipe_spawn()
+        data = u'€uro > '.encode('utf-8')
+        os.write(w, data[:2])
+        # The first read has only part of the euro sign.
+        with self.assertRaises(pexpect.TIMEOUT):
+            s.expect(u'>', timeout=0.1)
+        assert s.before == u''
+        os.write(w, data[2:])
+        s.expect(u'>')
+        assert s.before == u'€uro '
+
+    def test_compiled_and_non_ascii_patterns(self):
+        s, w = self.pipe_spawn()
+        os.write(w, u'Mot de passe (clé) : '.encode('utf-8'))
+        assert s.expect([re.compile(u'nothing'), u'clé']) == 1
+        assert s.before == u'Mot de passe ('
+        assert s.after == u'clé'
+
+    def test_latin_1(self):
+        s, w = self.pipe_spawn('latin-1')
+        os.write(w, bytes(bytearray(range(256))))
+        s.expect(u'\xff')
+        assert s.before == u''.join(chr(c) for c in range(255))
+
+    def test_maxbuffer_keeps_characters_whole(self):
+        s, w = self.pipe_spawn(maxread=7)
+        # With lazy_decode, maxbuffer counts bytes.
+        s.maxbuffer = 6
+        os.write(w, u'ééééé!'.encode('utf-8'))
+        s.expect(u'!')
+        assert s.before == u'éé'
+
+    def test_logfile(self):
+        s, w = self.pipe_spawn()
+        s.logfile_read = io.StringIO()
+        data = u'žluťoučký kůň\n'.encode('utf-8')
+        for i in range(len(data)):
+            os.write(w, data[i:i + 1])
+            s.expect([u'\n', pexpect.TIMEOUT], timeout=0)
+        assert s.logfile_read.getvalue() == u'žluťoučký kůň\n'
+
+    def test_expect_iter(self):
+        s, w = self.pipe_spawn()
+        os.write(w, u'ä1 ö2 ü3 '.encode('utf-8'))
+        found = [(m.before, m.match.group(1)) for m in
+                 s.expect_iter([u'([0-9]) ', pexpect.TIMEOUT],
+                               total_timeout=0.2)
+                 if m.index == 0]
+        assert found == [(u'ä', u'1'), (u'ö', u'2'), (u'ü', u'3')]
+
+    def test_buffer_converted(self):
+        s, w = self.pipe_spawn()
+        s.buffer = u'déjà vu'
+        assert s.buffer == u'déjà vu'
+        s.lazy_decode = False
+        assert s.buffer == u'déjà vu'
+        s.expect(u'à')
+        assert s.before == u'déj'
+
+    def test_unicode_classes_refused(self):
+        s, w = self.pipe_spawn()
+        for pattern in (u'\\w+', u'\\d', u'\\s', u'\\bh', u'x\\B',
+                        re.compile(u'\\w+')):
+            with self.assertRaises(ValueError):
+                s.expect(pattern)
+        os.write(w, u'héllo wörld'.encode('utf-8'))
+        # With re.ASCII, they mean the same on bytes.
+        assert s.expect(re.compile(u'\\w+', re.ASCII)) == 0
+        assert s.after == u'h'
+        assert s.expect(u'(?a)\\s\\w') == 0
+        assert s.after == u' w'
+
+    def test_dot_and_classes_refused_in_utf_8(self):
+        s, w = self.pipe_spawn()
+        for pattern in (u'x.y', u'[é]', u'[éz]', u'[^x]', u'[à-ÿ]', u'é+',
+                        u'aé?'):
+            with self.assertRaises(ValueError):
+                s.expect(pattern)
+        os.write(w, u'aé xéy (é)'.encode('utf-8'))
+        # Whole characters, and groups of them, are safe.
+        assert s.expect(u'x(é)y') == 0
+        assert s.match.group(1) == u'é'
+        assert s.expect(u'\\((é)+\\)') == 0
+        assert s.before == u' '
+
+    def test_dot_and_classes_running_to_ascii_in_utf_8(self):
+        s, w = self.pipe_spawn()
+        # A greedy, unbounded run of them can only stop at the ASCII
+        # literal after it, never halfway through a character.
+        os.write(w, u'Name für Gerät: ok\nnaïve café$ \nzweite Zeile\n'
+                 .encode('utf-8'))
+        assert s.expect(u'Name .*: ') == 0
+        assert s.after == u'Name für Gerät: '
+        assert s.expect(u'.*\\$ ') == 0
+        assert s.after == u'ok\nnaïve café$ '
+        assert s.expect(u'\n[^\n]+\n') == 0
+        assert s.after == u'\nzweite Zeile\n'
+        # Lazy, counted, or at the end: still refused.
+        for pattern in (u'a.*?:', u'.{3}:', u'.{2,}:', u'Name .*',
+                        u'[^\n]+', u'(.*): '):
+            with self.assertRaises(ValueError):
+                s.expect(pattern)
+
+    def test_dot_and_classes_in_latin_1(self):
+        s, w = self.pipe_spawn('latin-1')
+        os.write(w, u'aé xéy'.encode('latin-1'))
+        # One byte per character: these mean the same on bytes.
+        assert s.expect(u'[éz]') == 0
+        assert s.before == u'a'
+        assert s.expect(u'x.y') == 0
+        assert s.after == u'xéy'
+
+    def test_ignorecase_non_ascii_refused(self):
+        s, w = self.pipe_spawn()
+        with self.assertRaises(ValueError):
+            s.expect(re.compile(u'échec', re.I))
+        with self.assertRaises(ValueError):
+            s.expect(u'(?i)échec')
+        s.ignorecase = True
+        with self.assertRaises(ValueError):
+            s.expect(u'échec')
+        os.write(w, u'ÉCHEC: Error'.encode('utf-8'))
+        # ASCII letters are still matched whatever their case.
+        assert s.expect(u'error') == 0
+        assert s.before == u'ÉCHEC: '
+
+    def test_bytes_spawn_unaffected(self):
+        r, w = os.pipe()
+        s = fdspawn(r)
+        s.lazy_decode = True
+        assert not s.lazy_decode
+        os.close(w)
+        s.close()
+
+    def test_unsupported_encoding(self):
+        r, w = os.pipe()
+        s = fdspawn(r, encoding='utf-16')
+        with self.assertRaises(ValueError):
+            s.lazy_decode = True
+        os.close(w)
+        s.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
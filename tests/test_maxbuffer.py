@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import unittest
+
+import pexpect
+from pexpect.expect import Expecter, searcher_string
+from . import PexpectTestCase
+from .utils import ChunkSpawn
+
+
+class MaxBufferTestCase(PexpectTestCase.PexpectTestCase):
+
+    def _spawn(self, policy, chunks=None, **kwargs):
+        if chunks is None:
+            chunks = [b'0123456789'] * 10 + [b'DONE tail']
+        spawn = ChunkSpawn(chunks, **kwargs)
+        spawn.maxbuffer = 25
+        spawn.maxbuffer_policy = policy
+        return spawn
+
+    def _expect(self, spawn, pattern):
+        searcher = searcher_string([pattern])
+        return Expecter(spawn, searcher).expect_loop(timeout=None)
+
+    def test_drop(self):
+        spawn = self._spawn('drop')
+        assert self._expect(spawn, b'DONE') == 0
+        assert spawn.before == b'456789' + b'0123456789'
+        assert spawn.buffer == b' tail'
+
+    def test_drop_keeps_straddling_match(self):
+        spawn = self._spawn('drop', [b'x' * 30, b'needle'[:3], b'needle'[3:]])
+        assert self._expect(spawn, b'needle') == 0
+        assert spawn.before == b'x' * 19
+
+    def test_spill(self):
+        spawn = self._spawn('spill')
+        assert self._expect(spawn, b'DONE') == 0
+        assert spawn.before.read() == b'0123456789' * 10
+        assert spawn.after == b'DONE'
+        # the next match starts afresh
+        spawn.chunks = [b'ab']
+        assert self._expect(spawn, b'b') == 0
+        assert spawn.before == b' taila'
+
+    def test_spill_text(self):
+        spawn = self._spawn('spill', [u'\u263a' * 20] * 3 + [u'DONE'],
+                            encoding='utf-8')
+        assert self._expect(spawn, u'DONE') == 0
+        assert spawn.before.read() == u'\u263a' * 60
+
+    def test_raise(self):
+        spawn = self._spawn('raise')
+        with self.assertRaises(pexpect.BufferOverflow):
+            self._expect(spawn, b'DONE')
+        assert len(spawn.buffer) == 30
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import pexpect
+from pexpect import mmap_spawn
+from pexpect.expect import ExpectStats
+from . import PexpectTestCase
+
+
+class MmapSpawnTestCase(PexpectTestCase.PexpectTestCase):
+
+    def setUp(self):
+        PexpectTestCase.PexpectTestCase.setUp(self)
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.path)
+        PexpectTestCase.PexpectTestCase.tearDown(self)
+
+    def append(self, data):
+        with open(self.path, 'ab') as f:
+            f.write(data)
+
+    def test_expect(self):
+        self.append(b'noise\n' * 10000 + b'MARKER 1\nmiddle\nMARKER 2\nend\n')
+        s = mmap_spawn.mmapspawn(self.path)
+        assert s.expect(br'MARKER (\d)') == 0
+        assert s.match.group(1) == b'1'
+        assert len(s.before) == 60000
+        assert s.after == b'MARKER 1'
+        assert s.expect([b'nothing', br'MARKER (\d)']) == 1
+        assert s.before == b'\nmiddle\n'
+        assert s.expect(pexpect.EOF) == 0
+        assert s.before == b'\nend\n'
+        s.close()
+        assert not s.isalive()
+
+    def test_whole_file_searched_at_once(self):
+        self.append(b'x' * 100000 + b'MARKER')
+        s = mmap_spawn.mmapspawn(self.path, maxread=100)
+        s.stats = ExpectStats()
+        s.expect(b'MARKER')
+        assert s.stats.reads == 1
+        assert s.stats.searches == 2
+        s.close()
+
+    def test_searchwindowsize(self):
+        self.append(b'MARKER' + b'x' * 1000 + b'MARK')
+        s = mmap_spawn.mmapspawn(self.path, searchwindowsize=100)
+        assert s.expect([b'MARKER', pexpect.EOF]) == 1
+        s.close()
+        s = mmap_spawn.mmapspawn(self.path)
+        s.expect(b'x+')
+        # The window is kept inside the buffer, so it does not reach back
+        # to the first match.
+        assert s.expect([b'MARKER', b'MARK'], searchwindowsize=10000) == 1
+        s.close()
+
+    def test_empty_file(self):
+        s = mmap_spawn.mmapspawn(self.path)
+        assert s.expect([b'x', pexpect.EOF]) == 1
+        assert s.before == b''
+        s.close()
+
+    def test_follow(self):
+        self.append(b'starting\n')
+        s = mmap_spawn.mmapspawn(self.path, follow=True, timeout=5,
+                                 follow_interval=0.01)
+        s.expect(b'starting\n')
+        assert s.expect([b'ready', pexpect.TIMEOUT], timeout=0.1) == 1
+
+        def grow():
+            time.sleep(0.1)
+            self.append(b'still starting\n')
+            time.sleep(0.1)
+            self.append(b'ready\n')
+        t = threading.Thread(target=grow)
+        t.start()
+        s.expect(b'ready')
+        t.join()
+        assert s.before == b'still starting\n'
+        s.close()
+
+    def test_read_nonblocking(self):
+        self.append(b'abcdef')
+        with open(self.path, 'rb') as f:
+            s = mmap_spawn.mmapspawn(f)
+            assert s.read_nonblocking(4) == b'abcd'
+            s.expect(pexpect.EOF)
+            assert s.before == b'ef'
+            with self.assertRaises(pexpect.EOF):
+                s.read_nonblocking(4)
+            s.close()
+
+    def test_not_regular_file(self):
+        r, w = os.pipe()
+        try:
+            with self.assertRaises(pexpect.ExceptionPexpect):
+                mmap_spawn.mmapspawn(r)
+        finally:
+            os.close(r)
+            os.close(w)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+suite = unittest.TestLoader().loadTestsFromTestCase(MmapSpawnTestCase)
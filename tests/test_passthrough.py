@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import os
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+import pexpect
+from pexpect.fdpexpect import fdspawn
+from . import PexpectTestCase
+
+
+class PassthroughTestCase(PexpectTestCase.PexpectTestCase):
+
+    def setUp(self):
+        super(PassthroughTestCase, self).setUp()
+        self.sink = tempfile.TemporaryFile()
+        self.addCleanup(self.sink.close)
+
+    def forwarded(self):
+        self.sink.seek(0)
+        return self.sink.read()
+
+    def pipe_spawn(self, data, **kwargs):
+        r, w = os.pipe()
+
+        def writer():
+            with os.fdopen(w, 'wb') as fout:
+                fout.write(data)
+        t = threading.Thread(target=writer)
+        t.start()
+        self.addCleanup(t.join)
+        s = fdspawn(r, timeout=5, **kwargs)
+        self.addCleanup(s.close)
+        return s
+
+    def test_forward_to_eof(self):
+        data = os.urandom(1000000)
+        s = self.pipe_spawn(data)
+        assert s.passthrough(self.sink) == 0
+        assert self.forwarded() == data
+        assert s.after is pexpect.EOF
+        assert s.flag_eof
+
+    def test_forward_socket(self):
+        # Neither end is a pipe, so the data is spliced through one.
+        ours, theirs = socket.socketpair()
+        data = os.urandom(500000)
+
+        def writer():
+            theirs.sendall(data)
+            theirs.close()
+        t = threading.Thread(target=writer)
+        t.start()
+        s = fdspawn(ours, timeout=5)
+        assert s.passthrough(self.sink.fileno()) == 0
+        t.join()
+        ours.close()
+        assert self.forwarded() == data
+
+    def test_marker(self):
+        data = b'x' * 100000 + b'MARK 42\n' + b'rest of it'
+        s = self.pipe_spawn(data)
+        s.passthrough_chunk = 4096
+        assert s.passthrough(self.sink, [b'MARK (\\d+)', pexpect.EOF]) == 0
+        assert s.match.group(1) == b'42'
+        assert s.after == b'MARK 42'
+        assert s.before == b'x' * len(s.before)
+        assert len(s.before) <= s.passthrough_window + s.passthrough_chunk
+        # Forwarding stops after the match; the rest is for expect().
+        assert self.forwarded() == b'x' * 100000 + b'MARK 42'
+        s.expect(pexpect.EOF)
+        assert s.before == b'\nrest of it'
+
+    def test_marker_split_between_reads(self):
+        s = self.pipe_spawn(b'abcdefMARKER')
+        s.passthrough_chunk = 5
+        assert s.passthrough(self.sink, 'MARKER') == 0
+        assert self.forwarded() == b'abcdefMARKER'
+
+    def test_buffer_forwarded_first(self):
+        s = self.pipe_spawn(b'one two three')
+        s.expect(b'one')
+        s.passthrough(self.sink)
+        assert self.forwarded() == b' two three'
+
+    def test_timeout(self):
+        r, w = os.pipe()
+        s = fdspawn(r, timeout=5)
+        os.write(w, b'no marker')
+        with self.assertRaises(pexpect.TIMEOUT):
+            s.passthrough(self.sink, 'MARKER', timeout=0.1)
+        assert s.passthrough(self.sink, pexpect.TIMEOUT, timeout=0.1) == 0
+        assert self.forwarded() == b'no marker'
+        os.close(w)
+        s.close()
+
+    def test_encoding(self):
+        s = self.pipe_spawn(u'dès le début: prêt\n'.encode('utf-8'),
+                            encoding='utf-8')
+        assert s.passthrough(self.sink, u'(prêt)') == 0
+        assert s.after == u'prêt'
+        assert s.match.group(1) == u'prêt'
+        s.expect(pexpect.EOF)
+        assert s.before == u'\n'
+
+    def test_encoding_regex_not_refused(self):
+        # What lazy_decode refuses, for changing on bytes, is fine here.
+        s = self.pipe_spawn(b'ready: go\n', encoding='utf-8')
+        assert s.passthrough(self.sink, u'ready: (.)') == 0
+        assert s.match.group(1) == u'g'
+
+    def test_spilled_data_forwarded_first(self):
+        r, w = os.pipe()
+        s = fdspawn(r, timeout=5)
+        self.addCleanup(s.close)
+        s.maxbuffer = 20
+        s.maxbuffer_policy = 'spill'
+        os.write(w, b'A' * 84 + b'B' * 20)
+        with self.assertRaises(pexpect.TIMEOUT):
+            s.expect(b'END', timeout=0.2)
+        os.write(w, b'-tail-END')
+        os.close(w)
+        assert s.passthrough(self.sink, b'END') == 0
+        assert self.forwarded() == b'A' * 84 + b'B' * 20 + b'-tail-END'
+        assert s._spill is None
+        s.expect(pexpect.EOF)
+        assert s.before == b''
+
+    def test_spilled_text_forwarded_encoded(self):
+        r, w = os.pipe()
+        s = fdspawn(r, timeout=5, encoding='utf-8')
+        self.addCleanup(s.close)
+        s.maxbuffer = 5
+        s.maxbuffer_policy = 'spill'
+        os.write(w, u'\u263a'.encode('utf-8') * 10)
+        with self.assertRaises(pexpect.TIMEOUT):
+            s.expect(u'END', timeout=0.2)
+        os.close(w)
+        assert s.passthrough(self.sink) == 0
+        assert self.forwarded() == u'\u263a'.encode('utf-8') * 10
+
+    def test_pty_spawn(self):
+        p = pexpect.spawn(sys.executable,
+                          ['-c', 'print("x" * 100000); print("done")'],
+                          timeout=10)
+        assert p.passthrough(self.sink) == 0
+        assert self.forwarded() == b'x' * 100000 + b'\r\ndone\r\n'
+
+
+if __name__ == '__main__':
+    unittest.main()
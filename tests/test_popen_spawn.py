@@ -18,12 +18,15 @@ PEXPECT LICENSE
     OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 '''
+import io
 import unittest
 import subprocess
+import sys
+import threading
 
 
 import pexpect
-from pexpect.popen_spawn import PopenSpawn
+from pexpect.popen_spawn import PopenSpawn, _THREADED_READS
 from . import PexpectTestCase
 
 
@@ -133,6 +136,85 @@ class ExpectTestCase (PexpectTestCase.PexpectTestCase):
         p = PopenSpawn('echo alpha beta', encoding='utf-8')
         assert p.read() == 'alpha beta' + p.crlf
 
+    @unittest.skipIf(_THREADED_READS, 'read through a thread here')
+    def test_no_reader_thread(self):
+        before = threading.active_count()
+        children = [PopenSpawn(['echo', str(n)], timeout=5)
+                    for n in range(50)]
+        assert threading.active_count() == before
+        for n, p in enumerate(children):
+            p.expect(pexpect.EOF)
+            assert p.before.strip() == str(n).encode('ascii')
+            p.wait()
+
+    def test_read_nonblocking(self):
+        p = PopenSpawn('cat', timeout=5)
+        with self.assertRaises(pexpect.TIMEOUT):
+            p.read_nonblocking(10, timeout=0.1)
+        p.send(b'abcdef')
+        assert p.read_nonblocking(3, timeout=5) == b'abc'
+        assert p.read_nonblocking(10, timeout=5) == b'def'
+        p.sendeof()
+        with self.assertRaises(pexpect.EOF):
+            p.read_nonblocking(10, timeout=5)
+        with self.assertRaises(pexpect.EOF):
+            p.read_nonblocking(10, timeout=5)
+        assert p.flag_eof
+        p.wait()
+
+    def test_writelines_and_send_bulk(self):
+        # What is written goes to the child's stdin, not to child_fd.
+        p = PopenSpawn('cat', timeout=5, encoding='utf-8')
+        p.writelines([u'caf\xe9', u' au lait\n'])
+        p.expect(u'caf\xe9 au lait\n')
+        assert p.send_bulk(u'th\xe9\n') == 5
+        p.expect(u'th\xe9\n')
+        p.sendeof()
+        p.expect(pexpect.EOF)
+        p.wait()
+
+    @unittest.skipIf(_THREADED_READS, 'POSIX and Python 3 only')
+    def test_separate_stderr(self):
+        log = io.StringIO()
+        p = PopenSpawn([sys.executable, '-c',
+                        'import sys; sys.stderr.write("warning: x\\n"); '
+                        'sys.stderr.flush(); print("result: 42")'],
+                       timeout=5, encoding='utf-8', separate_stderr=True)
+        p.logfile_stderr = log
+        # Both pipes are waited on with p._streams, not a read selector.
+        assert p._read_selector is None
+        assert p.expect_stderr('warning: (.)') == 0
+        assert p.match.group(1) == 'x'
+        p.expect(pexpect.EOF)
+        assert p.before.strip() == 'result: 42'
+        assert p.expect_stderr(pexpect.EOF) == 0
+        assert p.before == '\n'
+        assert log.getvalue() == 'warning: x\n'
+        p.wait()
+
+    @unittest.skipIf(_THREADED_READS, 'POSIX and Python 3 only')
+    def test_separate_stderr_drained(self):
+        # The child writes far more to stderr than a pipe holds before its
+        # stdout; it must not block while stdout is expected on.
+        p = PopenSpawn([sys.executable, '-c',
+                        'import sys; sys.stderr.write("e" * 1000000); '
+                        'sys.stderr.write("end\\n"); sys.stderr.flush(); '
+                        'print("done")'],
+                       timeout=10, separate_stderr=True)
+        p.expect(b'done')
+        assert b'e' not in p.before
+        p.expect_stderr(b'end')
+        assert len(p.before) == 1000000
+        p.expect(pexpect.EOF)
+        p.wait()
+
+    def test_expect_stderr_merged(self):
+        p = PopenSpawn('echo hi', timeout=5)
+        with self.assertRaises(pexpect.ExceptionPexpect):
+            p.expect_stderr(b'hi')
+        p.expect(pexpect.EOF)
+        p.wait()
+
 if __name__ == '__main__':
     unittest.main()
 
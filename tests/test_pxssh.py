@@ -1,17 +1,19 @@
 #!/usr/bin/env python
+import asyncio
 import sys
 import os
 import shutil
 import tempfile
+import time
 import unittest
 
 if sys.platform != 'win32':
     from pexpect import pxssh
-from .PexpectTestCase import PexpectTestCase
+from .PexpectTestCase import PexpectTestCase, AsyncPexpectTestCase
 
-class SSHTestBase(PexpectTestCase):
+class FakeSSHMixin(object):
     def setUp(self):
-        super(SSHTestBase, self).setUp()
+        super(FakeSSHMixin, self).setUp()
         self.tempdir = tempfile.mkdtemp()
         self.orig_path = os.environ.get('PATH')
         os.symlink(self.PYTHONBIN, os.path.join(self.tempdir, 'python'))
@@ -25,6 +27,10 @@ class SSHTestBase(PexpectTestCase):
             os.environ['PATH'] = self.orig_path
         else:
             del os.environ['PATH']
+        super(FakeSSHMixin, self).tearDown()
+
+class SSHTestBase(FakeSSHMixin, PexpectTestCase):
+    pass
 
 class PxsshTestCase(SSHTestBase):
     def test_fake_ssh(self):
@@ -300,5 +306,66 @@ class PxsshTestCase(SSHTestBase):
         assert ssh.prompt(timeout=10)
         ssh.logout()
 
+class PxsshAsyncTestCase(FakeSSHMixin, AsyncPexpectTestCase):
+    async def test_fake_ssh(self):
+        ssh = pxssh.pxssh()
+        await ssh.login_async('server', 'me', password='s3cret')
+        ssh.sendline('ping')
+        await ssh.expect_async('pong', timeout=10)
+        assert await ssh.prompt_async(timeout=10)
+        await ssh.logout_async()
+        assert ssh.closed
+
+    async def test_wrong_pw(self):
+        ssh = pxssh.pxssh()
+        with self.assertRaises(pxssh.ExceptionPxssh):
+            await ssh.login_async('server', 'me', password='wr0ng')
+        assert ssh.closed
+
+    async def test_close_does_not_block_loop(self):
+        ssh = pxssh.pxssh()
+        await ssh.login_async('server', 'me', password='s3cret')
+        # What a blocking close() would sleep for.
+        ssh.delayafterclose = ssh.ptyproc.delayafterclose = 2
+        gaps = []
+
+        async def tick():
+            last = time.time()
+            while True:
+                await asyncio.sleep(0.01)
+                gaps.append(time.time() - last)
+                last = time.time()
+
+        ticker = asyncio.ensure_future(tick())
+        try:
+            await ssh.logout_async()
+            await asyncio.sleep(0.05)
+        finally:
+            ticker.cancel()
+        assert ssh.closed
+        assert not ssh.low_latency
+        self.assertLess(max(gaps), 1)
+
+    async def test_prompt_timeout(self):
+        ssh = pxssh.pxssh()
+        await ssh.login_async('server', 'me', password='s3cret')
+        # Nothing was sent, so no prompt is coming.
+        assert not await ssh.prompt_async(timeout=0.5)
+        await ssh.logout_async()
+
+    async def test_concurrent_logins(self):
+        async def ping(server):
+            ssh = pxssh.pxssh()
+            await ssh.login_async(server, 'me', password='s3cret')
+            ssh.sendline('ping')
+            await ssh.expect_async('pong', timeout=10)
+            assert await ssh.prompt_async(timeout=10)
+            await ssh.logout_async()
+            return ssh.closed
+
+        servers = ['server%d' % i for i in range(4)]
+        results = await asyncio.gather(*[ping(s) for s in servers])
+        self.assertEqual(results, [True] * len(servers))
+
 if __name__ == '__main__':
     unittest.main()
@@ -133,5 +133,72 @@ class REPLWrapTestCase(unittest.TestCase):
         res = py.run_command("for a in range(3): print(a)\n")
         assert res.strip().splitlines() == ['0', '1', '2']
 
+
+class REPLPoolTestCase(unittest.TestCase):
+    def test_map(self):
+        if platform.python_implementation() == 'PyPy':
+            raise unittest.SkipTest(skip_pypy)
+
+        with replwrap.REPLPool(replwrap.python, size=3) as pool:
+            assert len(pool.members) == 3
+            res = pool.map(['%d * %d' % (i, i) for i in range(20)])
+            self.assertEqual([r.strip() for r in res],
+                             [str(i * i) for i in range(20)])
+
+            res = pool.map(['for a in range(3): print(a)\n', 'if True:'],
+                           return_exceptions=True)
+            assert res[0].strip().splitlines() == ['0', '1', '2']
+            assert isinstance(res[1], ValueError)
+            assert pool.restarts == 0
+
+    def test_restart(self):
+        if platform.python_implementation() == 'PyPy':
+            raise unittest.SkipTest(skip_pypy)
+
+        with replwrap.REPLPool(replwrap.python, size=2) as pool:
+            res = pool.map(['import time; time.sleep(10)',
+                            'import os; os._exit(1)', '4+7'],
+                           timeout=1, return_exceptions=True)
+            assert isinstance(res[0], pexpect.TIMEOUT)
+            assert isinstance(res[1], pexpect.EOF)
+            assert res[2].strip() == '11'
+            assert pool.restarts == 2
+
+            res = pool.map(['4+7'] * 4)
+            assert [r.strip() for r in res] == ['11'] * 4
+
+            with self.assertRaises(pexpect.TIMEOUT):
+                pool.map(['import time; time.sleep(10)'], timeout=0.5)
+            assert all(m.child.isalive() for m in pool.members)
+
+    def test_restart_fails(self):
+        if platform.python_implementation() == 'PyPy':
+            raise unittest.SkipTest(skip_pypy)
+
+        starts = []
+
+        def factory():
+            starts.append(None)
+            if len(starts) == 2:
+                raise RuntimeError('could not start')
+            return replwrap.python()
+
+        with replwrap.REPLPool(factory, size=1) as pool:
+            res = pool.map(['import os; os._exit(1)', '4+7'],
+                           return_exceptions=True)
+            # The command's EOF is what is reported, caused by the failed
+            # restart; the next command starts the member again.
+            assert isinstance(res[0], pexpect.EOF)
+            assert isinstance(res[0].__cause__, RuntimeError)
+            assert res[1].strip() == '11'
+            assert len(starts) == 3
+            assert pool.restarts == 1
+
+    def test_bash(self):
+        with replwrap.REPLPool(replwrap.bash, size=2) as pool:
+            res = pool.map(['echo %d' % i for i in range(5)])
+            assert [r.strip() for r in res] == [str(i) for i in range(5)]
+
+
 if __name__ == '__main__':
     unittest.main()
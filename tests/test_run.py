@@ -20,10 +20,12 @@ PEXPECT LICENSE
 
 '''
 import pexpect
+import asyncio
 import unittest
 import subprocess
 import sys
 import os
+import time
 from . import PexpectTestCase
 
 unicode_type = str if pexpect.PY3 else unicode
@@ -187,5 +189,68 @@ class RunUnicodeFuncTestCase(RunFuncTestCase):
         assert isinstance(output, unicode_type), type(output)
         assert ('<out>' + char) in output, output
 
+
+class RunAsyncTestCase(PexpectTestCase.AsyncPexpectTestCase):
+
+    async def test_run_async_exit(self):
+        (data, exitstatus) = await pexpect.run_async(
+            sys.executable + ' exit1.py', withexitstatus=1)
+        assert exitstatus == 1
+
+    async def test_run_async_events(self):
+        async def callback(values):
+            if values['event_count'] == 0:
+                await asyncio.sleep(0)
+                return b'hello\n'
+            return True
+
+        output = await pexpect.run_async(
+            self.PYTHONBIN + ' echo_w_prompt.py',
+            events=[(b'<in >', callback)], timeout=5)
+        assert b'<out>hello' in output
+
+    async def test_run_async_concurrently(self):
+        command = self.PYTHONBIN + ' sleep_for.py 0.5'
+        start = time.time()
+        results = await asyncio.gather(*[
+            pexpect.run_async(command, withexitstatus=True)
+            for _ in range(4)])
+        assert time.time() - start < 1.5
+        assert [status for output, status in results] == [0] * 4
+
+
+class RunManyTestCase(PexpectTestCase.PexpectTestCase):
+
+    def test_run_many_completion_order(self):
+        commands = [self.PYTHONBIN + ' sleep_for.py 0.6',
+                    self.PYTHONBIN + ' exit1.py',
+                    'echo hello']
+        results = list(pexpect.run_many(commands, max_concurrency=3))
+        assert results[-1] == (commands[0], b'READY\r\nEND\r\n', 0)
+        assert sorted(results[:2]) == [(commands[1], b'Hello\r\n', 1),
+                                       ('echo hello', b'hello\r\n', 0)]
+
+    def test_run_many_max_concurrency(self):
+        commands = [self.PYTHONBIN + ' sleep_for.py 0.3'] * 4
+        start = time.time()
+        results = list(pexpect.run_many(commands, max_concurrency=2))
+        assert time.time() - start >= 0.6
+        assert len(results) == 4
+
+    def test_run_many_unbounded(self):
+        commands = [self.PYTHONBIN + ' sleep_for.py 0.3'] * 4
+        start = time.time()
+        results = list(pexpect.run_many(commands, max_concurrency=None))
+        assert time.time() - start < 1.2
+        assert len(results) == 4
+        with self.assertRaises(ValueError):
+            list(pexpect.run_many(commands, max_concurrency=0))
+
+    def test_run_many_error(self):
+        with self.assertRaises(pexpect.ExceptionPexpect):
+            list(pexpect.run_many([self.PYTHONBIN + ' sleep_for.py 5',
+                                   'no-such-command-xyz']))
+
+
 if __name__ == '__main__':
     unittest.main()
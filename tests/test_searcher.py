@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import re
+import unittest
+
+import pexpect
+from pexpect.expect import (Expecter, PatternCache, pattern_cache,
+                            searcher_prefilter, searcher_re, searcher_string,
+                            _required_literal)
+from . import PexpectTestCase
+from .utils import ChunkSpawn
+
+
+def _many(words, n=40):
+    # pad the list so that searcher_string builds its automaton
+    return list(words) + [b'filler%d' % i for i in range(n)]
+
+
+class SearcherStringTestCase(PexpectTestCase.PexpectTestCase):
+
+    def test_automaton_is_built(self):
+        assert searcher_string(_many([b'x']))._automaton is not None
+        assert searcher_string([b'x', b'y'])._automaton is None
+
+    def test_leftmost_then_list_order(self):
+        for words in ([b'bar', b'foo', b'foobar'], _many([b'bar', b'foo', b'foobar'])):
+            s = searcher_string(words)
+            assert s.search(b'xxfoobar', 8) == 1
+            assert (s.start, s.end, s.match) == (2, 5, b'foo')
+        for words in ([b'foobar', b'foo'], _many([b'foobar', b'foo'])):
+            s = searcher_string(words)
+            assert s.search(b'xxfoobar', 8) == 0
+            assert (s.start, s.end, s.match) == (2, 8, b'foobar')
+
+    def test_longer_string_first_in_list_at_same_start(self):
+        s = searcher_string(_many([b'bcbcb', b'bc']))
+        assert s.search(b'bbcbcba', 7) == 0
+        assert (s.start, s.end) == (1, 6)
+
+    def test_longer_string_starting_earlier(self):
+        s = searcher_string(_many([b'cd', b'abcdef']))
+        assert s.search(b'..abcdef..', 10) == 1
+        assert s.start == 2
+
+    def test_no_match(self):
+        s = searcher_string(_many([b'alpha', b'beta']))
+        assert s.search(b'gamma delta', 11) == -1
+
+    def test_text(self):
+        s = searcher_string([u'caf\xe9'] + [u'w%d' % i for i in range(40)])
+        assert s._automaton is not None
+        assert s.search(u'un caf\xe9 noir', 12) == 0
+        assert s.start == 3
+
+    def test_state_carried_across_chunks(self):
+        s = searcher_string(_many([b'needle']))
+        buf = b''
+        for chunk in (b'hay ne', b'e', b'dle hay'):
+            buf += chunk
+            idx = s.search(buf, len(chunk))
+            if idx >= 0:
+                break
+        assert idx == 0
+        assert (s.start, s.end) == (4, 10)
+
+    def test_searchwindowsize(self):
+        s = searcher_string(_many([b'abc']))
+        assert s.search(b'abc' + b'.' * 20, 23, searchwindowsize=10) == -1
+        assert s.search(b'.' * 20 + b'abc', 23, searchwindowsize=10) == 0
+        assert s.start == 20
+
+    def test_eof_and_timeout_indexes(self):
+        s = searcher_string(_many([b'abc', pexpect.EOF, pexpect.TIMEOUT]))
+        assert (s.eof_index, s.timeout_index) == (1, 2)
+        assert s.search(b'xabc', 4) == 0
+
+
+class SearcherReTestCase(PexpectTestCase.PexpectTestCase):
+
+    def test_longest_string(self):
+        def longest(*patterns):
+            return searcher_re([re.compile(p) for p in patterns]).longest_string
+        assert longest(b'abc', br'\d{2,5}x') == 6
+        assert longest(b'foo(?=bar)') == 6
+        assert longest(b'abc', b'a.*c') is None
+        assert longest() == 0
+
+    def _searcher(self, patterns):
+        # pad the list so that searcher_re joins the patterns
+        return searcher_re([re.compile(p) for p in patterns] +
+                           [re.compile(b'filler%d' % i) for i in range(10)])
+
+    def test_patterns_are_joined(self):
+        s = self._searcher([b'foo', b'bar', br'(a)\1', b'.baz'])
+        assert s._combined is not None
+        assert [n for n, p in s._joined][:2] == [0, 1]
+        assert [n for n, p in s._separate] == [2, 3]
+
+    def test_earliest_match_then_list_order(self):
+        for s in (searcher_re([re.compile(b'bar'), re.compile(b'foo')]),
+                  self._searcher([b'bar', b'foo'])):
+            assert s.search(b'foobar', 6) == 1
+            assert (s.start, s.end) == (0, 3)
+        s = self._searcher([b'foo(bar)?', b'foo'])
+        assert s.search(b'xfoobar', 7) == 0
+        assert s.match.group(1) == b'bar'
+
+    def test_earliest_match_across_separate_patterns(self):
+        s = self._searcher([b'bar', br'(o)\1'])
+        assert s.search(b'foobar', 6) == 1
+        assert s.match.group(1) == b'o'
+
+    def test_straddling_match_found_with_lookback(self):
+        s = searcher_re([re.compile(b'needle')])
+        buf = b'hay nee'
+        assert s.search(buf, len(buf)) == -1
+        buf += b'dle'
+        # three fresh bytes plus the lookback
+        assert s.search(buf, 3 + s.longest_string) == 0
+        assert (s.start, s.end) == (4, 10)
+
+
+class SearcherPrefilterTestCase(PexpectTestCase.PexpectTestCase):
+
+    def test_required_literal(self):
+        lit = lambda p: _required_literal(re.compile(p))
+        assert lit(br'[A-Z]+: disk \d+ failure') == b' failure'
+        assert lit(u'x(?:hello)+y') == u'hello'
+        assert lit(br'(?:abc|abd)') == b'ab'
+        assert lit(br'a(?:bcdef)?') == b'a'
+        assert lit(br'(?=abcdef)x') == b'x'
+        assert lit(br'a(?i:bcd)e') == b'a'
+        assert lit(br'(?i)abc') is None
+        assert lit(br'\d+') is None
+
+    def test_same_results_as_searcher_re(self):
+        patterns = [re.compile(br'[A-Z]+%d: code \d+' % i) for i in range(40)]
+        patterns += [re.compile(br'\w+ panic'), pexpect.EOF,
+                     re.compile(br'[ab]+ code 7')]
+        s1 = searcher_re(patterns)
+        s2 = searcher_prefilter(patterns)
+        for buf in [b'nothing here', b'XY12: code 5', b'aab code 7 Q3: code 9',
+                    b'kernel panic', b'ERR7: code', b'Q39: code 1 Q3: code 2']:
+            for freshlen in range(len(buf) + 1):
+                index = s1.search(buf, freshlen)
+                assert s2.search(buf, freshlen) == index
+                if index >= 0:
+                    assert (s2.start, s2.end) == (s1.start, s1.end)
+
+    def test_only_candidates_searched(self):
+        patterns = [re.compile(br'[A-Z]+: %s \d+' % w)
+                    for w in (b'alpha', b'beta', b'gamma')]
+        s = searcher_prefilter(patterns)
+        buf = b'X: beta 12'
+        found = s._index.present(buf, 0, len(buf))
+        assert [s._literals[order][0] for order in found] == [1]
+        assert s.search(buf, len(buf)) == 1
+
+    def test_expect_list_uses_prefilter(self):
+        patterns = [br'[A-Z]+%d: x' % i
+                    for i in range(searcher_prefilter.prefilter_threshold)]
+        spawn = ChunkSpawn([b'AB1: x AB3: x'])
+        assert spawn.expect(patterns) == 1
+        assert spawn.before == b''
+        assert spawn.expect(patterns) == 3
+        assert spawn.before == b' '
+
+
+class ExpecterTestCase(PexpectTestCase.PexpectTestCase):
+
+    def test_fresh_length(self):
+        spawn = ChunkSpawn([])
+        exp = Expecter(spawn, searcher_string([b'needle']))
+        spawn.buffer = b'x' * 100
+        assert exp.fresh_length(b'x' * 10) == 10 + 6
+        spawn.buffer = b'x' * 12
+        assert exp.fresh_length(b'x' * 10) == 12
+
+    def test_fresh_length_unbounded(self):
+        spawn = ChunkSpawn([])
+        spawn.buffer = b'x' * 100
+        exp = Expecter(spawn, searcher_re([re.compile(b'a.*b')]))
+        assert exp.fresh_length(b'x' * 10) == 100
+
+    def _expect(self, spawn, pattern):
+        searcher = searcher_re(spawn.compile_pattern_list(pattern))
+        return Expecter(spawn, searcher).expect_loop(timeout=None)
+
+    def test_before_after_buffer_bytes(self):
+        spawn = ChunkSpawn([b'one t', b'wo thr', b'ee four'])
+        assert self._expect(spawn, [b'x', b'thr?ee']) == 1
+        assert isinstance(spawn._before_value, memoryview)
+        assert spawn.before == b'one two '
+        assert spawn.after == b'three'
+        assert spawn.buffer == b' four'
+        assert self._expect(spawn, b'o') == 0
+        assert (spawn.before, spawn.after, spawn.buffer) == (b' f', b'o', b'ur')
+
+    def test_before_after_buffer_text(self):
+        spawn = ChunkSpawn([u'caf\xe9 t', u'wo thr', u'ee four'],
+                            encoding='utf-8')
+        assert self._expect(spawn, u'(?<=two )thr?ee') == 0
+        assert spawn.before == u'caf\xe9 two '
+        assert spawn.after == u'three'
+        assert self._expect(spawn, u'^ f') == 0
+        assert (spawn.before, spawn.after, spawn.buffer) == (u'', u' f', u'our')
+
+    def test_anchor_not_matched_at_window_start(self):
+        spawn = ChunkSpawn([b'ab', b'c', b'abc', b'\nab'])
+        assert self._expect(spawn, br'(?m)^ab') == 0
+        assert spawn.before == b''
+        assert self._expect(spawn, br'(?m)^ab') == 0
+        assert spawn.before == b'cabc\n'
+        spawn = ChunkSpawn([u'ab', u'c', u'abc', u'\nab'], encoding='utf-8')
+        assert self._expect(spawn, u'(?m)^ab') == 0
+        assert spawn.before == u''
+        assert self._expect(spawn, u'(?m)^ab') == 0
+        assert spawn.before == u'cabc\n'
+
+    def test_automaton_resumes_in_text_slices(self):
+        # A text buffer is searched through a fresh slice of its end each
+        # time, so where the last scan stopped is not an index into it.
+        patterns = [u'ERR01'] + [u'Q%04d' % i for i in range(40)]
+        spawn = ChunkSpawn([u'x' * 100, u'x' * 20 + u'ERR01' + u'x' * 75],
+                           encoding='utf-8')
+        assert spawn.expect_exact(patterns + [pexpect.EOF]) == 0
+        assert spawn.before == u'x' * 120
+
+    def test_automaton_resumes_after_maxbuffer_discard(self):
+        patterns = [b'ERR01'] + [b'Q%04d' % i for i in range(40)]
+        spawn = ChunkSpawn([b'x' * 100, b'x' * 20 + b'ERR01' + b'x' * 75])
+        spawn.maxbuffer = 150
+        assert spawn.expect_exact(patterns + [pexpect.EOF]) == 0
+        assert spawn.before == b'x' * 70
+
+
+class PatternCacheTestCase(PexpectTestCase.PexpectTestCase):
+
+    def test_hits_misses_and_eviction(self):
+        cache = PatternCache(maxsize=2)
+        calls = []
+        make = lambda: calls.append(1) or object()
+        a = cache.get('a', make)
+        assert cache.get('a', make) is a
+        cache.get('b', make)
+        cache.get('a', make)
+        cache.get('c', make)    # evicts 'b', the least recently used
+        assert len(calls) == 3
+        assert (cache.hits, cache.misses) == (2, 3)
+        cache.get('b', make)
+        assert len(calls) == 4
+        assert cache.get([], lambda: 'unhashable') == 'unhashable'
+        cache.clear()
+        assert (cache.hits, cache.misses) == (0, 0)
+
+    def test_searcher_copies_share_compiled_state(self):
+        cache = PatternCache()
+        patterns = [re.compile(b'a'), re.compile(b'b')]
+        s1 = cache.searcher(searcher_re, patterns)
+        s2 = cache.searcher(searcher_re, patterns)
+        assert s1 is not s2
+        assert s1._searches is s2._searches
+        assert s1.search(b'xxb', 3) == 1
+        assert s2.search(b'xa', 2) == 0
+        assert (s1.start, s2.start) == (2, 1)
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_compile_pattern_list_cached(self):
+        spawn = ChunkSpawn([])
+        pattern_cache.clear()
+        first = spawn.compile_pattern_list([b'abc', pexpect.EOF])
+        second = spawn.compile_pattern_list([b'abc', pexpect.EOF])
+        assert first == second and first is not second
+        assert pattern_cache.hits == 1
+        spawn.ignorecase = True
+        cpl = spawn.compile_pattern_list([b'abc', pexpect.EOF])
+        assert cpl[0].flags & re.IGNORECASE
+        assert pattern_cache.misses == 2
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import hashlib
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+
+import pexpect
+from pexpect.fdpexpect import fdspawn
+from pexpect.mmap_spawn import mmapspawn
+from pexpect.popen_spawn import PopenSpawn
+from pexpect.spawnbase import _canonical_chunks
+from . import PexpectTestCase
+
+# Reads lines from stdin until END, then prints how much it got.
+CHECKSUM = r'''
+import sys, hashlib
+h = hashlib.md5()
+for line in sys.stdin.buffer:
+    if line == b"END\n":
+        break
+    h.update(line)
+print("GOT " + h.hexdigest())
+'''
+
+
+class CanonicalChunksTestCase(PexpectTestCase.PexpectTestCase):
+
+    def test_short_lines_untouched(self):
+        data = b'abc\ndef\n'
+        assert [bytes(c) for c in _canonical_chunks(data, 5, b'\x04')] == [
+            data]
+
+    def test_long_lines_cut(self):
+        data = b'ab\n' + b'x' * 10 + b'\nyyyy'
+        chunks = [bytes(c) for c in _canonical_chunks(data, 5, b'\x04')]
+        assert chunks == [b'ab\nxxxx', b'\x04', b'xxxx', b'\x04',
+                          b'xx\nyyyy']
+        # No line, counting up to a newline or VEOF, is over the limit.
+        for line in b''.join(chunks).replace(b'\x04', b'\n').split(b'\n'):
+            assert len(line) < 5
+
+
+class SendBulkTestCase(PexpectTestCase.PexpectTestCase):
+
+    def socket_spawn(self):
+        ours, theirs = socket.socketpair()
+        ours.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        self.addCleanup(ours.close)
+        self.addCleanup(theirs.close)
+        return fdspawn(ours, timeout=5), theirs
+
+    def test_waits_for_slow_reader(self):
+        s, theirs = self.socket_spawn()
+        data = b'0123456789' * 100000
+        received = []
+
+        def reader():
+            while True:
+                time.sleep(0.001)
+                chunk = theirs.recv(8192)
+                if not chunk:
+                    break
+                received.append(chunk)
+                if sum(len(c) for c in received) == len(data):
+                    break
+        t = threading.Thread(target=reader)
+        t.start()
+        assert s.send_bulk(data) == len(data)
+        t.join()
+        assert b''.join(received) == data
+
+    def test_reads_while_blocked(self):
+        # The other end echoes everything back. Without reading the echo
+        # while sending, both sides would end up blocked on a full buffer.
+        s, theirs = self.socket_spawn()
+        data = b'x' * 1000000
+
+        def echo():
+            got = 0
+            while got < len(data):
+                chunk = theirs.recv(65536)
+                got += len(chunk)
+                theirs.sendall(chunk)
+            theirs.sendall(b'DONE')
+        t = threading.Thread(target=echo)
+        t.start()
+        s.send_bulk(data)
+        s.expect(b'DONE')
+        t.join()
+        assert len(s.before) == len(data)
+
+    def test_reads_while_blocked_with_poll(self):
+        s, theirs = self.socket_spawn()
+        s.use_poll = True
+        data = b'x' * 1000000
+
+        def echo():
+            got = 0
+            while got < len(data):
+                chunk = theirs.recv(65536)
+                got += len(chunk)
+                theirs.sendall(chunk)
+            theirs.sendall(b'DONE')
+        t = threading.Thread(target=echo)
+        t.start()
+        s.send_bulk(data)
+        s.expect(b'DONE')
+        t.join()
+        assert len(s.before) == len(data)
+
+    def test_without_writev(self):
+        s, theirs = self.socket_spawn()
+        writev = os.writev
+        del os.writev
+        try:
+            s.writelines([b'abc', b'def\n'])
+            with self.assertRaises(pexpect.TIMEOUT):
+                s.send_bulk(b'x' * 10000000, timeout=0.2)
+        finally:
+            os.writev = writev
+        assert theirs.recv(7).startswith(b'abcdef\n')
+
+    def test_timeout(self):
+        s, theirs = self.socket_spawn()
+        with self.assertRaises(pexpect.TIMEOUT):
+            s.send_bulk(b'x' * 10000000, timeout=0.2)
+
+    def test_writelines(self):
+        s, theirs = self.socket_spawn()
+        s.writelines([b'abc', 'def', b'', b'ghi\n'])
+        assert theirs.recv(100) == b'abcdefghi\n'
+
+    def test_pty_long_lines(self):
+        p = pexpect.spawn(sys.executable, ['-c', CHECKSUM], timeout=30)
+        data = b''.join(b'%d:' % i + b'x' * (i * 37 % 9000) + b'\n'
+                        for i in range(300))
+        assert p.send_bulk(data) == len(data)
+        p.send_bulk(b'END\n')
+        p.expect(br'GOT (\w+)')
+        assert p.match.group(1).decode() == hashlib.md5(data).hexdigest()
+
+    def test_popen_spawn(self):
+        # PopenSpawn's child_fd is the pipe from the child's stdout; the
+        # data goes to its stdin, and cat echoes it all back meanwhile.
+        p = PopenSpawn('cat', timeout=10)
+        data = b'0123456789abcde\n' * 100000
+        assert p.send_bulk(data) == len(data)
+        p.sendeof()
+        p.expect(pexpect.EOF)
+        assert p.before == data
+
+    def test_mmap_spawn(self):
+        with open('TESTDATA.txt', 'rb') as f:
+            s = mmapspawn(f)
+            with self.assertRaises(pexpect.ExceptionPexpect):
+                s.send_bulk(b'x')
+
+
+if __name__ == '__main__':
+    unittest.main()
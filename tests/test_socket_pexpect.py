@@ -20,6 +20,8 @@ PEXPECT LICENSE
 '''
 import pexpect
 from pexpect import socket_pexpect
+import io
+import time
 import unittest
 from . import PexpectTestCase
 import socket
@@ -65,6 +67,77 @@ class ExpectTestCase(PexpectTestCase.PexpectTestCase):
         assert not s.isatty()
         s.close()
 
+    def test_read_drains(self):
+        read_socket, write_socket = socket.socketpair()
+        s = socket_pexpect.SocketSpawn(read_socket, timeout=5)
+        selector = s._read_selector
+        for n in range(10):
+            write_socket.sendall(b'x' * 1000)
+        # All 10 sends come back from one read, into the same buffer.
+        assert s.read_nonblocking(20000) == b'x' * 10000
+        recv_buffer = s._recv_buffer
+        write_socket.sendall(b'abc')
+        assert s.read_nonblocking(3) == b'abc'
+        assert s._recv_buffer is recv_buffer
+        assert s._read_selector is selector
+        with self.assertRaises(pexpect.TIMEOUT):
+            s.read_nonblocking(10, timeout=0)
+        write_socket.close()
+        with self.assertRaises(pexpect.EOF):
+            s.read_nonblocking(10)
+        s.close()
+
+    def test_read_with_socket_timeout(self):
+        read_socket, write_socket = socket.socketpair()
+        read_socket.settimeout(2)
+        s = socket_pexpect.SocketSpawn(read_socket, timeout=5)
+        write_socket.sendall(b'prompt> ')
+        # Nothing more is pending: the read returns what came at once.
+        start = time.time()
+        s.expect(b'> ')
+        assert time.time() - start < 1
+        assert s.before == b'prompt'
+        with self.assertRaises(pexpect.TIMEOUT):
+            s.read_nonblocking(10, timeout=0.1)
+        write_socket.close()
+        s.expect(pexpect.EOF)
+        s.close()
+
+    def test_writelines(self):
+        read_socket, write_socket = socket.socketpair()
+        s = socket_pexpect.SocketSpawn(write_socket, encoding='utf-8')
+        s.send_batch = 10
+        s.writelines(['abc\n'] * 5 + [b'def\n'])
+        s.close()
+        received = b''
+        while True:
+            data = read_socket.recv(100)
+            if not data:
+                break
+            received += data
+        read_socket.close()
+        self.assertEqual(received, b'abc\n' * 5 + b'def\n')
+
+    def test_writelines_coerce_and_log(self):
+        read_socket, write_socket = socket.socketpair()
+        s = socket_pexpect.SocketSpawn(write_socket)
+        s.logfile_send = io.BytesIO()
+        # Without an encoding, text is sent as UTF-8, as send() does.
+        s.writelines(['caf\xe9\n', b'tea\n'])
+        s.close()
+        self.assertEqual(read_socket.recv(100), b'caf\xc3\xa9\ntea\n')
+        self.assertEqual(s.logfile_send.getvalue(), b'caf\xc3\xa9\ntea\n')
+        read_socket.close()
+
+        read_socket, write_socket = socket.socketpair()
+        s = socket_pexpect.SocketSpawn(write_socket, encoding='utf-8')
+        s.logfile_send = io.StringIO()
+        s.writelines([u'caf\xe9\n', b'tea\n'])
+        s.close()
+        self.assertEqual(read_socket.recv(100), b'caf\xc3\xa9\ntea\n')
+        self.assertEqual(s.logfile_send.getvalue(), u'caf\xe9\ntea\n')
+        read_socket.close()
+
 
 if __name__ == '__main__':
     unittest.main()
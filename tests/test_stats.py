@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+'''
+PEXPECT LICENSE
+
+    This license is approved by the OSI and FSF as GPL-compatible.
+        http://opensource.org/licenses/isc-license.txt
+
+    Copyright (c) 2012, Noah Spurrier <noah@noah.org>
+    PERMISSION TO USE, COPY, MODIFY, AND/OR DISTRIBUTE THIS SOFTWARE FOR ANY
+    PURPOSE WITH OR WITHOUT FEE IS HEREBY GRANTED, PROVIDED THAT THE ABOVE
+    COPYRIGHT NOTICE AND THIS PERMISSION NOTICE APPEAR IN ALL COPIES.
+    THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+    WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+    ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+    WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+    ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+    OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+'''
+import os
+import unittest
+
+from pexpect.expect import ExpectStats
+from pexpect.fdpexpect import fdspawn
+from . import PexpectTestCase
+from .utils import ChunkSpawn
+
+
+class ExpectStatsTestCase(PexpectTestCase.PexpectTestCase):
+
+    def test_off_by_default(self):
+        spawn = ChunkSpawn([b'abc'])
+        assert spawn.stats is None
+        assert spawn.expect(b'b') == 0
+
+    def test_counts(self):
+        spawn = ChunkSpawn([b'0123456789', b'0123456789', b'DONE'])
+        spawn.stats = stats = ExpectStats()
+        assert spawn.expect(b'DONE') == 0
+        assert stats.expects == 1
+        assert stats.reads == 3
+        assert stats.bytes_read == 24
+        # The empty buffer, then each read: only the lookback (as long as
+        # the pattern) before the second and third reads is searched again.
+        assert stats.searches == 4
+        assert stats.bytes_rescanned == 8
+        assert stats.search_time > 0
+        assert stats.read_time >= 0
+        stats.reset()
+        assert (stats.expects, stats.reads, stats.search_time) == (0, 0, 0)
+
+    def test_expect_iter(self):
+        spawn = ChunkSpawn([b'x1 x2', b' x3'])
+        spawn.stats = stats = ExpectStats()
+        assert [m.after for m in spawn.expect_iter(b'x\\d')] == [
+            b'x1', b'x2', b'x3']
+        assert (stats.expects, stats.reads, stats.bytes_read) == (1, 2, 8)
+
+    def test_select_and_decode_time(self):
+        r, w = os.pipe()
+        os.write(w, b'hello world\n')
+        os.close(w)
+        spawn = fdspawn(r, encoding='utf-8')
+        spawn.stats = stats = ExpectStats()
+        assert spawn.expect(u'world') == 0
+        assert spawn.before == u'hello '
+        assert stats.reads == 1
+        assert stats.select_time > 0
+        assert stats.decode_time > 0
+        assert stats.read_time >= stats.select_time + stats.decode_time
+        spawn.close()
+
+    def test_str(self):
+        stats = ExpectStats()
+        stats.reads = 2
+        assert 'reads: 2' in str(stats).splitlines()
+        assert 'reads=2' in repr(stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,23 @@
 import os
 
+from pexpect.spawnbase import SpawnBase
+
 def no_coverage_env():
     "Return a copy of os.environ that won't trigger coverage measurement."
     env = os.environ.copy()
     env.pop('COV_CORE_SOURCE', None)
-    return env
\ No newline at end of file
+    return env
+
+class ChunkSpawn(SpawnBase):
+    """A spawn which reads from a list of chunks instead of a child. An
+    exception in the list is raised when its turn comes."""
+
+    def __init__(self, chunks, **kwargs):
+        SpawnBase.__init__(self, **kwargs)
+        self.chunks = list(chunks)
+
+    def read_nonblocking(self, size=1, timeout=None):
+        chunk = self.chunks.pop(0) if self.chunks else b''
+        if isinstance(chunk, Exception):
+            raise chunk
+        return chunk
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+This tool measures the round-trip latency of sendline() and expect() with
+a ``cat`` child, and how long spawning and closing the child takes, with
+and without the spawn's low_latency attribute set.
+
+By default, every send() sleeps for delaybeforesend (50 ms) and close()
+for delayafterclose (100 ms). With low_latency, send() does not sleep at
+all, just as with delaybeforesend set to None, and close() returns as soon
+as the child has exited. So the round trip is also measured with
+delaybeforesend=None, which is the baseline to compare low_latency's
+against: what low_latency itself gains is in close(), terminate() and
+waitnoecho(), not in send().
+
+Usage: bench-latency.py [ROUNDS]
+"""
+# std import
+from __future__ import print_function
+import sys
+import time
+
+
+def measure(rounds, low_latency=False, delaybeforesend=0.05):
+    import pexpect
+    started = time.time()
+    child = pexpect.spawn('cat', echo=False, timeout=5, encoding='utf-8')
+    child.low_latency = low_latency
+    child.delaybeforesend = delaybeforesend
+    round_trip = time.time()
+    for n in range(rounds):
+        child.sendline('ping %d' % n)
+        child.expect('ping %d' % n)
+    round_trip = (time.time() - round_trip) / rounds
+    closing = time.time()
+    child.close()
+    closing = time.time() - closing
+    assert child.signalstatus is not None or child.exitstatus is not None
+    return round_trip, closing, time.time() - started
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print('%-20s %14s %10s %10s' % ('', 'round trip', 'close', 'total'))
+    for name, kwargs in (
+            ('default', {}),
+            ('delaybeforesend=None', {'delaybeforesend': None}),
+            ('low_latency', {'low_latency': True})):
+        round_trip, closing, total = measure(rounds, **kwargs)
+        print('%-20s %11.3f ms %7.1f ms %8.2f s' % (
+            name, round_trip * 1000, closing * 1000, total))
+
+if __name__ == '__main__':
+    main()